@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+This script will write the VisitIndex of an OpSim database: an HDF5
+file mapping each visit to the nside=32 healpixels and level 6 trixels
+its field of view touches, and each healpixel and trixel to the visits
+touching it.  Read it back with
+
+    from desc.sims.GCRCatSimInterface import VisitIndex
+    visit_index = VisitIndex.read(out_file)
+"""
+import argparse
+import time
+
+from desc.sims.GCRCatSimInterface import VisitTable, build_visit_index
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--opsim_db', type=str, required=True,
+                        help='the OpSim database')
+    parser.add_argument('--out_file', type=str, required=True,
+                        help='the HDF5 file to write')
+    parser.add_argument('--visit_table', type=str, default=None,
+                        help='.npz cache of the OpSim Summary columns '
+                        '(see generateInstCat.py)')
+    parser.add_argument('--fov', type=float, default=2.1,
+                        help='field-of-view radius in degrees (default 2.1)')
+    parser.add_argument('--nside', type=int, default=32,
+                        help='healpix resolution (default 32)')
+    parser.add_argument('--htmid_level', type=int, default=6,
+                        help='trixel level (default 6)')
+    parser.add_argument('--disable_dithering', default=False,
+                        action='store_true',
+                        help='index the undithered pointings')
+    args = parser.parse_args()
+
+    t_start = time.time()
+    visit_table = VisitTable.load(args.opsim_db, cache_file=args.visit_table)
+    visit_index = build_visit_index(visit_table, fov=args.fov,
+                                    nside=args.nside,
+                                    htmid_level=args.htmid_level,
+                                    dither=not args.disable_dithering)
+    visit_index.write(args.out_file)
+    print('indexed %d visits (%d healpixels, %d trixels) in %e seconds'
+          % (len(visit_index), len(visit_index.healpix_list()),
+             len(visit_index.htmid_list()), time.time()-t_start))
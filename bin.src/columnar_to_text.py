@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+This script will regenerate the PhoSim text version of SubCatalogs
+that were written in the columnar HDF5 format
+(SubCatalogMixin.subcat_format = 'hdf5').
+"""
+import argparse
+
+from desc.sims.GCRCatSimInterface import columnar_to_phosim_text
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('columnar_files', type=str, nargs='+',
+                        help='columnar catalogs (*.h5) to convert')
+    parser.add_argument('--out_name', type=str, default=None,
+                        help='name of the text file to write (only valid '
+                        'with a single input file; default is the input '
+                        'name without the .h5 suffix)')
+    parser.add_argument('--chunk_size', type=int, default=100000,
+                        help='number of rows to format at a time')
+    args = parser.parse_args()
+
+    if args.out_name is not None and len(args.columnar_files) > 1:
+        raise RuntimeError("Cannot specify --out_name with more than "
+                           "one input file")
+
+    for file_name in args.columnar_files:
+        if args.out_name is not None:
+            text_name = args.out_name
+        elif file_name.endswith('.h5'):
+            text_name = file_name[:-3]
+        else:
+            text_name = file_name + '.txt'
+        n_rows = columnar_to_phosim_text(file_name, text_name,
+                                         chunk_size=args.chunk_size)
+        print('wrote %d rows to %s' % (n_rows, text_name))
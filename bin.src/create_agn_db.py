@@ -1,6 +1,5 @@
 #!/usr/bin/env python
 import argparse
-import sqlite3
 import numpy as np
 import os
 import gc
@@ -12,6 +11,7 @@ from desc.sims.GCRCatSimInterface import log_Eddington_ratio
 from desc.sims.GCRCatSimInterface import k_correction
 from desc.sims.GCRCatSimInterface import tau_from_params
 from desc.sims.GCRCatSimInterface import SF_from_params
+from desc.sims.GCRCatSimInterface import SqliteBulkWriter
 
 from lsst.utils import getPackageDir
 from lsst.sims.photUtils import Sed, BandpassDict, CosmologyObject
@@ -197,12 +197,12 @@ if __name__ == "__main__":
         mag_norm_grid[i_z] = ss.calcMag(imsimband)
 
     htmid_level = 8
-    with sqlite3.connect(out_file_name) as connection:
-        cursor = connection.cursor()
-        cursor.execute('''CREATE TABLE agn_params
-                          (galaxy_id int, htmid_%d int, magNorm real, varParamStr text)''' % htmid_level)
-
-        connection.commit()
+    with SqliteBulkWriter(out_file_name) as writer:
+        writer.create_table('agn_params', [('galaxy_id', 'int'),
+                                           ('htmid_%d' % htmid_level, 'int'),
+                                           ('magNorm', 'real'),
+                                           ('varParamStr', 'text')])
+        writer.add_index('htmid', 'agn_params', ['htmid_%d' % htmid_level])
 
         chunk_size = 100000
         full_size = len(redshift_full)
@@ -292,57 +292,24 @@ if __name__ == "__main__":
 
             varParamStr_format = '{"m": "applyAgn", "p": {"seed": %d, "agn_sf_u": %.3e, "agn_sf_g": %.3e, "agn_sf_r": %.3e, "agn_sf_i": %.3e, "agn_sf_z": %.3e, "agn_sf_y": %.3e, "agn_tau_u" : %.3e, "agn_tau_g" : %.3e, "agn_tau_r" : %.3e, "agn_tau_i" : %.3e, "agn_tau_z" : %.3e, "agn_tau_y" : %.3e}}'
 
-            row_by_row = zip(galaxy_id, htmid, mag_norm, seed_arr,
-                             sf_dict['u'], 
-                             sf_dict['g'], 
-                             sf_dict['r'], 
-                             sf_dict['i'],
-                             sf_dict['z'], 
-                             sf_dict['y'],
-                             tau_dict['u'],
-                             tau_dict['g'],
-                             tau_dict['r'],
-                             tau_dict['i'],
-                             tau_dict['z'],
-                             tau_dict['y'])
-
-            vals = []
-            for (gal_id_i, htmid_i, mag_norm_i, seed_arr_i, 
-                sf_u, 
-                sf_g, 
-                sf_r, 
-                sf_i, 
-                sf_z, 
-                sf_y, 
-                tau_u, 
-                tau_g, 
-                tau_r, 
-                tau_i, 
-                tau_z, 
-                tau_y) in row_by_row:
-                vals.append((int(gal_id_i), int(htmid_i), mag_norm_i,
-                             varParamStr_format % (seed_arr_i,
-                                                   sf_u, 
-                                                   sf_g, 
-                                                   sf_r, 
-                                                   sf_i, 
-                                                   sf_z, 
-                                                   sf_y, 
-                                                   tau_u, 
-                                                   tau_g, 
-                                                   tau_r, 
-                                                   tau_i, 
-                                                   tau_z, 
-                                                   tau_y)
-                             ))
-
-            cursor.executemany('INSERT INTO agn_params VALUES(?, ?, ?, ?)', vals)
-            connection.commit()
+            var_param_str = [varParamStr_format % pars
+                             for pars in zip(seed_arr.tolist(),
+                                             sf_dict['u'].tolist(),
+                                             sf_dict['g'].tolist(),
+                                             sf_dict['r'].tolist(),
+                                             sf_dict['i'].tolist(),
+                                             sf_dict['z'].tolist(),
+                                             sf_dict['y'].tolist(),
+                                             tau_dict['u'].tolist(),
+                                             tau_dict['g'].tolist(),
+                                             tau_dict['r'].tolist(),
+                                             tau_dict['i'].tolist(),
+                                             tau_dict['z'].tolist(),
+                                             tau_dict['y'].tolist())]
+
+            writer.insert('agn_params', [galaxy_id, htmid, mag_norm,
+                                         var_param_str])
 
         assert ct_simulated == full_size
 
-        print('creating index')
-        cursor.execute('CREATE INDEX htmid ON agn_params (htmid_8)')
-        connection.commit()
-
     print('all done')
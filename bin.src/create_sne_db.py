@@ -3,12 +3,68 @@ This script will a directory containing csv files with the SNe parameters
 for DC2 and load those parameters into a sqlite file that can be queried
 by the InstanceCatalog generation code.
 """
-import sqlite3
 import os
-from lsst.sims.utils import findHtmid
+import multiprocessing
+import numpy as np
+import pandas as pd
+from lsst.sims.utils import htmModule as htm
+from desc.sims.GCRCatSimInterface import SqliteBulkWriter
 import time
 import argparse
 
+htmid_level = 6
+
+# (column in the csv files, dtype) of the sne_params columns after
+# htmid_level_6, for the two layouts of the csv files (keyed on the
+# number of fields per line)
+_csv_layouts = {23: [(0, np.int64), (1, float), (2, float), (3, float),
+                     (4, float), (5, float), (11, float), (20, str),
+                     (21, float), (22, float)],
+                10: [(0, np.int64), (1, float), (2, float), (4, float),
+                     (5, float), (6, float), (7, float), (3, str),
+                     (8, float), (9, float)]}
+
+
+def parse_sne_csv(full_name, chunk_size=100000):
+    """
+    Read one csv file of SN parameters.
+
+    Returns a list of the sne_params columns (htmid_level_6 first)
+    as numpy arrays, in the order of the file.
+    """
+    with open(full_name, 'r') as input_file:
+        input_file.readline()
+        first_line = input_file.readline()
+    if first_line.strip() == '':
+        return [np.zeros(0) for ii in range(11)]
+
+    n_fields = len(first_line.strip().split(','))
+    if n_fields not in _csv_layouts:
+        raise RuntimeError("could not parse line\n"
+                           + first_line
+                           + "\n")
+    layout = _csv_layouts[n_fields]
+
+    # round_trip parsing gives the floats python's float() gives;
+    # na_filter=False keeps the text columns as written
+    reader = pd.read_csv(full_name, header=None, skiprows=1,
+                         names=list(range(n_fields)),
+                         usecols=[col for col, dtype in layout],
+                         dtype={col: dtype for col, dtype in layout},
+                         float_precision='round_trip', na_filter=False,
+                         chunksize=chunk_size)
+
+    chunks = [[] for ii in range(len(layout)+1)]
+    for chunk in reader:
+        ra_col, dec_col = layout[-2][0], layout[-1][0]
+        htmid = htm.findHtmid(chunk[ra_col].values, chunk[dec_col].values,
+                              htmid_level)
+        chunks[0].append(np.asarray(htmid, dtype=np.int64))
+        for i_col, (col, dtype) in enumerate(layout):
+            chunks[i_col+1].append(chunk[col].values)
+    return [np.concatenate(cc) for cc in chunks]
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
@@ -18,6 +74,8 @@ if __name__ == "__main__":
                         help="name of directory containing the csv files "
                         "to be read into the database; all files ending in "
                         "'.csv' will be read.")
+    parser.add_argument('--n_processes', type=int, default=4,
+                        help='number of processes parsing the csv files')
 
     args = parser.parse_args()
     if args.out_file is None:
@@ -25,77 +83,42 @@ if __name__ == "__main__":
     if args.in_dir is None:
         raise RuntimeError("Must specify in_dir")
 
-    data_dir_file_names = os.listdir(args.in_dir)
+    data_dir_file_names = [file_name for file_name in os.listdir(args.in_dir)
+                           if file_name.endswith('csv')]
 
     if os.path.exists(args.out_file):
         raise RuntimeError("%s already exists" % args.out_file)
 
-    htmid_level = 6
-
-    with sqlite3.connect(args.out_file) as conn:
-        cursor = conn.cursor()
-        creation_cmd = """CREATE TABLE sne_params (
-                          htmid_level_6 int,
-                          galaxy_id int,
-                          c_in real,
-                          mB real,
-                          t0_in real,
-                          x0_in real,
-                          x1_in real,
-                          z_in real,
-                          snid_in text,
-                          snra_in real,
-                          sndec_in real)"""
-
-        cursor.execute(creation_cmd)
-        conn.commit()
+    # the file is rebuilt from scratch if the load fails
+    with SqliteBulkWriter(args.out_file, synchronous='OFF') as writer:
+        writer.create_table('sne_params', [('htmid_level_6', 'int'),
+                                           ('galaxy_id', 'int'),
+                                           ('c_in', 'real'),
+                                           ('mB', 'real'),
+                                           ('t0_in', 'real'),
+                                           ('x0_in', 'real'),
+                                           ('x1_in', 'real'),
+                                           ('z_in', 'real'),
+                                           ('snid_in', 'text'),
+                                           ('snra_in', 'real'),
+                                           ('sndec_in', 'real')])
+
+        writer.add_index('htmid_index', 'sne_params', ['htmid_level_6'])
+        # used by SNeDBObject to select the SNe active at a visit's MJD;
+        # ANALYZE lets sqlite choose between the spatial and time indexes
+        writer.add_index('t0_index', 'sne_params', ['t0_in'], analyze=True)
         t_start = time.time()
-        for i_file, file_name in enumerate(data_dir_file_names):
-            if not file_name.endswith('csv'):
-                continue
-            duration = (time.time()-t_start)/3600.0
-            per = duration/(i_file+1)
-            predict = per*len(data_dir_file_names)
-            full_name = os.path.join(args.in_dir, file_name)
-            print('reading %s; elapsed %.2e; predict %.2e' %
-            (file_name, duration, predict))
-
-            with open(full_name, 'r') as input_file:
-                input_lines = input_file.readlines()[1:]
-
-            params_list = []
-            for line in input_lines:
-                params = line.strip().split(',')
-
-                if len(params) == 23:
-                    htmid = findHtmid(float(params[21]), float(params[22]),
-                                      max_level=htmid_level)
-
-                    pv = [htmid, int(params[0])]
-                    pv += [float(pp) for pp in params[1:6]]
-                    pv += [float(params[11])]
-                    pv += [params[20]]
-                    pv += [float(params[21]), float(params[22])]
-
-                elif len(params) == 10:
-                    htmid = findHtmid(float(params[8]), float(params[9]),
-                                      max_level=htmid_level)
-
-                    pv = [htmid, int(params[0])]
-                    pv += [float(params[1]), float(params[2])]
-                    pv += [float(pp) for pp in params[4:8]]
-                    pv += [params[3]]
-                    pv += [float(params[8]), float(params[9])]
-                else:
-                    raise RuntimeError("could not parse line\n"
-                                       + line
-                                       +"\n")
-
-                params_list.append(tuple(pv))
-            cursor.executemany('''INSERT INTO sne_params
-                               VALUES(?,?,?,?,?,?,?,?,?,?,?)''', params_list)
-
-            conn.commit()
-
-        cursor.execute('''CREATE INDEX htmid_index ON sne_params (htmid_level_6)''')
-        conn.commit()
+
+        # the files are parsed in parallel and inserted in order,
+        # so that the rows are those the serial load wrote
+        full_names = [os.path.join(args.in_dir, file_name)
+                      for file_name in data_dir_file_names]
+        with multiprocessing.Pool(args.n_processes) as pool:
+            for i_file, columns in enumerate(pool.imap(parse_sne_csv, full_names)):
+                duration = (time.time()-t_start)/3600.0
+                per = duration/(i_file+1)
+                predict = per*len(data_dir_file_names)
+                print('read %s; elapsed %.2e; predict %.2e' %
+                      (data_dir_file_names[i_file], duration, predict))
+
+                writer.insert('sne_params', columns)
@@ -2,11 +2,14 @@
 import argparse
 import warnings
 import os
-import copy
+import sys
 import time
 import multiprocessing
 import numbers
 import json
+import queue
+import collections
+import traceback
 from astropy._erfa import ErfaWarning
 
 with warnings.catch_warnings():
@@ -19,9 +22,40 @@ with warnings.catch_warnings():
     warnings.filterwarnings('ignore', 'invalid value', RuntimeWarning)
 
     from desc.sims.GCRCatSimInterface import InstanceCatalogWriter
+    from desc.sims.GCRCatSimInterface import format_profiles
+    from desc.sims.GCRCatSimInterface import plan_visits
+    from desc.sims.GCRCatSimInterface import read_healpix_counts
+    from desc.sims.GCRCatSimInterface import plan_catalogs
 
 
-def generate_instance_catalog(args=None, lock=None):
+def _log_job(args, lock, msg):
+    """
+    Append msg to the 'job started/completed' log (if any)
+    """
+    if args.job_log is None:
+        return
+    if lock is not None:
+        lock.acquire()
+    try:
+        with open(args.job_log, 'a') as out_file:
+            out_file.write(msg)
+    finally:
+        if lock is not None:
+            lock.release()
+
+
+def generate_instance_catalog(args=None, lock=None, obsHistID_list=None,
+                              healpix_order=None):
+    """
+    Write the InstanceCatalogs for the visits in obsHistID_list
+    (default: args.ids).  The InstanceCatalogWriter is created on the
+    first call and reused by later calls in the same process.
+
+    healpix_order is an optional dict mapping obsHistID to the order
+    in which galaxy healpixels are loaded (see plan_visits).
+    """
+    if obsHistID_list is None:
+        obsHistID_list = args.ids
 
     with warnings.catch_warnings():
         if args.suppress_warnings:
@@ -53,23 +87,28 @@ def generate_instance_catalog(args=None, lock=None):
                                                    host_data_dir=args.host_data_dir,
                                                    sprinkler=args.enable_sprinkler,
                                                    gzip_threads=args.gzip_threads,
+                                                   checkpoint=args.checkpoint,
+                                                   format_profile=args.format_profile,
+                                                   sensor_shards=args.sensor_shards,
+                                                   shard_margin=args.shard_margin,
+                                                   max_rss_gb=args.max_rss_gb,
+                                                   visit_table_file=args.visit_table,
+                                                   sn_sed_archive=args.sn_sed_archive,
                                                    config_dict=config_dict)
 
             generate_instance_catalog.instcat_writer = instcat_writer
 
 
-        for obsHistID in args.ids:
-            if args.job_log is not None:
-                if lock is not None:
-                    lock.acquire()
-                with open(args.job_log, 'a') as out_file:
-                    out_file.write('starting %d at time %.0f\n' % (obsHistID, time.time()))
-                if lock is not None:
-                    lock.release()
+        config_dict = generate_instance_catalog.instcat_writer.config_dict
+        if healpix_order is not None:
+            generate_instance_catalog.instcat_writer.healpix_order = healpix_order
+
+        for obsHistID in obsHistID_list:
+            _log_job(args, lock, 'starting %d at time %.0f\n' % (obsHistID, time.time()))
 
             pickup_file = None
             if args.pickup_dir is not None:
-                pickup_file = os.path.join(args.pickup_dir, 'job_log_%.8d.txt' % obsHistID)
+                pickup_file = os.path.join(args.pickup_dir, 'job_log_%.8d.jsonl' % obsHistID)
                 config_dict['pickup_file'] = pickup_file
 
             status_file_name = generate_instance_catalog.instcat_writer.write_catalog(obsHistID,
@@ -78,13 +117,185 @@ def generate_instance_catalog(args=None, lock=None):
                                                                    status_dir=args.out_dir,
                                                                    pickup_file=pickup_file)
 
-            if args.job_log is not None:
-                if lock is not None:
-                    lock.acquire()
-                with open(args.job_log, 'a') as out_file:
-                    out_file.write('ending %d at time %.0f\n' % (obsHistID, time.time()))
-                if lock is not None:
-                    lock.release()
+            _log_job(args, lock, 'ending %d at time %.0f\n' % (obsHistID, time.time()))
+
+
+def _run_visit(args, lock, obsHistID, healpix_order=None):
+    """
+    Generate one visit, catching any exception.
+
+    Returns a tuple (succeeded, duration in seconds, error message)
+    """
+    t_start = time.time()
+    try:
+        generate_instance_catalog(args=args, lock=lock,
+                                  obsHistID_list=[obsHistID],
+                                  healpix_order=healpix_order)
+    except Exception:
+        msg = traceback.format_exc()
+        _log_job(args, lock, 'failed %d at time %.0f\n%s' % (obsHistID, time.time(), msg))
+        return False, time.time()-t_start, msg.strip().split('\n')[-1]
+    return True, time.time()-t_start, None
+
+
+def queue_worker(args, lock, inbox, result_queue, healpix_order=None):
+    """
+    Process the tasks (lists of obsHistIDs to be processed in order)
+    the parent puts in this worker's inbox until the sentinel None is
+    found, reporting ('started', pid, obsHistID) and
+    ('finished', pid, obsHistID, succeeded, duration, message)
+    on result_queue.
+    """
+    pid = os.getpid()
+    while True:
+        task = inbox.get()
+        if task is None:
+            break
+        for obsHistID in task:
+            result_queue.put(('started', pid, obsHistID))
+            succeeded, duration, msg = _run_visit(args, lock, obsHistID,
+                                                  healpix_order=healpix_order)
+            result_queue.put(('finished', pid, obsHistID, succeeded, duration, msg))
+
+
+def run_task_queue(args, task_list, n_jobs, max_retries=0, healpix_order=None):
+    """
+    Generate visits with n_jobs worker processes.  The parent hands
+    each idle worker the next task, so that a slow visit only delays
+    the worker processing it, and records the assignment before the
+    task is sent, so that the visits of a worker that dies are never
+    lost.  Each task is a list of obsHistIDs that one worker processes
+    in order (e.g. a group of overlapping visits from plan_visits).
+    Failed visits (including those whose worker died) are queued
+    again up to max_retries times.
+
+    Returns a dict keyed on obsHistID.  Values are lists of
+    (succeeded, duration, message) tuples, one per attempt.
+    """
+    lock = multiprocessing.Lock()
+    result_queue = multiprocessing.Queue()
+
+    attempts = {}
+    pending = collections.deque()
+    for task in task_list:
+        for obsHistID in task:
+            if obsHistID in attempts:
+                raise RuntimeError("obsHistID %d is in more than one task"
+                                   % obsHistID)
+            attempts[obsHistID] = []
+        pending.append(list(task))
+    n_outstanding = len(attempts)
+    completed = set()
+
+    workers = {}  # pid -> (process, inbox)
+    held = {}  # pid -> obsHistIDs sent to the worker but not yet finished
+    running = {}  # pid -> (obsHistID, start time)
+
+    def start_worker():
+        inbox = multiprocessing.Queue()
+        p = multiprocessing.Process(target=queue_worker,
+                                    args=(args, lock, inbox, result_queue),
+                                    kwargs={'healpix_order': healpix_order})
+        p.start()
+        workers[p.pid] = (p, inbox)
+        held[p.pid] = []
+
+    def dispatch():
+        for pid in workers:
+            if len(pending) == 0:
+                break
+            if len(held[pid]) == 0:
+                task = pending.popleft()
+                held[pid] = list(task)
+                workers[pid][1].put(task)
+
+    def record(obsHistID, succeeded, duration, msg):
+        attempts[obsHistID].append((succeeded, duration, msg))
+        if not succeeded and len(attempts[obsHistID]) <= max_retries:
+            print('retrying %d after failure: %s' % (obsHistID, msg))
+            pending.append([obsHistID])
+            return 0
+        completed.add(obsHistID)
+        return 1
+
+    for i_job in range(min(n_jobs, len(pending))):
+        start_worker()
+    dispatch()
+
+    while n_outstanding > 0:
+        try:
+            result = result_queue.get(timeout=10)
+        except queue.Empty:
+            result = None
+
+        if result is not None:
+            if result[0] == 'started':
+                running[result[1]] = (result[2], time.time())
+            else:
+                running.pop(result[1], None)
+                held[result[1]].remove(result[2])
+                n_outstanding -= record(*result[2:])
+            dispatch()
+            continue
+
+        # look for workers that died mid-visit (e.g. killed for memory)
+        for pid in list(workers.keys()):
+            if workers[pid][0].is_alive():
+                continue
+            exitcode = workers.pop(pid)[0].exitcode
+            remaining = held.pop(pid)
+            if pid in running:
+                obsHistID, t_start = running.pop(pid)
+                remaining.remove(obsHistID)
+                n_outstanding -= record(obsHistID, False, time.time()-t_start,
+                                        'worker exited with code %s' % exitcode)
+            if len(remaining) > 0:
+                # visits of the dead worker's task that were never started
+                pending.appendleft(remaining)
+
+        n_idle = len([pid for pid in workers if len(held[pid]) == 0])
+        while len(workers) < n_jobs and len(pending) > n_idle:
+            start_worker()
+            n_idle += 1
+        dispatch()
+
+        # nothing is running, held or waiting, so no result can arrive
+        if (n_outstanding > 0 and len(pending) == 0 and
+            all(len(hh) == 0 for hh in held.values())):
+            for obsHistID in attempts:
+                if obsHistID not in completed:
+                    attempts[obsHistID].append((False, 0.0,
+                                                'visit was lost by its worker'))
+            n_outstanding = 0
+
+    for p, inbox in workers.values():
+        inbox.put(None)
+    for p, inbox in workers.values():
+        p.join()
+
+    return attempts
+
+
+def summarize_attempts(attempts):
+    """
+    Return a list of lines summarizing the output of run_task_queue
+    """
+    lines = ['%12s %10s %8s %12s  %s' % ('obsHistID', 'status', 'attempts',
+                                          'duration(s)', 'error')]
+    n_failed = 0
+    for obsHistID in sorted(attempts):
+        if len(attempts[obsHistID]) == 0:
+            continue
+        succeeded, duration, msg = attempts[obsHistID][-1]
+        if not succeeded:
+            n_failed += 1
+        lines.append('%12d %10s %8d %12.1f  %s' %
+                     (obsHistID, 'ok' if succeeded else 'FAILED',
+                      len(attempts[obsHistID]),
+                      sum(aa[1] for aa in attempts[obsHistID]),
+                      '' if succeeded else msg))
+    lines.append('%d visits; %d failed' % (len(attempts), n_failed))
+    return lines
 
 
 if __name__ == "__main__":
@@ -140,7 +351,18 @@ if __name__ == "__main__":
     parser.add_argument('--suppress_warnings', default=False, action='store_true',
                         help='flag to suppress warnings')
     parser.add_argument('--n_jobs', type=int, default=1,
-                        help='Number of jobs to run in parallel with multiprocessing')
+                        help='Number of jobs to run in parallel with multiprocessing '
+                        '(each pulls visits from a shared queue)')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Number of times to retry a visit that failed')
+    parser.add_argument('--group_by_footprint', default=False, action='store_true',
+                        help='flag to group visits with overlapping footprints '
+                        'into tasks of about --group_size visits and to load '
+                        'their healpixels in an order that reuses the ones '
+                        'just read')
+    parser.add_argument('--group_size', type=int, default=8,
+                        help='Number of visits in each --group_by_footprint task '
+                        '(there are at least --n_jobs tasks)')
     parser.add_argument('--gzip_threads', type=int, default=3,
                         help="number of parallel gzip jobs any one "
                              "InstanceCatalogWriter can start in parallel "
@@ -148,7 +370,49 @@ if __name__ == "__main__":
     parser.add_argument('--job_log', type=str, default=None,
                         help="file where we will write 'job started/completed' messages")
     parser.add_argument('--pickup_dir', type=str, default=None,
-                        help='directory to check for aborted job logs')
+                        help='directory to check for aborted job journals '
+                        '(job_log_<obsHistID>.jsonl)')
+    parser.add_argument('--checkpoint', default=False, action='store_true',
+                        help='flag to checkpoint galaxy catalogs at healpixel '
+                        'boundaries so that aborted components can resume '
+                        'from the last completed healpixel')
+    parser.add_argument('--format_profile', type=str, default=None,
+                        choices=list(format_profiles.keys()),
+                        help='significant-digit profile with which to write '
+                        'the galaxy and supernova catalogs (default: the '
+                        'usual PhoSim formats)')
+    parser.add_argument('--sensor_shards', default=False, action='store_true',
+                        help='flag to also write one InstanceCatalog per '
+                        'sensor, with a manifest of sensors and row counts')
+    parser.add_argument('--shard_margin', type=float, default=10.0,
+                        help='number of pixels by which sensors are grown '
+                        'when assigning objects to sensor catalogs')
+    parser.add_argument('--max-rss-gb', dest='max_rss_gb', type=float,
+                        default=None,
+                        help='resident set size budget in GB; galaxy '
+                        'healpixels are then loaded in chunks sized to '
+                        'stay within it (default: fixed-size chunks)')
+    parser.add_argument('--visit_table', type=str, default=None,
+                        help='.npz cache of the OpSim Summary columns; '
+                        'written from --db if it does not exist and read '
+                        'instead of querying --db otherwise')
+    parser.add_argument('--sn_sed_archive', default=False, action='store_true',
+                        help='flag to write the supernova spectra of a visit '
+                        'into one archive file (with an index of offsets) '
+                        'instead of one file per supernova')
+    parser.add_argument('--plan-only', dest='plan_only', default=False,
+                        action='store_true',
+                        help='only estimate the object counts, output size, '
+                        'memory and runtime of each visit from index data '
+                        '(no catalogs are read or written)')
+    parser.add_argument('--healpix_counts', type=str, default=None,
+                        help='table of galaxies per nside=32 healpixel used '
+                        'by --plan-only (see CostModel.write_healpix_counts)')
+    parser.add_argument('--cost_journals', type=str, nargs='+', default=None,
+                        help='job journals (or directories of them) from past '
+                        'runs used to calibrate the --plan-only estimates')
+    parser.add_argument('--plan_file', type=str, default=None,
+                        help='json file in which --plan-only writes its estimates')
     args = parser.parse_args()
 
     if args.config_file is not None:
@@ -158,26 +422,69 @@ if __name__ == "__main__":
 
     print('args ',args.n_jobs,args.ids)
 
-    if args.n_jobs==1 or isinstance(args.ids, numbers.Number) or len(args.ids)==1:
-        generate_instance_catalog(args=args)
+    if isinstance(args.ids, numbers.Number):
+        args.ids = [args.ids]
+
+    if args.ids is not None and len(set(args.ids)) != len(args.ids):
+        raise RuntimeError("--ids contains duplicate obsHistIDs")
+
+    if args.plan_only:
+        if args.ids is None:
+            raise RuntimeError("--plan-only needs the visits to plan (--ids)")
+        healpix_counts = None
+        if args.healpix_counts is not None:
+            healpix_counts = read_healpix_counts(args.healpix_counts)
+        lines, plan = plan_catalogs(args.db, args.ids,
+                                    healpix_counts=healpix_counts,
+                                    agn_db=args.agn_db_name,
+                                    sne_db=args.sn_db_name,
+                                    star_db=args.star_db_name,
+                                    fov=args.fov,
+                                    dither=not args.disable_dithering,
+                                    cost_journals=args.cost_journals)
+        if args.healpix_counts is None:
+            lines.append('(no --healpix_counts given; galaxy counts are 0)')
+        print('\n'.join(lines))
+        if args.plan_file is not None:
+            with open(args.plan_file, 'w') as out_file:
+                json.dump({str(obs_id): pp for obs_id, pp in plan.items()},
+                          out_file, indent=2)
+        sys.exit(0)
+
+    healpix_order = None
+    if args.group_by_footprint:
+        # many small groups, so that a worker that finishes early
+        # (or a failed visit) does not leave the others idle
+        n_groups = max(args.n_jobs, -(-len(args.ids)//args.group_size))
+        task_list, healpix_order = plan_visits(args.db, args.ids, n_groups,
+                                               fov=args.fov,
+                                               dither=not args.disable_dithering)
+    else:
+        task_list = [[obsHistID] for obsHistID in args.ids]
+
+    if args.n_jobs==1 or len(args.ids)==1:
+        attempts = {}
+        for task in task_list:
+            for obsHistID in task:
+                attempts[obsHistID] = []
+                while len(attempts[obsHistID]) <= args.retries:
+                    attempts[obsHistID].append(_run_visit(args, None, obsHistID,
+                                                          healpix_order=healpix_order))
+                    if attempts[obsHistID][-1][0]:
+                        break
     else:
         print('trying multi processing')
-        lock = multiprocessing.Lock()
-        job_list = []
-        n_id = len(args.ids)//args.n_jobs  # number of ids per job
-        print('n_id is %d' % n_id)
-        for i_start in range(0, len(args.ids), n_id):
-            local_args = copy.deepcopy(args)
-            local_args.ids = args.ids[i_start:i_start+n_id]
-            print('local_ids ',local_args.ids)
-            p = multiprocessing.Process(target=generate_instance_catalog,
-                                        kwargs={'args':local_args, 'lock':lock})
-            p.start()
-            job_list.append(p)
-
-        for p in job_list:
-            p.join()
+        attempts = run_task_queue(args, task_list, args.n_jobs,
+                                  max_retries=args.retries,
+                                  healpix_order=healpix_order)
+
+    summary = summarize_attempts(attempts)
+    print('\n'.join(summary))
+    _log_job(args, None, '\n'.join(summary) + '\n')
 
     if args.job_log is not None:
         with open(args.job_log, 'a') as out_file:
             out_file.write('%s should be completed\n' % str(args.ids))
+
+    if any(not attempts[obsHistID][-1][0] for obsHistID in attempts):
+        sys.exit(1)
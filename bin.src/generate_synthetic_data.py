@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+This script will write small synthetic stand-ins for cosmoDC2, the
+SED-fit lookup files, the AGN, SNe and star databases and the OpSim
+database, so that the InstanceCatalog and truth catalog code can be
+run (e.g. benchmarked) on any machine.
+
+Pass the fixtures.json manifest it writes (or the files listed in it)
+to the other scripts, e.g.
+
+generateInstCat.py --db <out_dir>/opsim.db
+                   --descqa_catalog <out_dir>/mock_galaxies.yaml
+                   --sed_lookup_dir <out_dir>/sed_lookup
+                   --star_db_name <out_dir>/stars.db ...
+"""
+import argparse
+import json
+
+from desc.sims.GCRCatSimInterface.synthetic import make_fixtures
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out_dir', type=str, required=True,
+                        help='directory in which to write the fixtures')
+    parser.add_argument('--n_galaxies', type=int, default=100000,
+                        help='number of galaxies (default 100000)')
+    parser.add_argument('--n_stars', type=int, default=20000,
+                        help='number of stars (default 20000)')
+    parser.add_argument('--n_sne', type=int, default=2000,
+                        help='number of SNe (default 2000)')
+    parser.add_argument('--agn_fraction', type=float, default=0.02,
+                        help='fraction of galaxies hosting an AGN '
+                        '(default 0.02)')
+    parser.add_argument('--n_visits', type=int, default=12,
+                        help='number of visits in the OpSim database '
+                        '(default 12)')
+    parser.add_argument('--ra', type=float, default=55.0,
+                        help='RA of the patch center in degrees (default 55)')
+    parser.add_argument('--dec', type=float, default=-29.0,
+                        help='Dec of the patch center in degrees (default -29)')
+    parser.add_argument('--radius', type=float, default=2.5,
+                        help='radius of the patch in degrees (default 2.5)')
+    parser.add_argument('--seed', type=int, default=6712,
+                        help='random number seed (default 6712)')
+    args = parser.parse_args()
+
+    manifest = make_fixtures(args.out_dir, n_galaxies=args.n_galaxies,
+                             n_stars=args.n_stars, n_sne=args.n_sne,
+                             agn_fraction=args.agn_fraction,
+                             n_visits=args.n_visits, ra0=args.ra,
+                             dec0=args.dec, radius=args.radius,
+                             seed=args.seed)
+    print(json.dumps(manifest, indent=2))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+This script will predict the runtime and memory needed to generate the
+InstanceCatalogs of a list of visits and pack the visits into bins
+(e.g. the nodes of a batch job) that balance those costs.
+
+The output file has one line per bin listing its obsHistIDs,
+preceded by a comment giving the predicted runtime and memory.
+"""
+import argparse
+
+from desc.sims.GCRCatSimInterface import read_healpix_counts
+from desc.sims.GCRCatSimInterface import measured_costs, visit_features
+from desc.sims.GCRCatSimInterface import VisitCostModel, pack_visits
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--opsim_db', type=str, required=True,
+                        help='the OpSim database')
+    parser.add_argument('--candidate_file', type=str, required=True,
+                        help='file listing the obsHistIDs to pack '
+                        '(first comma-separated column of each line)')
+    parser.add_argument('--healpix_counts', type=str, required=True,
+                        help='table of galaxies per nside=32 healpixel '
+                        '(see write_healpix_counts)')
+    parser.add_argument('--agn_db', type=str, default=None,
+                        help='AGN parameter database (create_agn_db.py)')
+    parser.add_argument('--sne_db', type=str, default=None,
+                        help='SNe parameter database (create_sne_db.py)')
+    parser.add_argument('--journals', type=str, nargs='+', default=None,
+                        help='job journals (or directories of them) from '
+                        'past runs used to calibrate the model')
+    parser.add_argument('--n_bins', type=int, required=True,
+                        help='number of bins to pack the visits into')
+    parser.add_argument('--n_parallel', type=int, default=7,
+                        help='number of visits each bin runs at once '
+                        '(default 7)')
+    parser.add_argument('--max_memory', type=float, default=None,
+                        help='memory available to each bin in GB')
+    parser.add_argument('--fov', type=float, default=2.0,
+                        help='field of view radius in degrees')
+    parser.add_argument('--disable_dithering', default=False,
+                        action='store_true',
+                        help='flag to disable dithering')
+    parser.add_argument('--out_file', type=str, required=True,
+                        help='file in which to write the bins')
+    args = parser.parse_args()
+
+    obs_list = []
+    with open(args.candidate_file, 'r') as in_file:
+        for line in in_file:
+            try:
+                obs_list.append(int(line.strip().split(',')[0]))
+            except ValueError:
+                pass
+
+    features = visit_features(args.opsim_db, obs_list,
+                              read_healpix_counts(args.healpix_counts),
+                              agn_db=args.agn_db, sne_db=args.sne_db,
+                              fov=args.fov, dither=not args.disable_dithering)
+
+    model = VisitCostModel()
+    measured = None
+    if args.journals is not None:
+        measured = measured_costs(args.journals)
+        n_fit = model.fit(features, measured)
+        print('calibrated on %d visits' % n_fit)
+    print('runtime coefficients ', model.runtime_coeffs)
+    print('memory coefficients ', model.memory_coeffs)
+
+    costs = model.predict(features, measured=measured)
+    bins = pack_visits(costs, args.n_bins, n_parallel=args.n_parallel,
+                       max_memory=args.max_memory)
+
+    with open(args.out_file, 'w') as out_file:
+        for bb in bins:
+            out_file.write('# runtime_hrs %.2f memory_gb %.1f\n'
+                           % (bb['runtime']/3600.0, bb['memory']))
+            out_file.write(' '.join('%d' % obs_id for obs_id in bb['obsHistID']))
+            out_file.write('\n')
+            print('%d visits; %.2f hrs; %.1f GB' % (len(bb['obsHistID']),
+                                                  bb['runtime']/3600.0,
+                                                  bb['memory']))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+This script will time the performance-critical code paths of this
+package against small synthetic fixtures and compare the timings
+against a stored baseline.
+
+run_benchmarks.py run --fixtures_dir <dir> --out results.json
+    (generates the fixtures in <dir> if they are not already there)
+
+run_benchmarks.py compare baseline.json results.json
+    (exits with status 1 if any benchmark slowed down by more than
+    --threshold)
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import shutil
+
+
+def run(args):
+    from desc.sims.GCRCatSimInterface.synthetic import make_fixtures
+    from desc.sims.GCRCatSimInterface.benchmarks import hot_path_benchmarks
+    from desc.sims.GCRCatSimInterface.benchmarks import run_benchmarks
+    from desc.sims.GCRCatSimInterface.benchmarks import write_results
+
+    manifest_name = os.path.join(args.fixtures_dir, 'fixtures.json')
+    if os.path.exists(manifest_name):
+        with open(manifest_name, 'r') as in_file:
+            manifest = json.load(in_file)
+    else:
+        print('writing fixtures to %s' % args.fixtures_dir)
+        manifest = make_fixtures(args.fixtures_dir,
+                                 n_galaxies=args.n_galaxies)
+
+    work_dir = tempfile.mkdtemp(prefix='benchmarks_', dir=args.scratch_dir)
+    try:
+        benchmarks = {name: hot_path_benchmarks[name](manifest, work_dir)
+                      for name in hot_path_benchmarks}
+        results = run_benchmarks(benchmarks, names=args.only,
+                                 repeat=args.repeat)
+    finally:
+        shutil.rmtree(work_dir)
+
+    results['metadata']['fixtures'] = manifest_name
+    results['metadata']['n_galaxies'] = manifest['n_galaxies']
+    write_results(results, args.out)
+    print('wrote %s' % args.out)
+
+
+def compare(args):
+    from desc.sims.GCRCatSimInterface.benchmarks import read_results
+    from desc.sims.GCRCatSimInterface.benchmarks import compare_results
+
+    comparison = compare_results(read_results(args.baseline),
+                                 read_results(args.current),
+                                 threshold=args.threshold)
+    print('%-24s %14s %14s %8s' % ('benchmark', 'baseline(s/item)',
+                                   'current(s/item)', 'ratio'))
+    n_regressions = 0
+    for name, base_time, cur_time, ratio, flag in comparison:
+        print('%-24s %14.4e %14.4e %8.3f %s' %
+              (name, base_time, cur_time, ratio, flag))
+        if flag == 'REGRESSION':
+            n_regressions += 1
+    if n_regressions > 0:
+        print('%d regression(s) beyond %.0f%%' %
+              (n_regressions, 100.0*args.threshold))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--fixtures_dir', type=str, required=True,
+                            help='directory holding (or to hold) the '
+                            'synthetic fixtures')
+    run_parser.add_argument('--out', type=str, required=True,
+                            help='json file in which to write the results')
+    run_parser.add_argument('--only', type=str, nargs='+', default=None,
+                            help='names of the benchmarks to run '
+                            '(default: all)')
+    run_parser.add_argument('--repeat', type=int, default=3,
+                            help='timed calls per benchmark (default 3)')
+    run_parser.add_argument('--n_galaxies', type=int, default=100000,
+                            help='galaxies in newly generated fixtures '
+                            '(default 100000)')
+    run_parser.add_argument('--scratch_dir', type=str, default=None,
+                            help='where to write benchmark outputs '
+                            '(default: the system temporary directory)')
+
+    compare_parser = subparsers.add_parser('compare',
+                                           help='compare results against '
+                                           'a baseline')
+    compare_parser.add_argument('baseline', type=str,
+                                help='json results of the baseline run')
+    compare_parser.add_argument('current', type=str,
+                                help='json results of the run to check')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='fractional slow-down flagged as a '
+                                'regression (default 0.2)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'compare':
+        compare(args)
+    else:
+        parser.print_help()
+        sys.exit(2)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+This script will read the JSON-lines journals written by
+InstanceCatalogWriter.write_catalog and print a summary of
+each visit's progress.
+"""
+import os
+import argparse
+
+from desc.sims.GCRCatSimInterface import summarize_journal
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('journals', type=str, nargs='+',
+                        help='journal files (job_log_*.jsonl) or directories '
+                        'containing them')
+    args = parser.parse_args()
+
+    file_name_list = []
+    for name in args.journals:
+        if os.path.isdir(name):
+            for sub_name in sorted(os.listdir(name)):
+                if sub_name.startswith('job_log_') and sub_name.endswith('.jsonl'):
+                    file_name_list.append(os.path.join(name, sub_name))
+        else:
+            file_name_list.append(name)
+
+    n_finished = 0
+    for file_name in file_name_list:
+        summary = summarize_journal(file_name)
+        if summary['finished']:
+            n_finished += 1
+        print('%s %s rows %d bytes %d wall %.3e hrs peak_rss %.1f MB' %
+              (summary['obsHistID'],
+               'done' if summary['finished'] else 'INCOMPLETE',
+               summary['total_rows'], summary['total_bytes'],
+               summary['wall_time']/3600.0, summary['peak_rss_mb']))
+        for component in sorted(summary['components']):
+            comp = summary['components'][component]
+            print('    %-10s rows %d bytes %d wall %.3e hrs' %
+                  (component, comp['rows'], comp['bytes'],
+                   comp['wall_time']/3600.0))
+
+    print('%d of %d visits finished' % (n_finished, len(file_name_list)))
@@ -1,4 +1,5 @@
 import os
+import io
 import re
 import numpy as np
 import healpy
@@ -6,6 +7,10 @@ import h5py
 import copy
 from lsst.utils import getPackageDir
 from desc.sims.GCRCatSimInterface import _DESCQAObject_metadata
+from desc.sims.GCRCatSimInterface import HealpixCheckpointMixin
+from desc.sims.GCRCatSimInterface import write_columnar_chunk
+from desc.sims.GCRCatSimInterface import VectorizedFormatMixin, format_columns
+from desc.sims.GCRCatSimInterface import SNSedWriter
 from lsst.sims.catalogs.definitions import InstanceCatalog
 from lsst.sims.catalogs.decorators import cached
 from lsst.sims.catUtils.exampleCatalogDefinitions import PhoSimCatalogSersic2D
@@ -25,7 +30,7 @@ __all__ = ["PhoSimDESCQA", "PhoSimDESCQA_AGN", "DC2PhosimCatalogSN",
 # define a class to write the PhoSim catalog; defining necessary defaults
 
 
-class SubCatalogMixin(object):
+class SubCatalogMixin(VectorizedFormatMixin):
     """
     This mixin provides a way to write parallel catalogs from
     a CompoundInstanceCatalog.  It supplants the _write_recarray
@@ -38,6 +43,17 @@ class SubCatalogMixin(object):
     subcat_prefix = None  # prefix prepended to main InstanceCatalog file name
     subcat_suffix = None  # suffix appended to main InstanceCatalog file name
 
+    # The format in which the SubCatalog is written:
+    # 'text' -- the usual text file
+    # 'hdf5' -- a typed columnar HDF5 file (the text file name + '.h5');
+    #           see ColumnarCatalog.columnar_to_phosim_text to regenerate
+    #           the text
+    # 'both' -- both of the above
+    subcat_format = 'text'
+
+    # the name of the columnar file (set when it is first written)
+    _subcat_columnar_name = None
+
     # This boolean will keep track of whether or not this
     # truth catalog has been written to yet.  If it has,
     # it will be opened in mode 'a'; if not, it will be
@@ -94,7 +110,14 @@ class SubCatalogMixin(object):
         file_handle points to the main InstanceCatalog that
         the CompoundInstanceCatalog is trying to write
         """
-        if self._subcat_file_handle is None:
+        if self.subcat_format not in ('text', 'hdf5', 'both'):
+            raise RuntimeError("Unknown subcat_format '%s'; "
+                               "must be 'text', 'hdf5' or 'both'"
+                               % self.subcat_format)
+
+        if (self._subcat_file_handle is None and
+            self._subcat_columnar_name is None):
+
             subcat_name = self._get_subcat_name(file_handle)
             if not self._subcat_cat_written:
                 write_mode = 'w'
@@ -104,20 +127,46 @@ class SubCatalogMixin(object):
                                        + "which was already created")
             else:
                 write_mode = 'a'
-            self._subcat_file_handle = open(subcat_name, write_mode)
             self._subcat_cat_written = True
             self._list_of_opened_subcats.add(subcat_name)
 
+            header = ''
             if write_mode == 'w' and self._write_subcat_header:
                 # call InstanceCatalog.write_header to avoid calling
                 # the PhoSim catalog write_header (which will require
                 # a phoSimHeaderMap)
-                InstanceCatalog.write_header(self, self._subcat_file_handle)
-
-        InstanceCatalog._write_recarray(self, local_recarray,
-                                        self._subcat_file_handle)
-
-        self._subcat_file_handle.flush()
+                header_handle = io.StringIO()
+                InstanceCatalog.write_header(self, header_handle)
+                header = header_handle.getvalue()
+
+            if self.subcat_format in ('text', 'both'):
+                self._subcat_file_handle = open(subcat_name, write_mode)
+                self._subcat_file_handle.write(header)
+
+            if self.subcat_format in ('hdf5', 'both'):
+                self._subcat_columnar_name = subcat_name + '.h5'
+                self._subcat_columnar_mode = write_mode
+                self._subcat_columnar_header = header
+
+        self._filter_chunk(local_recarray)
+        if len(self._current_chunk) == 0:
+            return
+        column_names, chunk_cols = self._column_values()
+        formats = self._column_formats(column_names, chunk_cols)
+
+        if self._subcat_file_handle is not None:
+            self._subcat_file_handle.write(format_columns(formats, chunk_cols,
+                                                          delimiter=self.delimiter,
+                                                          endline=self.endline))
+            self._subcat_file_handle.flush()
+
+        if self._subcat_columnar_name is not None:
+            write_columnar_chunk(self._subcat_columnar_name, column_names,
+                                 chunk_cols,
+                                 self.delimiter.join(formats) + self.endline,
+                                 write_mode=self._subcat_columnar_mode,
+                                 header=self._subcat_columnar_header)
+            self._subcat_columnar_mode = 'a'
 
 
 class SprinklerTruthCatMixin(SubCatalogMixin):
@@ -134,7 +183,7 @@ class SprinklerTruthCatMixin(SubCatalogMixin):
     _write_subcat_header = True
 
 
-class DC2PhosimCatalogSN(PhoSimCatalogSN):
+class DC2PhosimCatalogSN(VectorizedFormatMixin, PhoSimCatalogSN):
     """
     Modification of the PhoSimCatalogSN mixin to provide shorter sedFileNames
     by leaving out the parts of the directory name. Also fix name changes from
@@ -145,6 +194,30 @@ class DC2PhosimCatalogSN(PhoSimCatalogSN):
             mn = self.column_by_name('phoSimMagNorm')
             return np.where(mn<500.0, mn, np.NaN)
 
+    # the SNSedWriter evaluating and writing the spectra
+    sn_sed_writer = None
+
+    @compound('TsedFilepath', 'magNorm')
+    def get_phosimVars(self):
+        """
+        Evaluate the rest-frame spectra of the SNe in the chunk and
+        their magNorms all at once (see SNSedWriter).  The spectra,
+        magNorms and file names are those of
+        PhoSimCatalogSN.get_phosimVars.
+        """
+        if self.sn_sed_writer is None:
+            self.sn_sed_writer = SNSedWriter()
+        return self.sn_sed_writer.write(self.sn_sedfile_prefix,
+                                        self.column_by_name(self.refIdCol),
+                                        self.obs_metadata.mjd.TAI,
+                                        self.obs_metadata.bandpass,
+                                        self.column_by_name('t0'),
+                                        self.column_by_name('x0'),
+                                        self.column_by_name('x1'),
+                                        self.column_by_name('c'),
+                                        self.column_by_name('redshift'),
+                                        write_files=self.writeSedFile)
+
     def get_uniqueId(self):
         return self.column_by_name(self.refIdCol)
 
@@ -160,16 +233,14 @@ class DC2PhosimCatalogSN(PhoSimCatalogSN):
         `self.sn_sedfile_prefix` before writing out
         a phosim catalog.
         """
-        fnames = self.column_by_name('sedFilepath')
+        fnames = np.asarray(self.column_by_name('sedFilepath'), dtype=str)
         sep = 'Dynamic/specFileSN_'
-        split_names = []
-        for fname in fnames:
-            if 'None' not in fname:
-                fname = sep + fname.split(sep)[-1]
-            else:
-                fname = 'None'
-            split_names.append(fname)
-        return np.array(split_names)
+        if len(fnames) == 0:
+            return fnames
+        # the part after the last sep (the whole name if there is none)
+        tails = np.char.rpartition(fnames, sep)[:, 2]
+        return np.where(np.char.find(fnames, 'None') >= 0, 'None',
+                        np.char.add(sep, tails))
 
     # column_outputs = PhoSimCatalogSN.column_outputs
     # column_outputs[PhoSimCatalogSN.column_outputs.index('sedFilepath')] = \
@@ -190,7 +261,8 @@ class DC2PhosimCatalogSN(PhoSimCatalogSN):
                        ('internalRv', 3.1, float), ('shear1', 0., float), ('shear2', 0., float)]
 
 
-class PhoSimDESCQA(PhoSimCatalogSersic2D, EBVmixin):
+class PhoSimDESCQA(HealpixCheckpointMixin, VectorizedFormatMixin,
+                   PhoSimCatalogSersic2D, EBVmixin):
 
     # directory where the SED lookup tables reside
     sed_lookup_dir = None
@@ -540,7 +612,8 @@ class PhoSimDESCQA(PhoSimCatalogSersic2D, EBVmixin):
 class TruthPhoSimDESCQA(SprinklerTruthCatMixin, PhoSimDESCQA):
     pass
 
-class PhoSimDESCQA_AGN(PhoSimCatalogZPoint, EBVmixin, VariabilityAGN):
+class PhoSimDESCQA_AGN(VectorizedFormatMixin, PhoSimCatalogZPoint, EBVmixin,
+                       VariabilityAGN):
 
     column_outputs = ['prefix', 'uniqueId', 'raPhoSim', 'decPhoSim', 'magNormFiltered', 'sedFilepath',
                       'redshift', 'gamma1', 'gamma2', 'kappa', 'raOffset', 'decOffset',
@@ -0,0 +1,179 @@
+"""
+Assignment of objects to the LSST detectors for many objects and
+visits, as done by lsst.sims.coordUtils.chipNameFromRaDecLSST, but
+calling the camera model only for the objects near a detector edge.
+Objects well inside a detector (within the circle inscribed in it) and
+objects that cannot be on any detector are settled from their angular
+distance to the detector centers (the detector layout is that of
+SensorShards).  Results can be cached by (object id, obsHistID) for a
+bounded number of visits, so that repeated passes over the same
+objects and visits do not redo the work.
+"""
+from collections import OrderedDict
+import numpy as np
+from lsst.sims.utils import cartesianFromSpherical, angularSeparation
+from lsst.sims.coordUtils import chipNameFromRaDecLSST
+from .SensorShards import detector_layout, detector_centers
+from .SensorShards import _pixel_deg, _focal_plane_radius
+
+__all__ = ["ChipAssigner"]
+
+
+class ChipAssigner(object):
+    """
+    Find which detectors the objects fall on during many visits.
+
+    Parameters
+    ----------
+    fov: float [2.11]
+        Objects further than this (in degrees) from the pointing are
+        not on any detector
+    margin: float [0.005]
+        Objects within this many degrees of a detector's inscribed or
+        circumscribed circle are passed to the camera model, to allow
+        for the optical distortion of the detector's footprint
+    cache: bool [True]
+        If True, remember the detector of each (object id, obsHistID);
+        only useful when the same objects are assigned more than once
+    max_visits: int [100]
+        The number of visits whose results are remembered (the least
+        recently used visits are forgotten first)
+    """
+
+    def __init__(self, fov=_focal_plane_radius, margin=0.005, cache=True,
+                 max_visits=100):
+        self.fov = fov
+        self.margin = margin
+        self.cache = cache
+        self.max_visits = max_visits
+        self._chip_cache = OrderedDict()
+        self._center_cache = OrderedDict()
+
+        self._names, self._bounds = detector_layout(science_only=False)
+        half_x = 0.5*(self._bounds[:, 1]-self._bounds[:, 0]+1)*_pixel_deg
+        half_y = 0.5*(self._bounds[:, 3]-self._bounds[:, 2]+1)*_pixel_deg
+        inner = np.minimum(half_x, half_y)
+        outer = np.sqrt(half_x**2+half_y**2)
+        self._cos_inner = np.cos(np.radians(np.maximum(inner-margin, 0.0)))
+        self._cos_outer = np.cos(np.radians(outer+margin))
+
+    def _remember(self, cache, obsHistID, value):
+        cache[obsHistID] = value
+        cache.move_to_end(obsHistID)
+        while len(cache) > self.max_visits:
+            cache.popitem(last=False)
+
+    def _detector_centers(self, obs_md, obsHistID):
+        """
+        Return the unit vectors of the detector centers during a visit
+        """
+        if obsHistID is not None and obsHistID in self._center_cache:
+            self._center_cache.move_to_end(obsHistID)
+            return self._center_cache[obsHistID]
+        ra, dec = detector_centers(self._names, self._bounds, obs_md)
+        xyz = cartesianFromSpherical(np.radians(ra), np.radians(dec))
+        if obsHistID is not None and self.cache:
+            self._remember(self._center_cache, obsHistID, xyz)
+        return xyz
+
+    def _assign(self, ra, dec, obs_md, obsHistID):
+        """
+        Return the detector names ('None' if off the focal plane)
+        of objects at ra, dec (degrees) during the visit obs_md
+        """
+        chip_names = np.full(len(ra), 'None', dtype=self._names.dtype)
+        dist = angularSeparation(ra, dec, obs_md.pointingRA, obs_md.pointingDec)
+        in_fov = np.where(dist < self.fov)[0]
+        if len(in_fov) == 0:
+            return chip_names
+
+        obj_xyz = cartesianFromSpherical(np.radians(ra[in_fov]),
+                                         np.radians(dec[in_fov]))
+        cos_dist = np.dot(obj_xyz, self._detector_centers(obs_md, obsHistID).T)
+
+        # the inscribed circles do not overlap, so an object is well
+        # inside at most one detector
+        is_inside = cos_dist > self._cos_inner
+        i_inside = np.where(is_inside.any(axis=1))[0]
+        chip_names[in_fov[i_inside]] = self._names[np.argmax(is_inside[i_inside], axis=1)]
+
+        could_be_on = (cos_dist > self._cos_outer).any(axis=1)
+        could_be_on[i_inside] = False
+        near_edge = in_fov[could_be_on]
+        if len(near_edge) > 0:
+            chip_names[near_edge] = chipNameFromRaDecLSST(ra[near_edge], dec[near_edge],
+                                                          obs_metadata=obs_md).astype(str)
+        return chip_names
+
+    def chip_names(self, object_id, ra, dec, obs_md, obsHistID=None):
+        """
+        Return the names of the detectors the objects fall on during
+        one visit ('None' for objects that are not on a detector).
+
+        Parameters
+        ----------
+        object_id: numpy array of ints
+            Unique ids of the objects (the cache key)
+        ra, dec: numpy arrays
+            The positions of the objects in degrees
+        obs_md: ObservationMetaData
+            The visit
+        obsHistID: int [None]
+            The id of the visit; if None, the results are not cached
+        """
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if obsHistID is None or not self.cache:
+            return self._assign(ra, dec, obs_md, None)
+
+        object_id = np.atleast_1d(np.asarray(object_id, dtype=np.int64))
+        if obsHistID in self._chip_cache:
+            self._chip_cache.move_to_end(obsHistID)
+        cached_id, cached_names = self._chip_cache.get(obsHistID,
+                                                       (np.zeros(0, dtype=np.int64),
+                                                        np.zeros(0, dtype=self._names.dtype)))
+        i_cached = np.minimum(np.searchsorted(cached_id, object_id),
+                              max(len(cached_id)-1, 0))
+        is_cached = np.zeros(len(object_id), dtype=bool)
+        if len(cached_id) > 0:
+            is_cached = cached_id[i_cached] == object_id
+
+        chip_names = np.full(len(object_id), 'None', dtype=self._names.dtype)
+        chip_names[is_cached] = cached_names[i_cached[is_cached]]
+        to_do = np.where(~is_cached)[0]
+        if len(to_do) > 0:
+            new_names = self._assign(ra[to_do], dec[to_do], obs_md, obsHistID)
+            chip_names[to_do] = new_names
+            new_id, i_unique = np.unique(object_id[to_do], return_index=True)
+            all_id = np.concatenate([cached_id, new_id])
+            all_names = np.concatenate([cached_names, new_names[i_unique]])
+            order = np.argsort(all_id, kind='mergesort')
+            self._remember(self._chip_cache, obsHistID,
+                           (all_id[order], all_names[order]))
+        return chip_names
+
+    def on_chip(self, object_id, ra, dec, obs_md, obsHistID=None):
+        """
+        Return a boolean array marking the objects that fall on a
+        detector during one visit (see chip_names)
+        """
+        return self.chip_names(object_id, ra, dec, obs_md,
+                               obsHistID=obsHistID) != 'None'
+
+    def on_chip_visits(self, object_id, ra, dec, obs_md_list, obsHistID_list):
+        """
+        Return a boolean array of shape (n_objects, n_visits) marking
+        the objects that fall on a detector during each of the visits
+        """
+        mask = np.zeros((len(ra), len(obs_md_list)), dtype=bool)
+        for i_obs, (obs_md, obsHistID) in enumerate(zip(obs_md_list, obsHistID_list)):
+            mask[:, i_obs] = self.on_chip(object_id, ra, dec, obs_md,
+                                          obsHistID=obsHistID)
+        return mask
+
+    def clear(self):
+        """
+        Forget the cached results
+        """
+        self._chip_cache = OrderedDict()
+        self._center_cache = OrderedDict()
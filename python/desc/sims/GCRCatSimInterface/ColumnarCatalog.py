@@ -0,0 +1,184 @@
+"""
+Code to store InstanceCatalogs as typed columnar HDF5 files, read them
+back as numpy arrays and regenerate the exact PhoSim text from them.
+"""
+import re
+import numpy as np
+import h5py
+
+__all__ = ["write_columnar_chunk", "read_columnar_catalog",
+           "columnar_to_phosim_text"]
+
+
+_STR_DTYPE = h5py.special_dtype(vlen=str)
+
+
+# a %-style conversion specifier; the group is the conversion type
+_format_spec = re.compile(r'%(?:\([^)]*\))?[#0\- +]*(?:\*|\d+)?'
+                          r'(?:\.(?:\*|\d+))?[hlL]?([diouxXeEfFgGcrsa%])')
+
+_int_codes = 'diouxX'
+_float_codes = 'eEfFgG'
+
+
+def _format_codes(template, n_columns):
+    """
+    Return the conversion type of each column in template (e.g. 's',
+    'd', 'g'), or a list of None if the template cannot be matched
+    to the columns
+    """
+    codes = [cc for cc in _format_spec.findall(template) if cc != '%']
+    if len(codes) != n_columns:
+        return [None]*n_columns
+    return codes
+
+
+def _as_storable(arr, code=None):
+    """
+    Convert a column into something h5py can store.  Numeric and
+    boolean columns keep their dtype.  Object columns are stored as
+    numbers only if the template formats them as numbers (code is the
+    column's conversion type); otherwise, like string columns, they
+    become variable-length strings, so that '%s' columns are written
+    back exactly as they were formatted.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.kind in ('i', 'u', 'f', 'b'):
+        return arr, arr.dtype
+    if arr.dtype.kind == 'O' and len(arr) > 0 and code is not None:
+        dtype = None
+        if code in _int_codes:
+            dtype = np.int64
+        elif code in _float_codes:
+            dtype = float
+        if dtype is not None:
+            try:
+                as_number = arr.astype(dtype)
+                return as_number, as_number.dtype
+            except (TypeError, ValueError, OverflowError):
+                pass
+    return np.array([str(xx) for xx in arr], dtype=object), _STR_DTYPE
+
+
+def write_columnar_chunk(file_name, column_names, column_values, template,
+                         write_mode='a', header=''):
+    """
+    Append one chunk of an InstanceCatalog to a columnar HDF5 file.
+
+    Parameters
+    ----------
+    file_name: str
+        The HDF5 file to write
+    column_names: list
+        The names of the columns, in output order
+    column_values: list
+        numpy arrays of (transformed) column values, in the same order
+    template: str
+        The line template used to format a row of the text catalog
+        (e.g. InstanceCatalog._template).  Stored so that the text
+        catalog can be regenerated exactly.
+    write_mode: str
+        'w' to create a new file; 'a' to append to an existing one
+    header: str
+        Any header text preceding the rows of the text catalog
+        (only stored when the file is created)
+    """
+    with h5py.File(file_name, write_mode) as out_file:
+        if 'columns' not in out_file.attrs:
+            out_file.attrs['columns'] = np.array(column_names, dtype='S')
+            out_file.attrs['template'] = template
+            out_file.attrs['header'] = header
+            out_file.attrs['n_rows'] = 0
+
+        n_old = int(out_file.attrs['n_rows'])
+        n_new = len(column_values[0]) if len(column_values) > 0 else 0
+
+        template = out_file.attrs['template']
+        if isinstance(template, bytes):
+            template = template.decode('utf-8')
+        codes = _format_codes(template, len(column_names))
+        for name, values, code in zip(column_names, column_values, codes):
+            data, dtype = _as_storable(values, code=code)
+            if name not in out_file:
+                out_file.create_dataset(name, shape=(n_old+n_new,),
+                                        maxshape=(None,), dtype=dtype,
+                                        chunks=True)
+            else:
+                out_file[name].resize((n_old+n_new,))
+            if n_new > 0:
+                out_file[name][n_old:n_old+n_new] = data
+
+        out_file.attrs['n_rows'] = n_old + n_new
+
+
+def _decode(arr):
+    if arr.dtype.kind in ('O', 'S'):
+        return np.array([xx.decode('utf-8') if isinstance(xx, bytes) else xx
+                         for xx in arr], dtype=str)
+    return arr
+
+
+def read_columnar_catalog(file_name, columns=None):
+    """
+    Read a columnar InstanceCatalog written by write_columnar_chunk.
+
+    Parameters
+    ----------
+    file_name: str
+        The HDF5 file to read
+    columns: list [None]
+        The columns to read (default: all of them)
+
+    Returns
+    -------
+    A dict of numpy arrays keyed on column name.  String columns
+    are returned as numpy unicode arrays.
+    """
+    with h5py.File(file_name, 'r') as in_file:
+        all_columns = [cc.decode('utf-8') for cc in in_file.attrs['columns']]
+        if columns is None:
+            columns = all_columns
+        return {name: _decode(in_file[name][()]) for name in columns}
+
+
+def columnar_to_phosim_text(file_name, text_name, chunk_size=100000,
+                            write_mode='w'):
+    """
+    Regenerate the text InstanceCatalog from a columnar HDF5 file.
+    The output is byte-for-byte the text the InstanceCatalog class would
+    have written.
+
+    Parameters
+    ----------
+    file_name: str
+        The HDF5 file to read
+    text_name: str
+        The text file to write
+    chunk_size: int
+        Number of rows to format at a time
+    write_mode: str
+        Mode in which to open text_name
+
+    Returns
+    -------
+    The number of rows written
+    """
+    with h5py.File(file_name, 'r') as in_file:
+        columns = [cc.decode('utf-8') for cc in in_file.attrs['columns']]
+        template = in_file.attrs['template']
+        if isinstance(template, bytes):
+            template = template.decode('utf-8')
+        header = in_file.attrs.get('header', '')
+        if isinstance(header, bytes):
+            header = header.decode('utf-8')
+        n_rows = int(in_file.attrs['n_rows'])
+        with open(text_name, write_mode) as out_file:
+            out_file.write(header)
+            for i_start in range(0, n_rows, chunk_size):
+                selection = slice(i_start, i_start+chunk_size)
+                values = [_decode(in_file[name][selection]).tolist()
+                          if in_file[name].dtype.kind in ('O', 'S')
+                          else in_file[name][selection]
+                          for name in columns]
+                out_file.writelines(template % line for line in zip(*values))
+    return n_rows
@@ -0,0 +1,476 @@
+"""
+Code to predict the runtime and memory needed to generate the
+InstanceCatalog of a visit, and to pack visits into batch jobs that
+balance those costs.
+"""
+import os
+import sqlite3
+import numpy as np
+import healpy
+from . import HtmRangePlan
+from . import visit_healpixels, visit_pointings
+from . import VisitTable
+from . import summarize_journal
+from . import load_gcr_catalog
+
+_GCR_IS_AVAILABLE = True
+try:
+    from GCR import GCRQuery
+except ImportError:
+    _GCR_IS_AVAILABLE = False
+
+__all__ = ["count_healpix_objects", "write_healpix_counts",
+           "read_healpix_counts", "count_trixel_objects",
+           "measured_costs", "visit_features", "VisitCostModel",
+           "plan_catalogs", "pack_visits"]
+
+
+def count_healpix_objects(descqa_catalog, healpix_list):
+    """
+    Count the galaxies in each healpixel of a GCR catalog.
+
+    Parameters
+    ----------
+    descqa_catalog: str
+        The name of the GCR catalog (or the path to its yaml file)
+    healpix_list: list
+        The nside=32 healpixels to count
+
+    Returns
+    -------
+    A dict keyed on healpixel whose values are numbers of galaxies
+    """
+    if not _GCR_IS_AVAILABLE:
+        raise RuntimeError("You cannot use count_healpix_objects\n"
+                           "You do not have *GCR* installed and setup")
+
+    catalog = load_gcr_catalog(descqa_catalog)
+    counts = {}
+    for hp in healpix_list:
+        qties = catalog.get_quantities(['galaxy_id'],
+                                       native_filters=[GCRQuery('healpix_pixel==%d' % hp)])
+        counts[int(hp)] = len(qties['galaxy_id'])
+    return counts
+
+
+def write_healpix_counts(counts, file_name):
+    """
+    Write the output of count_healpix_objects as a two-column text file
+    """
+    with open(file_name, 'w') as out_file:
+        out_file.write('# healpix_pixel n_objects\n')
+        for hp in sorted(counts):
+            out_file.write('%d %d\n' % (hp, counts[hp]))
+
+
+def read_healpix_counts(file_name):
+    """
+    Read a table written by write_healpix_counts.  Returns a dict
+    keyed on healpixel whose values are numbers of galaxies.
+    """
+    data = np.genfromtxt(file_name, dtype=int, comments='#', ndmin=2)
+    return {int(row[0]): int(row[1]) for row in data}
+
+
+def count_trixel_objects(db_name, table, htmid_col, htmid_level,
+                         ra, dec, radius):
+    """
+    Count the rows of a table whose htmid falls in the trixels
+    overlapping a circle on the sky.
+
+    Parameters
+    ----------
+    db_name: str
+        The sqlite database (e.g. made by create_agn_db.py)
+    table: str
+        The table to query (e.g. 'agn_params')
+    htmid_col: str
+        The column containing the htmid (e.g. 'htmid_8')
+    htmid_level: int
+        The level of the htmids in htmid_col
+    ra, dec, radius: float
+        The circle, in degrees
+
+    Returns
+    -------
+    The number of rows
+    """
+    htm_plan = HtmRangePlan.from_circle(ra, dec, radius, htmid_level)
+    query = 'SELECT COUNT(*) FROM %s' % htm_plan.join(table, htmid_col)
+    with sqlite3.connect('file:%s?mode=ro' % db_name, uri=True) as conn:
+        cursor = conn.cursor()
+        htm_plan.load(cursor)
+        return cursor.execute(query).fetchone()[0]
+
+
+def measured_costs(journal_list):
+    """
+    Read the runtime and peak memory of completed visits from the
+    journals written by InstanceCatalogWriter.write_catalog.
+
+    Parameters
+    ----------
+    journal_list: list
+        Journal files, or directories containing job_log_*.jsonl files
+
+    Returns
+    -------
+    A dict keyed on obsHistID whose values are (runtime in seconds,
+    peak memory in GB)
+    """
+    file_name_list = []
+    for name in journal_list:
+        if os.path.isdir(name):
+            for sub_name in sorted(os.listdir(name)):
+                if sub_name.startswith('job_log_') and sub_name.endswith('.jsonl'):
+                    file_name_list.append(os.path.join(name, sub_name))
+        else:
+            file_name_list.append(name)
+
+    costs = {}
+    for file_name in file_name_list:
+        summary = summarize_journal(file_name)
+        if summary['finished']:
+            costs[summary['obsHistID']] = (summary['wall_time'],
+                                           summary['peak_rss_mb']/1024.0)
+    return costs
+
+
+def visit_features(opsim_db, obsHistID_list, healpix_counts,
+                   agn_db=None, sne_db=None, star_db=None, fov=2.0,
+                   dither=True):
+    """
+    Compute the quantities on which the cost of a visit depends.
+
+    Parameters
+    ----------
+    opsim_db: str or VisitTable
+        Path to the OpSim database, or a VisitTable already read from it
+    obsHistID_list: list
+        The visits
+    healpix_counts: dict
+        Number of galaxies per nside=32 healpixel (see read_healpix_counts)
+    agn_db: str [None]
+        The AGN parameter database (made by create_agn_db.py)
+    sne_db: str [None]
+        The SNe parameter database (made by create_sne_db.py)
+    star_db: str [None]
+        The stellar database (as read by DC2StarObj)
+    fov: float [2]
+        Field-of-view angular radius in degrees
+    dither: bool [True]
+        Whether to use the dithered pointings
+
+    Returns
+    -------
+    A dict keyed on obsHistID whose values are dicts with keys
+    'n_gal' (galaxies in the healpixels read), 'n_gal_fov' (the
+    expected number of those inside the field of view), 'max_hp'
+    (galaxies in the largest of those healpixels), 'n_star', 'n_agn'
+    and 'n_sne'.  Counts from databases that were not given are 0.
+    """
+    hp_area = healpy.nside2pixarea(32)
+    fov_area = 2.0*np.pi*(1.0-np.cos(np.radians(fov)))
+
+    if not isinstance(opsim_db, VisitTable):
+        dither_cols = ['descDitheredRA', 'descDitheredDec'] if dither else []
+        opsim_db = VisitTable.from_opsim(opsim_db,
+                                         columns=['fieldRA', 'fieldDec']+dither_cols,
+                                         obsHistID_list=obsHistID_list)
+
+    hp_dict, center_dict = visit_healpixels(opsim_db, obsHistID_list,
+                                            fov=fov, dither=dither)
+    pointings = visit_pointings(opsim_db, obsHistID_list, dither=dither)
+
+    features = {}
+    for obs_id in obsHistID_list:
+        hp_counts = [healpix_counts.get(int(hp), 0) for hp in hp_dict[obs_id]]
+        ra = np.degrees(pointings[obs_id][0])
+        dec = np.degrees(pointings[obs_id][1])
+        n_agn = 0
+        if agn_db is not None:
+            n_agn = count_trixel_objects(agn_db, 'agn_params', 'htmid_8', 8,
+                                         ra, dec, fov)
+        n_sne = 0
+        if sne_db is not None:
+            n_sne = count_trixel_objects(sne_db, 'sne_params', 'htmid_level_6',
+                                         6, ra, dec, fov)
+        n_star = 0
+        if star_db is not None:
+            n_star = count_trixel_objects(star_db, 'stars', 'htmid_6', 6,
+                                          ra, dec, fov)
+        n_gal = sum(hp_counts)
+        fov_frac = min(1.0, fov_area/(hp_area*max(1, len(hp_counts))))
+        features[obs_id] = {'n_gal': n_gal,
+                            'n_gal_fov': int(n_gal*fov_frac),
+                            'max_hp': max(hp_counts) if len(hp_counts) > 0 else 0,
+                            'n_star': n_star, 'n_agn': n_agn, 'n_sne': n_sne}
+    return features
+
+
+class VisitCostModel(object):
+    """
+    A linear model of the cost of generating a visit
+
+    runtime (seconds) = c_0 + c_star*n_star + c_gal*n_gal
+                        + c_agn*n_agn + c_sne*n_sne
+    memory (GB) = m_0 + m_hp*max_hp
+    output size (bytes) = sum of counts times bytes_per_row
+
+    where the features are those returned by visit_features.  Memory
+    scales with the largest healpixel because DESCQAChunkIterator_healpix
+    holds one healpixel's worth of columns at a time.
+
+    The default coefficients are rough; call fit() with measured costs
+    (see measured_costs) to calibrate them.
+    """
+
+    runtime_features = ('n_star', 'n_gal', 'n_agn', 'n_sne')
+
+    # approximate uncompressed InstanceCatalog bytes per object;
+    # a galaxy has bulge, disk and (sometimes) knots lines
+    bytes_per_row = {'n_star': 180, 'n_gal_fov': 500,
+                     'n_agn': 190, 'n_sne': 200}
+
+    def __init__(self, runtime_coeffs=None, memory_coeffs=None):
+        """
+        Parameters
+        ----------
+        runtime_coeffs: list [None]
+            (c_0, c_star, c_gal, c_agn, c_sne)
+        memory_coeffs: list [None]
+            (m_0, m_hp)
+        """
+        if runtime_coeffs is None:
+            runtime_coeffs = (600.0, 5.0e-4, 7.0e-5, 1.0e-3, 2.0e-2)
+        if memory_coeffs is None:
+            memory_coeffs = (4.0, 1.0e-7)
+        self.runtime_coeffs = np.array(runtime_coeffs, dtype=float)
+        self.memory_coeffs = np.array(memory_coeffs, dtype=float)
+
+    def _runtime_matrix(self, features, obsHistID_list):
+        return np.array([[1.0] + [features[obs_id][name]
+                                  for name in self.runtime_features]
+                         for obs_id in obsHistID_list])
+
+    def _memory_matrix(self, features, obsHistID_list):
+        return np.array([[1.0, features[obs_id]['max_hp']]
+                         for obs_id in obsHistID_list])
+
+    def fit(self, features, measured):
+        """
+        Fit the coefficients by least squares.  Negative coefficients
+        are set to zero.
+
+        Parameters
+        ----------
+        features: dict
+            The output of visit_features
+        measured: dict
+            The output of measured_costs
+
+        Returns
+        -------
+        The number of visits used in the fit
+        """
+        obs_list = sorted(set(features.keys()) & set(measured.keys()))
+        if len(obs_list) < len(self.runtime_coeffs):
+            return len(obs_list)
+
+        runtime = np.array([measured[obs_id][0] for obs_id in obs_list])
+        coeffs = np.linalg.lstsq(self._runtime_matrix(features, obs_list),
+                                 runtime, rcond=None)[0]
+        self.runtime_coeffs = np.where(coeffs > 0.0, coeffs, 0.0)
+
+        memory = np.array([measured[obs_id][1] for obs_id in obs_list])
+        coeffs = np.linalg.lstsq(self._memory_matrix(features, obs_list),
+                                 memory, rcond=None)[0]
+        self.memory_coeffs = np.where(coeffs > 0.0, coeffs, 0.0)
+        return len(obs_list)
+
+    def predict(self, features, measured=None):
+        """
+        Predict the cost of visits.
+
+        Parameters
+        ----------
+        features: dict
+            The output of visit_features
+        measured: dict [None]
+            The output of measured_costs; visits in it keep their
+            measured cost
+
+        Returns
+        -------
+        A dict keyed on obsHistID whose values are (runtime in seconds,
+        memory in GB)
+        """
+        obs_list = sorted(features.keys())
+        if len(obs_list) == 0:
+            return {}
+        runtime = np.dot(self._runtime_matrix(features, obs_list),
+                         self.runtime_coeffs)
+        memory = np.dot(self._memory_matrix(features, obs_list),
+                        self.memory_coeffs)
+        costs = {obs_id: (runtime[ii], memory[ii])
+                 for ii, obs_id in enumerate(obs_list)}
+        if measured is not None:
+            for obs_id in obs_list:
+                if obs_id in measured:
+                    costs[obs_id] = measured[obs_id]
+        return costs
+
+    def output_size(self, features):
+        """
+        Estimate the uncompressed size of the InstanceCatalogs of visits.
+
+        Parameters
+        ----------
+        features: dict
+            The output of visit_features
+
+        Returns
+        -------
+        A dict keyed on obsHistID whose values are sizes in bytes
+        """
+        return {obs_id: sum(features[obs_id].get(name, 0)*n_bytes
+                            for name, n_bytes in self.bytes_per_row.items())
+                for obs_id in features}
+
+
+def plan_catalogs(opsim_db, obsHistID_list, healpix_counts=None,
+                  agn_db=None, sne_db=None, star_db=None, fov=2.0,
+                  dither=True, cost_journals=None):
+    """
+    Estimate the object counts, output size, memory and runtime of
+    each visit from the OpSim pointings, the per-healpixel galaxy
+    counts and the htmid indexes of the star, AGN and SNe databases,
+    without loading any catalog columns.
+
+    Parameters
+    ----------
+    opsim_db: str
+        Path to the OpSim database
+    obsHistID_list: list
+        The visits to plan
+    healpix_counts: dict [None]
+        Number of galaxies per nside=32 healpixel (see read_healpix_counts)
+    agn_db, sne_db, star_db: str [None]
+        The databases whose objects are counted (see visit_features)
+    fov: float [2]
+        Field-of-view angular radius in degrees
+    dither: bool [True]
+        Whether to use the dithered pointings
+    cost_journals: list [None]
+        Job journals (or directories of them) from past runs with
+        which to calibrate the VisitCostModel (see measured_costs)
+
+    Returns
+    -------
+    A list of lines to print (one per visit, with visits that are not
+    in the OpSim database reported as skipped, and a line of totals)
+    and a dict keyed on obsHistID whose values are dicts of the
+    estimates of each visit planned
+    """
+    if healpix_counts is None:
+        healpix_counts = {}
+
+    dither_cols = ['descDitheredRA', 'descDitheredDec'] if dither else []
+    visit_table = VisitTable.from_opsim(opsim_db,
+                                        columns=['fieldRA', 'fieldDec']+dither_cols,
+                                        obsHistID_list=obsHistID_list)
+    known = [obs_id for obs_id in obsHistID_list if obs_id in visit_table]
+
+    features = visit_features(visit_table, known, healpix_counts,
+                              agn_db=agn_db, sne_db=sne_db, star_db=star_db,
+                              fov=fov, dither=dither)
+
+    model = VisitCostModel()
+    if cost_journals is not None and len(features) > 0:
+        model.fit(features, measured_costs(cost_journals))
+    costs = model.predict(features)
+    sizes = model.output_size(features)
+
+    lines = ['%12s %10s %12s %9s %9s %10s %10s %10s' %
+             ('obsHistID', 'n_star', 'n_gal', 'n_agn', 'n_sne',
+              'size(GB)', 'mem(GB)', 'time(hrs)')]
+    plan = {}
+    for obs_id in sorted(obsHistID_list):
+        if obs_id not in features:
+            lines.append('%12d skipped: not in %s' % (obs_id, opsim_db))
+            continue
+        ff = features[obs_id]
+        plan[obs_id] = {name: int(value) for name, value in ff.items()}
+        plan[obs_id].update({'size_gb': float(sizes[obs_id])/1024.0**3,
+                             'memory_gb': float(costs[obs_id][1]),
+                             'runtime_hrs': float(costs[obs_id][0])/3600.0})
+        lines.append('%12d %10d %12d %9d %9d %10.2f %10.1f %10.2f' %
+                     (obs_id, ff['n_star'], ff['n_gal_fov'], ff['n_agn'],
+                      ff['n_sne'], plan[obs_id]['size_gb'],
+                      plan[obs_id]['memory_gb'],
+                      plan[obs_id]['runtime_hrs']))
+
+    if len(plan) == 0:
+        lines.append('total: no visits planned')
+    else:
+        lines.append('total: %d visits; %.2f GB; %.2f hrs; max memory %.1f GB' %
+                     (len(plan),
+                      sum(pp['size_gb'] for pp in plan.values()),
+                      sum(pp['runtime_hrs'] for pp in plan.values()),
+                      max(pp['memory_gb'] for pp in plan.values())))
+    return lines, plan
+
+
+def pack_visits(costs, n_bins, n_parallel=1, max_memory=None):
+    """
+    Pack visits into bins (e.g. the nodes of a batch job) so that the
+    bins take similar times.  Each bin runs n_parallel visits at a
+    time, so its runtime is estimated as the sum of its visits'
+    runtimes divided by n_parallel and its memory as the sum of its
+    n_parallel largest memory footprints.
+
+    Visits are placed longest first, each in the least loaded bin
+    whose memory stays within max_memory (or, if there is none, in
+    the bin whose memory grows least).
+
+    Parameters
+    ----------
+    costs: dict
+        Keyed on obsHistID; values are (runtime, memory)
+        (see VisitCostModel.predict)
+    n_bins: int
+        The number of bins
+    n_parallel: int [1]
+        The number of visits each bin processes at once
+    max_memory: float [None]
+        The memory available to each bin
+
+    Returns
+    -------
+    A list of dicts with keys 'obsHistID' (list of visits),
+    'runtime' and 'memory'
+    """
+    bins = [{'obsHistID': [], 'runtime': 0.0, 'memory': 0.0,
+             '_memories': []} for i_bin in range(n_bins)]
+
+    def bin_memory(memories):
+        return sum(sorted(memories, reverse=True)[:n_parallel])
+
+    ordered = sorted(costs.keys(), key=lambda obs_id: (-costs[obs_id][0], obs_id))
+    for obs_id in ordered:
+        runtime, memory = costs[obs_id]
+        new_memory = [bin_memory(bb['_memories'] + [memory]) for bb in bins]
+        allowed = [i_bin for i_bin in range(n_bins)
+                   if max_memory is None or new_memory[i_bin] <= max_memory]
+        if len(allowed) > 0:
+            i_best = min(allowed, key=lambda i_bin: (bins[i_bin]['runtime'], i_bin))
+        else:
+            i_best = min(range(n_bins), key=lambda i_bin: (new_memory[i_bin], i_bin))
+        bins[i_best]['obsHistID'].append(obs_id)
+        bins[i_best]['_memories'].append(memory)
+        bins[i_best]['runtime'] += runtime/n_parallel
+        bins[i_best]['memory'] = new_memory[i_best]
+
+    for bb in bins:
+        bb.pop('_memories')
+    return [bb for bb in bins if len(bb['obsHistID']) > 0]
@@ -4,15 +4,20 @@ This script will define classes that enable CatSim to interface with GCR
 __all__ = ["DESCQAObject", "bulgeDESCQAObject",
            "diskDESCQAObject", "knotsDESCQAObject",
            "deg2rad_double", "arcsec2rad", "SNeDBObject",
-           "_DESCQAObject_metadata"]
+           "_DESCQAObject_metadata", "load_gcr_catalog"]
 
+import os
+import importlib
 import numpy as np
 import healpy
 import re
 import time
+import yaml
 from sqlalchemy import text
 from lsst.sims.catalogs.db import CatalogDBObject, ChunkIterator
 from lsst.sims.utils import htmModule as htm
+from . import profile_section
+from . import HtmRangePlan
 
 _GCR_IS_AVAILABLE = True
 try:
@@ -39,6 +44,34 @@ def deg2rad_double(x):
 def arcsec2rad(x):
     return np.deg2rad(x/3600.0)
 
+def load_gcr_catalog(yaml_file_name, config_overwrite=None):
+    """
+    Load a GCR catalog.
+
+    yaml_file_name is either the name of a catalog registered with
+    GCRCatalogs or the path to a local yaml config file.  The
+    subclass_name of a local config may be the full path of a reader
+    class outside of GCRCatalogs (e.g. the mock catalog made by
+    desc.sims.GCRCatSimInterface.synthetic).
+
+    config_overwrite is an optional dict of config entries to replace
+    """
+    if not os.path.isfile(yaml_file_name):
+        return GCRCatalogs.load_catalog(yaml_file_name, config_overwrite)
+
+    with open(yaml_file_name, 'r') as in_file:
+        config = yaml.safe_load(in_file)
+    if config_overwrite:
+        config.update(config_overwrite)
+
+    module_name, _, class_name = config['subclass_name'].rpartition('.')
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        # a reader named relative to GCRCatalogs
+        return GCRCatalogs.load_catalog_from_config_dict(config)
+    return getattr(module, class_name)(**config)
+
 # The depth below which to ignore the knots
 KNOTS_IMAG_CUT = 27
 
@@ -109,16 +142,19 @@ class DESCQAChunkIterator(object):
             if self._loaded_qties is not None:
                 raise RuntimeError("data_indices is None, but loaded_qties isn't "
                                    "in DESCQAChunkIterator")
-            self._init_data_indices()
+            with profile_section(type(self).__name__, 'load:init_data_indices'):
+                self._init_data_indices()
             qty_name_list = [self._column_map[name][0]
                              for name in self._colnames
                              if descqa_catalog.has_quantity(self._column_map[name][0])]
 
             self._loaded_qties = {}
             for name in qty_name_list:
-                raw_qties = descqa_catalog.get_quantities(name,
-                                                          native_filters=self._native_filters)
-                self._loaded_qties[name] = raw_qties[name][self._data_indices]
+                with profile_section(type(self).__name__, 'load:%s' % name,
+                                     n_rows=len(self._data_indices)):
+                    raw_qties = descqa_catalog.get_quantities(name,
+                                                              native_filters=self._native_filters)
+                    self._loaded_qties[name] = raw_qties[name][self._data_indices]
 
             # since we are only keeping the objects that will ultimately go into
             # the catalog, we now change self._data_indices to range from 0
@@ -251,10 +287,29 @@ class DESCQAChunkIterator_healpix(DESCQAChunkIterator):
     A DESCQAChunkIterator class specifically designed to work on catalogs that can
     be subdivided by healpix_pixels.  It will only load one healpixel at a time and
     process that in chunks before moving on to the next healpixel.
+
+    Healpixels are loaded in a pseudo-random order seeded by obsHistID
+    unless the DESCQAObject has a `healpix_order` list (see
+    VisitPlanner.plan_visits), in which case that order is used.
+
+    If the DESCQAObject has a `checkpoint` attribute (a HealpixCheckpoint),
+    healpixels already completed by a previous run are skipped and each
+    healpixel is reported to the checkpoint once all of its chunks have
+    been returned.
+
+    Each requested quantity is read once per healpixel, keeping only
+    the selected rows; the loader then hands those rows out in chunks
+    of _loader_chunk_size.  If the DESCQAObject has a `memory_budget`
+    attribute (a MemoryBudget), the number of rows handed out at a time
+    is instead chosen from the item size of the requested columns and
+    the current resident set size (which includes the healpixel's
+    columns).
     """
     def __init__(self, *args, **kwargs):
         self._loader_chunk_size = 2000000
+        self._bytes_per_qty = {}
         self._indices_to_load = None
+        self._healpix_qties = None
         self._healpix_and_indices_list = None
         self._healpix_filter = None
         self._healpix_loaded = -1
@@ -287,10 +342,25 @@ class DESCQAChunkIterator_healpix(DESCQAChunkIterator):
                                          inclusive=True,
                                          nest=False)
 
-        obs_id = self._obs_metadata.OpsimMetaData['obsHistID']
-        hp_rng = np.random.RandomState(121)
-        hp_rng.random_sample(obs_id)  # so that each obs shuffles differently
-        hp_rng.shuffle(healpix_list)
+        healpix_order = getattr(self._descqa_obj, 'healpix_order', None)
+        if healpix_order is not None:
+            # a planned order (see VisitPlanner.plan_visits);
+            # healpixels are popped off the end of the list below
+            hp_set = set(healpix_list)
+            healpix_list = [hp for hp in healpix_order if hp in hp_set]
+            healpix_list += sorted(hp_set - set(healpix_list))
+            healpix_list.reverse()
+        else:
+            obs_id = self._obs_metadata.OpsimMetaData['obsHistID']
+            hp_rng = np.random.RandomState(121)
+            hp_rng.random_sample(obs_id)  # so that each obs shuffles differently
+            hp_rng.shuffle(healpix_list)
+
+        # skip healpixels that a checkpointed previous run already wrote
+        checkpoint = getattr(self._descqa_obj, 'checkpoint', None)
+        if checkpoint is not None:
+            healpix_list = [hp for hp in healpix_list
+                            if hp not in checkpoint.completed]
 
         for hp in healpix_list:
             healpix_filter = GCRQuery('healpix_pixel==%d' % hp)
@@ -329,13 +399,17 @@ class DESCQAChunkIterator_healpix(DESCQAChunkIterator):
         descqa_catalog = self._descqa_obj._catalog
 
         if self._healpix_and_indices_list is None:
-            self._init_data_indices()
+            with profile_section(type(self).__name__, 'load:init_data_indices'):
+                self._init_data_indices()
             self._qty_name_list = [self._column_map[name][0]
                                    for name in self._colnames
                                    if descqa_catalog.has_quantity(self._column_map[name][0])]
 
         if self._loaded_qties is None or self._indices_to_load is None or len(self._data_indices)==0:
             if self._indices_to_load is None or len(self._indices_to_load) == 0:
+                checkpoint = getattr(self._descqa_obj, 'checkpoint', None)
+                if checkpoint is not None and self._healpix_loaded >= 0:
+                    checkpoint.healpixel_finished(self._healpix_loaded)
                 try:
                     (self._healpix_loaded,
                      self._healpix_filter,
@@ -348,6 +422,7 @@ class DESCQAChunkIterator_healpix(DESCQAChunkIterator):
                     self._qty_name_list = None
                     self._descqa_obj._loaded_healpixel = -1
                     self._indices_to_load = None
+                    self._healpix_qties = None
                     self._healpix_filter = None
                     raise StopIteration
 
@@ -356,14 +431,38 @@ class DESCQAChunkIterator_healpix(DESCQAChunkIterator):
                 self._healpix_loaded = self._healpix_loaded
                 _DESCQAObject_metadata['loaded_healpixel'] = self._healpix_loaded
 
-            valid_indices = self._indices_to_load[:self._loader_chunk_size]
-            self._indices_to_load = self._indices_to_load[self._loader_chunk_size:]
+                # read each quantity of the healpixel once, keeping only
+                # the selected rows; the chunks below are slices of these
+                self._loaded_qties = None
+                self._healpix_qties = None
+                healpix_qties = {}
+                for name in self._qty_name_list:
+                    with profile_section(type(self).__name__, 'load:%s' % name,
+                                         n_rows=len(self._indices_to_load)):
+                        raw_qties = descqa_catalog.get_quantities(name, native_filters=[self._healpix_filter])
+                        healpix_qties[name] = raw_qties[name][self._indices_to_load]
+                        del raw_qties
+                    self._bytes_per_qty[name] = healpix_qties[name].dtype.itemsize
+                self._healpix_qties = healpix_qties
+
+            memory_budget = getattr(self._descqa_obj, 'memory_budget', None)
+            if memory_budget is None:
+                loader_chunk_size = self._loader_chunk_size
+            else:
+                bytes_per_row = sum(self._bytes_per_qty[name]
+                                    for name in self._qty_name_list)
+                loader_chunk_size = memory_budget.loader_chunk_size(bytes_per_row)
+
+            n_load = min(loader_chunk_size, len(self._indices_to_load))
+            self._indices_to_load = self._indices_to_load[n_load:]
+            self._loaded_qties = {name: qty[:n_load]
+                                  for name, qty in self._healpix_qties.items()}
+            self._healpix_qties = {name: qty[n_load:]
+                                   for name, qty in self._healpix_qties.items()}
+            self._data_indices = np.arange(n_load, dtype=int)
 
-            self._loaded_qties = {}
-            for name in self._qty_name_list:
-                raw_qties = descqa_catalog.get_quantities(name, native_filters=[self._healpix_filter])
-                self._loaded_qties[name] = raw_qties[name][valid_indices]
-            self._data_indices = np.arange(len(valid_indices), dtype=int)
+            if memory_budget is not None:
+                memory_budget.loaded(n_load)
 
         if self._chunk_size is None:
             data_indices_this = self._data_indices
@@ -423,7 +522,8 @@ class DESCQAObject(object):
         Parameters
         ----------
         yaml_file_name is the name of the yaml file that will tell DESCQA
-        how to load the catalog
+        how to load the catalog (a registered GCRCatalogs name or the
+        path to a local yaml file; see load_gcr_catalog)
         """
 
         if yaml_file_name is None:
@@ -439,7 +539,7 @@ class DESCQAObject(object):
 
         if yaml_file_name + self._cat_cache_suffix not in _CATALOG_CACHE:
             t_start = time.time()
-            gc = GCRCatalogs.load_catalog(yaml_file_name, config_overwrite)
+            gc = load_gcr_catalog(yaml_file_name, config_overwrite)
             additional_postfix = self._transform_catalog(gc)
             _CATALOG_CACHE[yaml_file_name + self._cat_cache_suffix] = gc
             _ADDITIONAL_POSTFIX_CACHE[yaml_file_name + self._cat_cache_suffix] = \
@@ -682,6 +782,21 @@ class SNeDBObject(CatalogDBObject):
     objectTypeId = 22
     idColKey = 'id'
 
+    # the maximum number of htmid intervals in a query (see HtmRangePlan)
+    max_htm_ranges = 32
+
+    # If maxTimeSNVisible is not None, query_columns only returns the
+    # SNe active at the MJD of the obs_metadata: those with
+    # |t0 - mjd| <= maxTimeSNVisible and whose SALT2 model (rest-frame
+    # phases minPhase to maxPhase, stretched by 1+z) has flux at mjd.
+    # If maxz is not None, SNe at higher redshift are left out too.
+    # The catalog drops the other SNe anyway; set these to the values
+    # used by the catalog.
+    maxTimeSNVisible = None
+    maxz = None
+    minPhase = -20.0
+    maxPhase = 50.0
+
     dbDefaultValues = {'varsimobjid':-1,
                        'runid':-1,
                        'ismultiple':-1,
@@ -703,6 +818,25 @@ class SNeDBObject(CatalogDBObject):
                ('redshift', 'z_in'),
               ]
 
+    def visibility_filter(self, mjd):
+        """
+        Return an SQLAlchemy text clause selecting the SNe active at
+        the TAI MJD mjd (see maxTimeSNVisible).  The range on t0_in
+        lets sqlite use t0_index.
+        """
+        clause = ('(t0_in BETWEEN :t0_min AND :t0_max'
+                  ' AND t0_in + :min_phase*(1.0 + z_in) <= :sn_mjd'
+                  ' AND t0_in + :max_phase*(1.0 + z_in) >= :sn_mjd')
+        params = {'t0_min': mjd - self.maxTimeSNVisible,
+                  't0_max': mjd + self.maxTimeSNVisible,
+                  'min_phase': self.minPhase,
+                  'max_phase': self.maxPhase,
+                  'sn_mjd': mjd}
+        if self.maxz is not None:
+            clause += ' AND z_in <= :sn_maxz'
+            params['sn_maxz'] = self.maxz
+        return text(clause + ')').bindparams(**params)
+
     def query_columns(self, colnames=None, chunk_size=None,
                       obs_metadata=None, constraint=None, limit=None):
         """Execute a query
@@ -746,21 +880,17 @@ class SNeDBObject(CatalogDBObject):
                                                     obs_metadata.pointingDec,
                                                     obs_metadata.boundLength)
 
-                trixel_bounds = half_space.findAllTrixels(6)
-                trixel_query = '('
-                for bound in trixel_bounds:
-                    if trixel_query != '(':
-                        trixel_query += ' or '
-                    if bound[0] == bound[1]:
-                        trixel_query += '(htmid_level_6 == %d)' % bound[0]
-                    else:
-                        trixel_query += '(htmid_level_6 >= %d and htmid_level_6 <= %d)' % (bound[0], bound[1])
-
-                trixel_query+=')'
-                query = query.filter(text(trixel_query))
+                # the bounds filter below removes the SNe from the
+                # extra trixels of a coarsened plan
+                htm_plan = HtmRangePlan(half_space, 6,
+                                        max_ranges=self.max_htm_ranges)
+                query = query.filter(htm_plan.sql_filter('htmid_level_6'))
 
             query = self.filter(query, obs_metadata.bounds)
 
+            if self.maxTimeSNVisible is not None and obs_metadata.mjd is not None:
+                query = query.filter(self.visibility_filter(obs_metadata.mjd.TAI))
+
         if constraint is not None:
             query = query.filter(text(constraint))
 
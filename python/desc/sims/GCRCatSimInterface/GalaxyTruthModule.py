@@ -10,6 +10,7 @@ from lsst.utils import getPackageDir
 from lsst.sims.photUtils import BandpassDict
 from lsst.sims.photUtils import Sed, getImsimFluxNorm
 from lsst.sims.utils import defaultSpecMap
+from . import SqliteBulkWriter
 
 
 __all__ = ["write_galaxies_to_truth"]
@@ -49,15 +50,13 @@ def _fluxes(sed_name, mag_norm, redshift):
     return _fluxes._bp_dict.fluxListForSed(spec)
 
 
-def write_results(conn, cursor, mag_dict, position_dict):
+def write_results(writer, mag_dict, position_dict):
     """
     Write galaxy truth results to the truth table
 
     Parameters
     ----------
-    conn is a sqlite3 connection to the database
-
-    cursor is a sqlite3.conneciton.cursor() object
+    writer is the SqliteBulkWriter of the output database
 
     mag_dict is a dict of mags.  It is keyed on the pid of the
     Process used to process a chunk of magnitudes.  Each value
@@ -86,21 +85,15 @@ def write_results(conn, cursor, mag_dict, position_dict):
         row_ct += len(pp['ra'])
         assert len(mm) == len(pp['ra'])
 
-        values = ((int(pp['healpix'][i_obj]),
-                   int(pp['galaxy_id'][i_obj]),
-                   0,
-                   int(pp['has_agn'][i_obj]),
-                   int(pp['is_sprinkled'][i_obj]),
-                   pp['ra'][i_obj], pp['dec'][i_obj],
-                   pp['redshift'][i_obj],
-                   mm[i_obj][0], mm[i_obj][1], mm[i_obj][2],
-                   mm[i_obj][3], mm[i_obj][4], mm[i_obj][5])
-                  for i_obj in range(len(pp['ra']))
-                  if not np.isnan(mm[i_obj][0]))
-
-        cursor.executemany('''INSERT INTO truth
-                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', values)
-        conn.commit()
+        valid = ~np.isnan(mm[:,0])
+        writer.insert('truth', [np.asarray(pp['healpix'])[valid],
+                                np.asarray(pp['galaxy_id'])[valid],
+                                0,
+                                np.asarray(pp['has_agn'], dtype=int)[valid],
+                                np.asarray(pp['is_sprinkled'], dtype=int)[valid],
+                                pp['ra'][valid], pp['dec'][valid],
+                                pp['redshift'][valid]]
+                               + [mm[valid, i_bp] for i_bp in range(6)])
 
     return row_ct
 
@@ -233,8 +226,7 @@ def write_galaxies_to_truth(n_side=2048, input_db=None, output=None,
 
     is_agn_converter = {None:0, 1:1, 0:0}
 
-    with sqlite3.connect(output) as out_conn:
-        out_cursor = out_conn.cursor()
+    with SqliteBulkWriter(output) as writer:
 
         with sqlite3.connect(input_db) as in_conn:
             in_cursor = in_conn.cursor()
@@ -272,8 +264,8 @@ def write_galaxies_to_truth(n_side=2048, input_db=None, output=None,
                 if len(p_list) >= n_procs:
                     for p in p_list:
                         p.join()
-                    row_ct += write_results(out_conn, out_cursor,
-                                            mag_dict, position_dict)
+                    row_ct += write_results(writer, mag_dict,
+                                            position_dict)
                     p_list = []
                     position_dict = {}
                     mag_dict = mgr.dict()
@@ -286,5 +278,4 @@ def write_galaxies_to_truth(n_side=2048, input_db=None, output=None,
             if len(p_list) > 0:
                 for p in p_list:
                     p.join()
-                write_results(out_conn, out_cursor,
-                              mag_dict, position_dict)
+                write_results(writer, mag_dict, position_dict)
@@ -0,0 +1,164 @@
+"""
+Opt-in profiling of the InstanceCatalog getters and the catalog
+loading steps.  Set the environment variable GCRCATSIM_PROFILE to a
+non-empty value other than '0' to enable it; InstanceCatalogWriter
+then writes a table of call counts, rows and wall time per column for
+every visit into its status directory.
+"""
+import os
+import time
+import functools
+
+__all__ = ["GetterProfile", "getter_profile", "profile_getters",
+           "profile_section"]
+
+
+class GetterProfile(object):
+    """
+    Accumulate call counts, rows and wall time per (class, column).
+
+    Wall time is recorded both inclusive of and exclusive of ('self'
+    time) the nested getters and sections called while a getter runs,
+    so that a getter which only requests other columns does not hide
+    the one doing the work.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        """
+        self._stats = {}
+        self._child_time = []
+
+    def start(self):
+        """
+        Mark the start of a profiled call; returns the start time to
+        pass to stop()
+        """
+        self._child_time.append(0.0)
+        return time.time()
+
+    def stop(self, owner, name, n_rows, t_start):
+        """
+        Record a profiled call started with start()
+
+        Parameters
+        ----------
+        owner: str
+            The name of the class being profiled
+        name: str
+            The column (or loading step) being profiled
+        n_rows: int
+            The number of rows the call processed
+        t_start: float
+            The output of start()
+        """
+        wall = time.time() - t_start
+        children = self._child_time.pop()
+        if len(self._child_time) > 0:
+            self._child_time[-1] += wall
+        stats = self._stats.setdefault((owner, name), [0, 0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += n_rows
+        stats[2] += wall
+        stats[3] += wall - children
+
+    def table(self):
+        """
+        Return the statistics as a list of lines, most expensive
+        (by self time) first
+        """
+        lines = ['%-32s %-32s %8s %12s %10s %10s' %
+                 ('# class', 'column', 'calls', 'rows', 'wall(s)', 'self(s)')]
+        for (owner, name), stats in sorted(self._stats.items(),
+                                           key=lambda kv: -kv[1][3]):
+            lines.append('%-32s %-32s %8d %12d %10.3f %10.3f' %
+                         ((owner, name) + tuple(stats)))
+        return lines
+
+    def write(self, file_name):
+        """
+        Write the output of table() to file_name
+        """
+        with open(file_name, 'w') as out_file:
+            out_file.write('\n'.join(self.table()) + '\n')
+
+
+getter_profile = GetterProfile(enabled=os.environ.get('GCRCATSIM_PROFILE', '')
+                               not in ('', '0'))
+
+
+class profile_section(object):
+    """
+    Context manager recording one step (e.g. loading a quantity) in
+    getter_profile.  Does nothing unless profiling is enabled.
+
+    Parameters
+    ----------
+    owner: str
+        The name of the class doing the work
+    name: str
+        The name of the step
+    n_rows: int [0]
+        The number of rows the step processes
+    """
+    __slots__ = ('owner', 'name', 'n_rows', '_t_start')
+
+    def __init__(self, owner, name, n_rows=0):
+        self.owner = owner
+        self.name = name
+        self.n_rows = n_rows
+        self._t_start = None
+
+    def __enter__(self):
+        if getter_profile.enabled:
+            self._t_start = getter_profile.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._t_start is not None:
+            getter_profile.stop(self.owner, self.name, self.n_rows,
+                                self._t_start)
+        return False
+
+
+def _profiled_getter(func, column):
+    """
+    Wrap the getter func of column so that its calls are recorded
+    in getter_profile under the class of the calling catalog
+    """
+    @functools.wraps(func)
+    def profiled(self, *args, **kwargs):
+        if not getter_profile.enabled:
+            return func(self, *args, **kwargs)
+        t_start = getter_profile.start()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            chunk = getattr(self, '_current_chunk', None)
+            getter_profile.stop(type(self).__name__, column,
+                                0 if chunk is None else len(chunk), t_start)
+    profiled._is_profiled_getter = True
+    return profiled
+
+
+def profile_getters(*class_list):
+    """
+    Wrap every get_* method (including inherited ones) of the
+    InstanceCatalog classes in class_list so that getter_profile
+    records its calls.  The decorations (@cached, @compound) of
+    the getters are preserved, and getters already wrapped (e.g.
+    inherited from a class profiled earlier) are left alone.
+    """
+    for cls in class_list:
+        for name in dir(cls):
+            if not name.startswith('get_'):
+                continue
+            func = getattr(cls, name)
+            if not callable(func) or getattr(func, '_is_profiled_getter', False):
+                continue
+            setattr(cls, name, _profiled_getter(func, name[4:]))
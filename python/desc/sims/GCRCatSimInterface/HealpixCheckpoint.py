@@ -0,0 +1,126 @@
+"""
+Classes to checkpoint the writing of InstanceCatalogs at the healpixel
+boundaries of DESCQAChunkIterator_healpix so that an aborted component
+can be resumed from the last completed healpixel rather than from scratch.
+"""
+import os
+import json
+
+__all__ = ["HealpixCheckpoint", "HealpixCheckpointMixin"]
+
+
+class HealpixCheckpoint(object):
+    """
+    A record of the healpixels whose objects have all been written to
+    an InstanceCatalog text file, together with the byte offset in that
+    file at which the last completed healpixel ended.
+
+    To use, set it as the `checkpoint` attribute of the DESCQAObject
+    being queried, call prepare_output() to get the mode in which
+    the InstanceCatalog should be opened, and write the catalog with
+    a class that inherits from HealpixCheckpointMixin.
+    DESCQAChunkIterator_healpix will skip the healpixels that have
+    already been completed and report the healpixels it finishes.
+    """
+
+    def __init__(self, file_name, output_name):
+        """
+        Parameters
+        ----------
+        file_name: str
+            The json file in which the checkpoint is stored.  If it exists
+            and refers to output_name, its state is loaded.
+        output_name: str
+            The InstanceCatalog file being checkpointed
+        """
+        self.file_name = file_name
+        self.output_name = os.path.abspath(output_name)
+        self.completed = []
+        self.offset = 0
+        self._pending = []
+
+        if os.path.isfile(file_name):
+            with open(file_name, 'r') as in_file:
+                try:
+                    state = json.load(in_file)
+                except ValueError:
+                    state = {}
+            if state.get('output') == self.output_name:
+                self.completed = [int(hp) for hp in state['completed']]
+                self.offset = int(state['offset'])
+
+    def prepare_output(self):
+        """
+        Truncate the output file back to the last committed byte
+        offset so that any partially written healpixel is discarded.
+
+        Returns the mode ('w' or 'a') in which the InstanceCatalog
+        should be opened.
+        """
+        if (len(self.completed) == 0 or
+            not os.path.isfile(self.output_name) or
+            os.path.getsize(self.output_name) < self.offset):
+
+            # nothing usable has been committed; start from scratch
+            self.completed = []
+            self.offset = 0
+            return 'w'
+
+        os.truncate(self.output_name, self.offset)
+        return 'a'
+
+    def healpixel_finished(self, healpixel):
+        """
+        Called by the chunk iterator once every chunk from healpixel
+        has been handed to the InstanceCatalog.  The healpixel is
+        committed the next time commit() is called.
+        """
+        self._pending.append(int(healpixel))
+
+    def commit(self, file_handle):
+        """
+        Commit any finished healpixels.  Must be called before the
+        InstanceCatalog writes a chunk, so that the current size of
+        file_handle marks the end of the finished healpixels.
+        """
+        if len(self._pending) == 0:
+            return
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+        self.offset = file_handle.tell()
+        self.completed += self._pending
+        self._pending = []
+        self._save()
+
+    def _save(self):
+        tmp_name = self.file_name + '.tmp'
+        with open(tmp_name, 'w') as out_file:
+            json.dump({'output': self.output_name,
+                       'completed': self.completed,
+                       'offset': self.offset}, out_file)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp_name, self.file_name)
+
+    def remove(self):
+        """
+        Delete the checkpoint file (to be called once the
+        InstanceCatalog is complete)
+        """
+        self._pending = []
+        if os.path.exists(self.file_name):
+            os.unlink(self.file_name)
+
+
+class HealpixCheckpointMixin(object):
+    """
+    InstanceCatalog mixin that commits the HealpixCheckpoint attached
+    to its db_obj (if any) before each chunk is written.
+    """
+
+    def _write_recarray(self, local_recarray, file_handle):
+        checkpoint = getattr(self.db_obj, 'checkpoint', None)
+        if checkpoint is not None:
+            checkpoint.commit(file_handle)
+        super(HealpixCheckpointMixin, self)._write_recarray(local_recarray,
+                                                            file_handle)
@@ -0,0 +1,147 @@
+"""
+Planning of the sqlite queries that select the rows of a table whose
+htmid column falls in the trixels overlapping a region of the sky.
+
+The trixel ranges returned by HalfSpace.findAllTrixels are merged into
+disjoint intervals (and, optionally, coarsened into fewer intervals
+whose extra trixels are removed afterwards with contains()).  The
+intervals are passed to sqlite either as bound parameters of a
+BETWEEN clause (for SQLAlchemy queries) or through a temporary table
+joined to the queried table, so that sqlite does one index range scan
+per interval however large the footprint is.
+"""
+import numpy as np
+from sqlalchemy import text
+from lsst.sims.utils import halfSpaceFromRaDec
+
+__all__ = ["HtmRangePlan", "merge_htm_ranges", "coarsen_htm_ranges"]
+
+
+def merge_htm_ranges(bounds):
+    """
+    Sort a list of [min, max] htmid ranges and merge those that
+    overlap or are adjacent.
+
+    Returns
+    -------
+    A numpy array of shape (n_ranges, 2)
+    """
+    bounds = np.array(bounds, dtype=np.int64).reshape(-1, 2)
+    if len(bounds) == 0:
+        return bounds
+    bounds = bounds[np.argsort(bounds[:, 0], kind='mergesort')]
+    running_max = np.maximum.accumulate(bounds[:, 1])
+    is_start = np.ones(len(bounds), dtype=bool)
+    is_start[1:] = bounds[1:, 0] > running_max[:-1]+1
+    i_start = np.nonzero(is_start)[0]
+    i_end = np.append(i_start[1:], len(bounds))-1
+    return np.column_stack((bounds[i_start, 0], running_max[i_end]))
+
+
+def coarsen_htm_ranges(ranges, max_ranges):
+    """
+    Merge the disjoint, sorted ranges (the output of merge_htm_ranges)
+    separated by the smallest gaps until at most max_ranges remain.
+    The result covers every trixel of ranges, and some trixels that
+    are not in ranges.
+    """
+    if max_ranges < 1:
+        raise RuntimeError("max_ranges must be positive; you gave %d" % max_ranges)
+    if len(ranges) <= max_ranges:
+        return ranges
+    gaps = ranges[1:, 0]-ranges[:-1, 1]
+    # keep the max_ranges-1 largest gaps as the breaks between ranges
+    breaks = np.sort(np.argsort(gaps, kind='mergesort')[len(gaps)-(max_ranges-1):])
+    i_start = np.append(0, breaks+1)
+    i_end = np.append(breaks, len(ranges)-1)
+    return np.column_stack((ranges[i_start, 0], ranges[i_end, 1]))
+
+
+class HtmRangePlan(object):
+    """
+    The htmid intervals with which to query the trixels overlapping
+    a region of the sky.
+
+    Parameters
+    ----------
+    half_space: lsst.sims.utils.HalfSpace
+        The region of the sky
+    htmid_level: int
+        The level of the htmids being queried
+    max_ranges: int [None]
+        If not None, coarsen the intervals to at most this many.
+        The query then returns rows from trixels outside of
+        half_space; remove them with contains() if needed.
+    """
+
+    def __init__(self, half_space, htmid_level, max_ranges=None):
+        self.htmid_level = htmid_level
+        self.exact_ranges = merge_htm_ranges(half_space.findAllTrixels(htmid_level))
+        if max_ranges is None:
+            self.ranges = self.exact_ranges
+        else:
+            self.ranges = coarsen_htm_ranges(self.exact_ranges, max_ranges)
+
+    @classmethod
+    def from_circle(cls, ra, dec, radius, htmid_level, max_ranges=None):
+        """
+        Plan the query of a circle (ra, dec, radius in degrees)
+        """
+        return cls(halfSpaceFromRaDec(ra, dec, radius), htmid_level,
+                   max_ranges=max_ranges)
+
+    @property
+    def is_coarsened(self):
+        """
+        True if the query intervals include trixels outside of the region
+        """
+        return len(self.ranges) < len(self.exact_ranges)
+
+    def contains(self, htmid):
+        """
+        Return a boolean array marking which of the htmids (an array)
+        are in trixels overlapping the region
+        """
+        htmid = np.asarray(htmid, dtype=np.int64)
+        i_range = np.searchsorted(self.exact_ranges[:, 0], htmid, side='right')-1
+        valid = i_range >= 0
+        is_in = np.zeros(htmid.shape, dtype=bool)
+        is_in[valid] = htmid[valid] <= self.exact_ranges[i_range[valid], 1]
+        return is_in
+
+    def sql_filter(self, column):
+        """
+        Return an SQLAlchemy text clause restricting column to the
+        intervals, whose bounds are passed as bound parameters
+        """
+        if len(self.ranges) == 0:
+            return text('0')
+        clauses = []
+        params = {}
+        for i_range, (lo, hi) in enumerate(self.ranges):
+            clauses.append('(%s BETWEEN :htm_lo_%d AND :htm_hi_%d)'
+                           % (column, i_range, i_range))
+            params['htm_lo_%d' % i_range] = int(lo)
+            params['htm_hi_%d' % i_range] = int(hi)
+        return text('(%s)' % ' OR '.join(clauses)).bindparams(**params)
+
+    def load(self, cursor, range_table='htm_ranges'):
+        """
+        Write the intervals into the temporary table range_table
+        (columns lo, hi) of the connection of a sqlite3 cursor,
+        replacing what it held before
+        """
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS %s (lo int, hi int)'
+                       % range_table)
+        cursor.execute('DELETE FROM %s' % range_table)
+        cursor.executemany('INSERT INTO %s VALUES (?, ?)' % range_table,
+                           ((int(lo), int(hi)) for lo, hi in self.ranges))
+
+    def join(self, table, column, range_table='htm_ranges'):
+        """
+        Return the FROM clause joining table to the intervals written by
+        load().  The CROSS JOIN makes sqlite loop over the intervals and
+        do an index range scan of table.column for each of them.
+        """
+        return ('%s CROSS JOIN %s ON %s.%s BETWEEN %s.lo AND %s.hi'
+                % (range_table, table, table, column, range_table, range_table))
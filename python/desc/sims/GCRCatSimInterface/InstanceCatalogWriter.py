@@ -5,6 +5,7 @@ galaxy catalogs.
 from __future__ import with_statement
 import os
 import copy
+import shutil
 import subprocess
 from collections import namedtuple
 import numpy as np
@@ -21,8 +22,7 @@ from desc.sims.GCRCatSimInterface import DC2StarObj
 from lsst.sims.catUtils.exampleCatalogDefinitions import \
     PhoSimCatalogPoint, DefaultPhoSimHeaderMap
 from lsst.sims.catUtils.mixins import VariabilityStars
-from lsst.sims.catUtils.utils import ObservationMetaDataGenerator
-from lsst.sims.utils import arcsecFromRadians, _getRotSkyPos
+from lsst.sims.utils import arcsecFromRadians
 from . import PhoSimDESCQA, PhoSimDESCQA_AGN
 from . import TruthPhoSimDESCQA, SprinklerTruthCatMixin
 from . import SubCatalogMixin
@@ -40,8 +40,14 @@ try:
 except ImportError:
     HAS_TWINKLES = False
 
-from . import DC2PhosimCatalogSN, SNeDBObject
+from . import DC2PhosimCatalogSN, SNeDBObject, SNSedWriter
 from . import hostImage
+from . import JobJournal, validated_components
+from . import HealpixCheckpoint
+from . import shard_instance_catalog
+from . import MemoryBudget
+from . import VisitTable, _getRotSkyPosArray
+from . import getter_profile, profile_getters
 
 __all__ = ['InstanceCatalogWriter', 'make_instcat_header', 'get_obs_md',
            'snphosimcat']
@@ -59,7 +65,7 @@ SNDTYPESR1p1 = np.dtype([('snid_in', int),
                          ('sndec_in', float)])
 
 def snphosimcat(fname, obs_metadata, objectIDtype, sedRootDir,
-                idColKey='snid_in'):
+                idColKey='snid_in', sn_sed_writer=None):
     """convenience function for writing out phosim instance catalogs for
     different SN populations in DC2 Run 1.1 that have been serialized to
     csv files.
@@ -78,6 +84,9 @@ def snphosimcat(fname, obs_metadata, objectIDtype, sedRootDir,
         will be written to the directory `sedRootDir/Dynamic/`
     dtype : instance of `numpy.dtype`
         tuples describing the variables and types in the csv files.
+    sn_sed_writer : instance of `SNSedWriter` [None]
+        writer of the spectra, shared between calls (e.g. to keep its
+        archive setting).  If None, a new one is used.
 
 
     Returns
@@ -93,8 +102,13 @@ def snphosimcat(fname, obs_metadata, objectIDtype, sedRootDir,
     cat.surveyStartDate = 0.
     cat.maxz = 1.4 # increasing max redshift
     cat.maxTimeSNVisible = 150.0 # increasing for high z SN
+    # only query the SNe the catalog will keep
+    dbobj.maxz = cat.maxz
+    dbobj.maxTimeSNVisible = cat.maxTimeSNVisible
     cat.phoSimHeaderMap = DefaultPhoSimHeaderMap
     cat.writeSedFile = True
+    if sn_sed_writer is not None:
+        cat.sn_sed_writer = sn_sed_writer
 
     # This means that the the spectra written by phosim will
     # go to `spectra_files/Dynamic/specFileSN_*
@@ -104,6 +118,9 @@ def snphosimcat(fname, obs_metadata, objectIDtype, sedRootDir,
     # without directories or something else
     spectradir = os.path.join(sedRootDir, 'Dynamic')
     os.makedirs(spectradir, exist_ok=True)
+    if sn_sed_writer is not None and sn_sed_writer.archive:
+        # start the archive afresh, e.g. after an aborted run
+        sn_sed_writer.clear_archive(spectradir)
 
     cat.sn_sedfile_prefix = os.path.join(spectradir, 'specFileSN_')
     return cat
@@ -121,7 +138,9 @@ class InstanceCatalogWriter(object):
                  agn_db_name=None, agn_threads=1, sn_db_name=None,
                  sprinkler=False, host_image_dir=None,
                  host_data_dir=None, config_dict=None,
-                 gzip_threads=3):
+                 gzip_threads=3, checkpoint=False, format_profile=None,
+                 sensor_shards=False, shard_margin=10.0, max_rss_gb=None,
+                 visit_table_file=None, sn_sed_archive=False):
         """
         Parameters
         ----------
@@ -160,12 +179,50 @@ class InstanceCatalogWriter(object):
         gzip_threads: int
             The number of gzip jobs that can be started in parallel after
             catalogs are written (default=3)
+        checkpoint: bool [False]
+            Flag to checkpoint the knots, bulge and disk catalogs at
+            healpixel boundaries so that an aborted component resumes
+            from the last completed healpixel (see HealpixCheckpoint).
+        format_profile: str [None]
+            Name of the significant-digit profile (see
+            LineFormatter.format_profiles) with which to write the
+            galaxy and supernova catalogs.  None keeps the usual formats.
+        sensor_shards: bool [False]
+            Flag to also write one InstanceCatalog per sensor (with a
+            manifest of sensors and row counts) in the 'sensors'
+            sub-directory of each visit (see SensorShards).
+        shard_margin: float [10]
+            Number of pixels by which each sensor is grown when
+            assigning objects to sensor catalogs.
+        max_rss_gb: float [None]
+            Resident set size budget in GB within which the galaxy
+            healpixels are loaded (see MemoryBudget).  None loads a
+            fixed number of rows at a time.
+        visit_table_file: str [None]
+            .npz file caching the OpSim Summary columns (see VisitTable).
+            It is read if it exists and written from opsimdb otherwise.
+            None reads the columns from opsimdb every time.
+        sn_sed_archive: bool [False]
+            Flag to write the supernova spectra of a visit into one
+            archive file in its Dynamic directory instead of one file
+            per SN (see SNSedWriter and extract_sn_sed_archive).
         """
         self.t_start = time.time()
         if not os.path.exists(opsimdb):
             raise RuntimeError('%s does not exist' % opsimdb)
 
         self.gzip_threads = gzip_threads
+        self.checkpoint = checkpoint
+        self.format_profile = format_profile
+        self.sensor_shards = sensor_shards
+        self.shard_margin = shard_margin
+        self.memory_budget = None
+        if max_rss_gb is not None:
+            self.memory_budget = MemoryBudget(max_rss_gb)
+
+        # optional dict mapping obsHistID to the order in which the
+        # galaxy healpixels are loaded (see VisitPlanner.plan_visits)
+        self.healpix_order = {}
 
         # load the data for the parametrized light
         # curve stellar variability model into a
@@ -186,8 +243,7 @@ class InstanceCatalogWriter(object):
         self.phot_params = PhotometricParameters(nexp=1, exptime=30)
         self.bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
 
-        self.obs_gen = ObservationMetaDataGenerator(database=opsimdb,
-                                                    driver='sqlite')
+        self.visit_table = VisitTable.load(opsimdb, cache_file=visit_table_file)
 
         if star_db_name is None:
             raise IOError("Need to specify star_db_name")
@@ -218,11 +274,13 @@ class InstanceCatalogWriter(object):
             self.agn_db_name = None
 
         self.sn_db_name = None
+        self.sn_sed_writer = None
         if sn_db_name is not None:
             if os.path.isfile(sn_db_name):
                 self.sn_db_name = sn_db_name
             else:
                 raise IOError("%s is not a file" % sn_db_name)
+            self.sn_sed_writer = SNSedWriter(archive=sn_sed_archive)
 
         if host_image_dir is None and self.sprinkler is not False:
             raise IOError("Need to specify the name of the host image directory.")
@@ -245,6 +303,73 @@ class InstanceCatalogWriter(object):
 
         self.instcats = get_instance_catalogs()
 
+    @staticmethod
+    def _resume_component(resumed, component, full_out_dir, journal=None):
+        """
+        Check whether a component can be skipped because a previous
+        job already wrote it.
+
+        Parameters
+        ----------
+        resumed: dict
+            The output of JobJournal.validated_components for the
+            pickup journal
+        component: str
+            The name of the component
+        full_out_dir: str
+            The directory into which this visit is being written
+        journal: JobJournal [None]
+            The journal of this job, in which a resumed component's
+            files are recorded again so that the journal accounts
+            for the whole visit
+
+        Returns
+        -------
+        None if the component must be (re)generated; otherwise a list
+        of the paths of its files relative to full_out_dir, which
+        will have been copied there (keeping their subdirectories,
+        e.g. Dynamic/) if they were originally written elsewhere.
+        """
+        if component not in resumed:
+            return None
+        name_list = []
+        for entry in resumed[component]:
+            rel_name = entry.get('relpath', os.path.basename(entry['path']))
+            target = os.path.join(full_out_dir, rel_name)
+            if os.path.abspath(target) != entry['path']:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(entry['path'], target)
+            name_list.append(rel_name)
+        if journal is not None:
+            journal.log_component(component,
+                                  [os.path.join(full_out_dir, name)
+                                   for name in name_list],
+                                  resumed[component][0]['wall_time'])
+        return name_list
+
+    def _write_descqa_catalog(self, cat, out_name):
+        """
+        Write an InstanceCatalog of DESCQA galaxy components to out_name.
+        If self.checkpoint is True, completed healpixels are recorded in
+        'checkpoint_<out_name>.json' next to out_name and a previously
+        aborted write of the same file is resumed from the last completed
+        healpixel.  The checkpoint file is removed once the catalog is
+        complete.
+        """
+        if not self.checkpoint:
+            cat.write_catalog(out_name, chunk_size=5000, write_header=False)
+            return
+
+        checkpoint_name = os.path.join(os.path.dirname(out_name),
+                                       'checkpoint_%s.json' % os.path.basename(out_name))
+        checkpoint = HealpixCheckpoint(checkpoint_name, out_name)
+        write_mode = checkpoint.prepare_output()
+        cat.db_obj.checkpoint = checkpoint
+        cat.write_catalog(out_name, chunk_size=5000, write_header=False,
+                          write_mode=write_mode)
+        cat.db_obj.checkpoint = None
+        checkpoint.remove()
+
     def write_catalog(self, obsHistID, out_dir=None, fov=2, status_dir=None,
                       pickup_file=None):
         """
@@ -262,15 +387,19 @@ class InstanceCatalogWriter(object):
             Field-of-view angular radius in degrees.  2 degrees will cover
             the LSST focal plane.
         status_dir: str
-            The directory in which to write the log file recording this job's
-            progress.
+            The directory in which to write the JSON-lines journal
+            recording this job's progress (see JobJournal) and, if the
+            GCRCATSIM_PROFILE environment variable is set, the table of
+            time spent per column (see GetterProfiler).
         pickup_file: str
-            The path to an aborted log file (the file written to status_dir).
-            This job will resume where that one left off, only simulating
-            sub-catalogs that did not complete.
+            The path to the journal of an aborted job (the file written to
+            status_dir).  This job will resume where that one left off,
+            only simulating sub-catalogs whose output files are not on
+            disk with the size and checksum recorded in the journal.
         """
 
         print('process %d doing %d' % (os.getpid(), obsHistID))
+        getter_profile.reset()
 
         if out_dir is None:
             raise RuntimeError("must specify out_dir")
@@ -278,57 +407,31 @@ class InstanceCatalogWriter(object):
         full_out_dir = os.path.join(out_dir, '%.8d' % obsHistID)
         tar_name = os.path.join(out_dir, '%.8d.tar' % obsHistID)
 
-        do_stars = True
-        do_knots = True
-        do_bulges = True
-        do_disks = True
-        do_sprinkled = True
-        do_hosts = True
-        do_sne = True
+        resumed = {}
         if pickup_file is not None and os.path.isfile(pickup_file):
-            with open(pickup_file, 'r') as in_file:
-                for line in in_file:
-                    if 'wrote star' in line:
-                        do_stars = False
-                    if 'wrote knot' in line:
-                        do_knots = False
-                    if 'wrote bulge' in line:
-                        do_bulges = False
-                    if 'wrote disk' in line:
-                        do_disks = False
-                    if 'wrote galaxy catalogs with sprinkling' in line:
-                        do_sprinkled = False
-                    if 'wrote lensing host' in line:
-                        do_hosts = False
-                    if 'wrote SNe' in line:
-                        do_sne = False
+            resumed = validated_components(pickup_file)
 
         if not os.path.exists(full_out_dir):
             os.makedirs(full_out_dir)
 
-        has_status_file = False
+        journal = None
+        status_file = None
         if status_dir is not None:
             if not os.path.exists(status_dir):
                 os.makedirs(status_dir)
-            status_file = os.path.join(status_dir, 'job_log_%.8d.txt' % obsHistID)
-            if os.path.exists(status_file):
-                os.unlink(status_file)
-            has_status_file = True
+            status_file = os.path.join(status_dir, 'job_log_%.8d.jsonl' % obsHistID)
+            journal = JobJournal(status_file, obsHistID,
+                                 root_dir=full_out_dir)
+            journal.log_event('start', config=self.config_dict,
+                              resumed=sorted(resumed.keys()))
 
-            with open(status_file, 'a') as out_file:
-                out_file.write('writing %d\n' % (obsHistID))
-                for kk in self.config_dict:
-                    out_file.write('%s: %s\n' % (kk, self.config_dict[kk]))
-
-        obs_md = get_obs_md(self.obs_gen, obsHistID, fov, dither=self.dither)
+        obs_md = get_obs_md(self.visit_table, obsHistID, fov, dither=self.dither)
 
         if obs_md is None:
             return
 
-        if has_status_file:
-            with open(status_file, 'a') as out_file:
-                out_file.write('got obs_md in %e hours\n' %
-                               ((time.time()-self.t_start)/3600.0))
+        if journal is not None:
+            journal.log_event('obs_md', elapsed_hrs=(time.time()-self.t_start)/3600.0)
 
         # Add directory for writing the GLSN spectra to
         glsn_spectra_dir = str(os.path.join(full_out_dir, 'Dynamic'))
@@ -349,7 +452,9 @@ class InstanceCatalogWriter(object):
         written_catalog_names = []
         sprinkled_host_name = 'spr_hosts_%d.txt' % obsHistID
 
-        if do_stars:
+        if self._resume_component(resumed, 'star', full_out_dir,
+                                  journal) is None:
+            t_component = time.time()
             star_cat = self.instcats.StarInstCat(self.star_db, obs_metadata=obs_md)
             star_cat.min_mag = self.min_mag
             star_cat.photParams = self.phot_params
@@ -366,33 +471,35 @@ class InstanceCatalogWriter(object):
             cat_dict = {os.path.join(full_out_dir, star_name): star_cat,
                         os.path.join(full_out_dir, bright_star_name): bright_cat}
             parallelCatalogWriter(cat_dict, chunk_size=50000, write_header=False)
-            written_catalog_names.append(star_name)
-
-            if has_status_file:
-                with open(status_file, 'a') as out_file:
-                    duration = (time.time()-self.t_start)/3600.0
-                    out_file.write('%d wrote star catalog after %.3e hrs\n' %
-                                   (obsHistID, duration))
-
-        if 'knots' in self.descqa_catalog and do_knots:
-            knots_db =  knotsDESCQAObject(self.descqa_catalog)
-            knots_db.field_ra = self.protoDC2_ra
-            knots_db.field_dec = self.protoDC2_dec
-            cat = self.instcats.DESCQACat(knots_db, obs_metadata=obs_md,
-                                          cannot_be_null=['hasKnots'])
-            cat.sed_lookup_dir = self.sed_lookup_dir
-            cat.photParams = self.phot_params
-            cat.lsstBandpassDict = self.bp_dict
-            cat.write_catalog(os.path.join(full_out_dir, knots_name), chunk_size=5000,
-                              write_header=False)
+
+            if journal is not None:
+                journal.log_component('star', list(cat_dict.keys()),
+                                      time.time()-t_component)
+        written_catalog_names.append(star_name)
+
+        if 'knots' in self.descqa_catalog:
+            if self._resume_component(resumed, 'knots', full_out_dir,
+                                      journal) is None:
+                t_component = time.time()
+                knots_db =  knotsDESCQAObject(self.descqa_catalog)
+                knots_db.field_ra = self.protoDC2_ra
+                knots_db.field_dec = self.protoDC2_dec
+                knots_db.healpix_order = self.healpix_order.get(obsHistID, None)
+                knots_db.memory_budget = self.memory_budget
+                cat = self.instcats.DESCQACat(knots_db, obs_metadata=obs_md,
+                                              cannot_be_null=['hasKnots'])
+                cat.sed_lookup_dir = self.sed_lookup_dir
+                cat.photParams = self.phot_params
+                cat.format_profile = self.format_profile
+                cat.lsstBandpassDict = self.bp_dict
+                self._write_descqa_catalog(cat, os.path.join(full_out_dir, knots_name))
+                del cat
+                del knots_db
+                if journal is not None:
+                    journal.log_component('knots',
+                                          [os.path.join(full_out_dir, knots_name)],
+                                          time.time()-t_component)
             written_catalog_names.append(knots_name)
-            del cat
-            del knots_db
-            if has_status_file:
-                with open(status_file, 'a') as out_file:
-                    duration = (time.time()-self.t_start)/3600.0
-                    out_file.write('%d wrote knots catalog after %.3e hrs\n' %
-                                   (obsHistID, duration))
         else:
             # Creating empty knots component
             subprocess.check_call('cd %(full_out_dir)s; touch %(knots_name)s' % locals(), shell=True)
@@ -400,55 +507,33 @@ class InstanceCatalogWriter(object):
 
         if self.sprinkler is False:
 
-            if do_bulges:
-                bulge_db = bulgeDESCQAObject(self.descqa_catalog)
-                bulge_db.field_ra = self.protoDC2_ra
-                bulge_db.field_dec = self.protoDC2_dec
-                cat = self.instcats.DESCQACat(bulge_db, obs_metadata=obs_md,
-                                              cannot_be_null=['hasBulge', 'magNorm'])
-                cat_name = 'bulge_'+gal_name
-                cat.sed_lookup_dir = self.sed_lookup_dir
-                cat.lsstBandpassDict = self.bp_dict
-                cat.photParams = self.phot_params
-                cat.write_catalog(os.path.join(full_out_dir, cat_name), chunk_size=5000,
-                                  write_header=False)
+            for component, db_class in (('bulge', bulgeDESCQAObject),
+                                        ('disk', diskDESCQAObject)):
+                cat_name = component + '_' + gal_name
+                if self._resume_component(resumed, component, full_out_dir,
+                                          journal) is None:
+                    t_component = time.time()
+                    has_component = 'hasBulge' if component == 'bulge' else 'hasDisk'
+                    comp_db = db_class(self.descqa_catalog)
+                    comp_db.field_ra = self.protoDC2_ra
+                    comp_db.field_dec = self.protoDC2_dec
+                    comp_db.healpix_order = self.healpix_order.get(obsHistID, None)
+                    comp_db.memory_budget = self.memory_budget
+                    cat = self.instcats.DESCQACat(comp_db, obs_metadata=obs_md,
+                                                  cannot_be_null=[has_component, 'magNorm'])
+                    cat.sed_lookup_dir = self.sed_lookup_dir
+                    cat.lsstBandpassDict = self.bp_dict
+                    cat.photParams = self.phot_params
+                    cat.format_profile = self.format_profile
+                    self._write_descqa_catalog(cat, os.path.join(full_out_dir, cat_name))
+                    del cat
+                    del comp_db
+
+                    if journal is not None:
+                        journal.log_component(component,
+                                              [os.path.join(full_out_dir, cat_name)],
+                                              time.time()-t_component)
                 written_catalog_names.append(cat_name)
-                del cat
-                del bulge_db
-
-                if has_status_file:
-                    with open(status_file, 'a') as out_file:
-                        duration = (time.time()-self.t_start)/3600.0
-                        out_file.write('%d wrote bulge catalog after %.3e hrs\n' %
-                                       (obsHistID, duration))
-
-            if do_disks:
-                disk_db = diskDESCQAObject(self.descqa_catalog)
-                disk_db.field_ra = self.protoDC2_ra
-                disk_db.field_dec = self.protoDC2_dec
-                cat = self.instcats.DESCQACat(disk_db, obs_metadata=obs_md,
-                                              cannot_be_null=['hasDisk', 'magNorm'])
-                cat_name = 'disk_'+gal_name
-                cat.sed_lookup_dir = self.sed_lookup_dir
-                cat.lsstBandpassDict = self.bp_dict
-                cat.photParams = self.phot_params
-                cat.write_catalog(os.path.join(full_out_dir, cat_name), chunk_size=5000,
-                                  write_header=False)
-                written_catalog_names.append(cat_name)
-                del cat
-                del disk_db
-
-                if has_status_file:
-                    with open(status_file, 'a') as out_file:
-                        duration = (time.time()-self.t_start)/3600.0
-                        out_file.write('%d wrote disk catalog after %.3e hrs\n' %
-                                       (obsHistID, duration))
-
-                if has_status_file:
-                    with open(status_file, 'a') as out_file:
-                        duration = (time.time()-self.t_start)/3600.0
-                        out_file.write('%d wrote agn catalog after %.3e hrs\n' %
-                                       (obsHistID, duration))
         else:
 
             if not HAS_TWINKLES:
@@ -473,7 +558,10 @@ class InstanceCatalogWriter(object):
                 catalog_type = 'sprinkled_agn_%d' % obs_md.OpsimMetaData['obsHistID']
                 _agn_threads = self._agn_threads
 
-            if do_sprinkled:
+            sprinkled_names = ['bulge_'+gal_name, 'disk_'+gal_name, 'agn_'+gal_name]
+            if self._resume_component(resumed, 'sprinkled', full_out_dir,
+                                      journal) is None:
+                t_component = time.time()
                 self.compoundGalICList = [SprinkledBulgeCat,
                                           SprinkledDiskCat,
                                           SprinkledAgnCat]
@@ -484,6 +572,7 @@ class InstanceCatalogWriter(object):
 
                 for db_class in self.compoundGalDBList:
                     db_class.yaml_file_name = self.descqa_catalog
+                    db_class.memory_budget = self.memory_budget
 
                 gal_cat = twinklesDESCQACompoundObject(self.compoundGalICList,
                                                        self.compoundGalDBList,
@@ -500,17 +589,19 @@ class InstanceCatalogWriter(object):
                 gal_cat.photParams = self.phot_params
                 gal_cat.lsstBandpassDict = self.bp_dict
 
-                written_catalog_names.append('bulge_'+gal_name)
-                written_catalog_names.append('disk_'+gal_name)
-                written_catalog_names.append('agn_'+gal_name)
                 gal_cat.write_catalog(os.path.join(full_out_dir, gal_name), chunk_size=5000,
                                       write_header=False)
-                if has_status_file:
-                    with open(status_file, 'a') as out_file:
-                        duration = (time.time()-self.t_start)/3600.0
-                        out_file.write('%d wrote galaxy catalogs with sprinkling after %.3e hrs\n' % (obsHistID, duration))
-
-            if do_hosts:
+                if journal is not None:
+                    journal.log_component('sprinkled',
+                                          [os.path.join(full_out_dir, name)
+                                           for name in sprinkled_names
+                                           if os.path.exists(os.path.join(full_out_dir, name))],
+                                          time.time()-t_component)
+            written_catalog_names += sprinkled_names
+
+            if self._resume_component(resumed, 'hosts', full_out_dir,
+                                      journal) is None:
+                t_component = time.time()
                 host_cat = hostImage(obs_md.pointingRA, obs_md.pointingDec, fov)
                 host_cat.write_host_cat(os.path.join(self.host_image_dir, 'agn_lensed_bulges'),
                                         os.path.join(self.host_data_dir, 'cosmoDC2_v1.1.4_bulge_agn_host.csv'),
@@ -525,35 +616,47 @@ class InstanceCatalogWriter(object):
                                         os.path.join(self.host_data_dir, 'cosmoDC2_v1.1.4_disk_sne_host.csv'),
                                         os.path.join(full_out_dir, sprinkled_host_name), append=True)
 
-                written_catalog_names.append(sprinkled_host_name)
-
-                if has_status_file:
-                    with open(status_file, 'a') as out_file:
-                        duration = (time.time()-self.t_start)/3600.0
-                        out_file.write('%d wrote lensing host catalog after %.3e hrs\n' % (obsHistID, duration))
+                if journal is not None:
+                    journal.log_component('hosts',
+                                          [os.path.join(full_out_dir, sprinkled_host_name)],
+                                          time.time()-t_component)
+            written_catalog_names.append(sprinkled_host_name)
 
         # SN instance catalogs
-        if self.sn_db_name is not None and do_sne:
-            phosimcatalog = snphosimcat(self.sn_db_name,
-                                        obs_metadata=obs_md,
-                                        objectIDtype=42,
-                                        sedRootDir=full_out_dir)
-
-            phosimcatalog.photParams = self.phot_params
-            phosimcatalog.lsstBandpassDict = self.bp_dict
-
+        if self.sn_db_name is not None:
             snOutFile = 'sne_cat_{}.txt'.format(obsHistID)
-            phosimcatalog.write_catalog(os.path.join(full_out_dir, snOutFile),
-                                        chunk_size=5000, write_header=False)
+            if self._resume_component(resumed, 'sne', full_out_dir,
+                                      journal) is None:
+                t_component = time.time()
+                phosimcatalog = snphosimcat(self.sn_db_name,
+                                            obs_metadata=obs_md,
+                                            objectIDtype=42,
+                                            sedRootDir=full_out_dir,
+                                            sn_sed_writer=self.sn_sed_writer)
+
+                phosimcatalog.photParams = self.phot_params
+                phosimcatalog.lsstBandpassDict = self.bp_dict
+                phosimcatalog.format_profile = self.format_profile
+
+                phosimcatalog.write_catalog(os.path.join(full_out_dir, snOutFile),
+                                            chunk_size=5000, write_header=False)
+
+                if journal is not None:
+                    # the spectra are journaled too, so that a resumed
+                    # job can copy them with the catalog
+                    sne_files = [os.path.join(full_out_dir, snOutFile)]
+                    spectra_dir = os.path.join(full_out_dir, 'Dynamic')
+                    if self.sn_sed_writer.archive:
+                        sne_files += self.sn_sed_writer.archive_files(spectra_dir)
+                    else:
+                        sne_files += sorted(os.path.join(spectra_dir, name)
+                                            for name in os.listdir(spectra_dir)
+                                            if name.startswith('specFileSN_'))
+                    journal.log_component('sne', sne_files,
+                                          time.time()-t_component)
 
             written_catalog_names.append(snOutFile)
 
-            if has_status_file:
-                with open(status_file, 'a') as out_file:
-                    duration =(time.time()-self.t_start)/3600.0
-                    out_file.write('%d wrote SNe catalog after %.3e hrs\n' %
-                                   (obsHistID, duration))
-
         make_instcat_header(self.star_db, obs_md,
                             os.path.join(full_out_dir, phosim_cat_name),
                             object_catalogs=written_catalog_names)
@@ -567,6 +670,20 @@ class InstanceCatalogWriter(object):
                                        (len(gal_lines), full_name))
             os.unlink(full_name)
 
+        if self.sensor_shards:
+            object_file_list = [os.path.join(full_out_dir, cat_name)
+                                for cat_name in written_catalog_names
+                                if os.path.exists(os.path.join(full_out_dir,
+                                                               cat_name))]
+            manifest_name \
+                = shard_instance_catalog(os.path.join(full_out_dir,
+                                                      phosim_cat_name),
+                                         object_file_list, obs_md,
+                                         os.path.join(full_out_dir, 'sensors'),
+                                         margin=self.shard_margin)
+            if journal is not None:
+                journal.log_event('sharded', manifest=manifest_name)
+
         # gzip the object files.
         gzip_process_list = []
         for orig_name in written_catalog_names:
@@ -584,31 +701,29 @@ class InstanceCatalogWriter(object):
         for p in gzip_process_list:
             p.wait()
 
-        if has_status_file:
-            with open(status_file, 'a') as out_file:
-                out_file.write("%d tarring\n" % obsHistID)
+        if journal is not None:
+            journal.log_event('tarring', path=tar_name)
         p = subprocess.Popen(args=['tar', '-C', out_dir,
                                    '-cf', tar_name, '%.8d' % obsHistID])
         p.wait()
         p = subprocess.Popen(args=['rm', '-rf', full_out_dir])
         p.wait()
 
-        if has_status_file:
-            with open(status_file, 'a') as out_file:
-                out_file.write("%d gzipping %s\n" % (obsHistID, tar_name))
+        if journal is not None:
+            journal.log_event('gzipping', path=tar_name)
         p = subprocess.Popen(args=['gzip', tar_name])
         p.wait()
 
-        if has_status_file:
-            with open(status_file, 'a') as out_file:
-                duration = (time.time()-self.t_start)/3600.0
-                out_file.write('%d all done -- took %.3e hrs\n' %
-                               (obsHistID, duration))
+        if getter_profile.enabled and status_dir is not None:
+            getter_profile.write(os.path.join(status_dir,
+                                              'getter_profile_%.8d.txt' % obsHistID))
+
+        if journal is not None:
+            journal.log_event('done', path=tar_name+'.gz',
+                              elapsed_hrs=(time.time()-self.t_start)/3600.0)
 
         print("all done with %d" % obsHistID)
-        if has_status_file:
-            return status_file
-        return None
+        return status_file
 
 def make_instcat_header(star_db, obs_md, outfile, object_catalogs=(),
                         nsnap=1, vistime=30., minsource=100):
@@ -655,8 +770,9 @@ def get_obs_md(obs_gen, obsHistID, fov=2, dither=True):
 
     Parameters
     ----------
-    obs_gen: lsst.sims.catUtils.utils.ObservationMetaDataGenerator
+    obs_gen: VisitTable or lsst.sims.catUtils.utils.ObservationMetaDataGenerator
         Object that reads the opsim db file and generates obs_md objects.
+        A VisitTable builds them from its in-memory columns.
     obsHistID: int
         The ID number of the desired visit.
     fov: float [2]
@@ -669,6 +785,12 @@ def get_obs_md(obs_gen, obsHistID, fov=2, dither=True):
     -------
     lsst.sims.utils.ObservationMetaData object
     """
+    if isinstance(obs_gen, VisitTable):
+        if obsHistID not in obs_gen:
+            print("There is no obsHistID == %d" % obsHistID)
+            return None
+        return obs_gen.obs_metadata(obsHistID, fov=fov, dither=dither)
+
     obs_md_list = obs_gen.getObservationMetaData(obsHistID=obsHistID,
                                                  boundType='circle',
                                                  boundLength=fov)
@@ -687,8 +809,10 @@ def get_obs_md(obs_gen, obsHistID, fov=2, dither=True):
         obs_md.OpsimMetaData['rotTelPos'] \
             = obs_md.OpsimMetaData['descDitheredRotTelPos']
         obs_md.rotSkyPos \
-            = np.degrees(_getRotSkyPos(obs_md._pointingRA, obs_md._pointingDec,
-                                       obs_md, obs_md.OpsimMetaData['rotTelPos']))
+            = np.degrees(_getRotSkyPosArray(obs_md._pointingRA, obs_md._pointingDec,
+                                            obs_md.mjd.TAI,
+                                            obs_md.OpsimMetaData['rotTelPos'],
+                                            site=obs_md.site)[0])
     return obs_md
 
 
@@ -789,3 +913,11 @@ class BrightStarCatalog(PhoSimCatalogPoint):
     def get_isBright(self):
         raw_norm = self.column_by_name('phoSimMagNorm')
         return np.where(raw_norm < self.min_mag, raw_norm, np.NaN)
+
+
+if getter_profile.enabled:
+    profile_getters(PhoSimDESCQA, DESCQACat_Bulge, DESCQACat_Disk,
+                    PhoSimDESCQA_AGN, DC2PhosimCatalogSN, TruthPhoSimDESCQA,
+                    MaskedPhoSimCatalogPoint, BrightStarCatalog)
+    if HAS_TWINKLES:
+        profile_getters(DESCQACat_Twinkles)
@@ -0,0 +1,251 @@
+"""
+Code to record the progress of InstanceCatalogWriter.write_catalog in an
+append-only JSON-lines journal and to validate/summarize that journal
+when resuming or monitoring a job.
+"""
+import os
+import json
+import time
+import hashlib
+import resource
+
+__all__ = ["JobJournal", "read_journal", "file_stats",
+           "validated_components", "summarize_journal"]
+
+
+def file_stats(file_name, block_size=1 << 20):
+    """
+    Scan a file and characterize its contents.
+
+    Parameters
+    ----------
+    file_name: str
+        The file to characterize
+    block_size: int
+        Number of bytes to read at a time
+
+    Returns
+    -------
+    A tuple (n_rows, n_bytes, checksum) where n_rows is the number
+    of newline characters in the file, n_bytes is the size of the
+    file and checksum is the hex md5 digest of its contents.
+    """
+    md5 = hashlib.md5()
+    n_rows = 0
+    n_bytes = 0
+    with open(file_name, 'rb') as in_file:
+        while True:
+            block = in_file.read(block_size)
+            if not block:
+                break
+            md5.update(block)
+            n_rows += block.count(b'\n')
+            n_bytes += len(block)
+    return n_rows, n_bytes, md5.hexdigest()
+
+
+def _peak_rss_mb():
+    """
+    Return the peak resident set size of this process in MB
+    (ru_maxrss is reported in kB on Linux)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+
+
+class JobJournal(object):
+    """
+    Append-only journal of the progress made writing the InstanceCatalog
+    for one obsHistID.  Each line of the journal is a json-ized dict.
+    Every dict carries the keys 'obsHistID', 'event' and 'time'.
+    Entries with event == 'wrote' describe one output file of a
+    completed component and also carry
+
+    component -- the name of the component (e.g. 'star', 'disk')
+    path -- the absolute path to the output file
+    relpath -- the path relative to root_dir (if a root_dir was given)
+    rows -- the number of lines in the output file
+    bytes -- the size of the output file
+    checksum -- the md5 hex digest of the output file
+    wall_time -- seconds spent generating the component
+    peak_rss_mb -- peak resident set size of the process in MB
+    written_at -- time stamp shared by all files of one component
+    """
+
+    def __init__(self, file_name, obsHistID, root_dir=None):
+        """
+        Parameters
+        ----------
+        file_name: str
+            Path to the journal file.  It will be appended to
+            if it already exists.
+        obsHistID: int
+            The visit whose progress is being recorded
+        root_dir: str [None]
+            The directory into which the visit is written.  The
+            path of each output file relative to it is journaled
+            so that a resumed job can recreate the layout elsewhere.
+        """
+        self.file_name = file_name
+        self.obsHistID = int(obsHistID)
+        self.root_dir = root_dir
+
+    def _append(self, entry):
+        with open(self.file_name, 'a') as out_file:
+            out_file.write(json.dumps(entry, default=str) + '\n')
+            out_file.flush()
+            os.fsync(out_file.fileno())
+
+    def log_event(self, event, **kwargs):
+        """
+        Append an entry of type event to the journal.  Any keyword
+        arguments are stored in the entry.
+        """
+        entry = {'obsHistID': self.obsHistID, 'event': event,
+                 'time': time.time()}
+        entry.update(kwargs)
+        self._append(entry)
+
+    def log_component(self, component, file_name_list, wall_time):
+        """
+        Record that a component has been completely written.
+
+        Parameters
+        ----------
+        component: str
+            The name of the component (e.g. 'star', 'disk')
+        file_name_list: list
+            The output files written for this component
+        wall_time: float
+            Seconds spent generating this component
+        """
+        written_at = time.time()
+        peak_rss = _peak_rss_mb()
+        for file_name in file_name_list:
+            path = os.path.abspath(file_name)
+            n_rows, n_bytes, checksum = file_stats(path)
+            entry = {'component': component, 'path': path,
+                     'rows': n_rows, 'bytes': n_bytes, 'checksum': checksum,
+                     'wall_time': wall_time, 'peak_rss_mb': peak_rss,
+                     'written_at': written_at}
+            if self.root_dir is not None:
+                entry['relpath'] = os.path.relpath(path, self.root_dir)
+            self.log_event('wrote', **entry)
+
+
+def read_journal(file_name):
+    """
+    Read a journal written by JobJournal.
+
+    Returns a list of dicts, one per entry.  A truncated final line
+    (e.g. left by a job that was killed mid-write) is ignored.
+    """
+    entries = []
+    with open(file_name, 'r') as in_file:
+        for line in in_file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def validated_components(file_name, verify_checksum=True):
+    """
+    Find the components recorded in a journal whose output files are
+    still on disk and unchanged.
+
+    Parameters
+    ----------
+    file_name: str
+        Path to the journal
+    verify_checksum: bool [True]
+        If False, only the existence and size of each file are checked
+
+    Returns
+    -------
+    A dict keyed on component name.  Values are lists of the
+    'wrote' entries for the most recent complete write of that
+    component.  Components with any missing or modified file are
+    omitted.
+    """
+    latest = {}
+    for entry in read_journal(file_name):
+        if entry.get('event') != 'wrote':
+            continue
+        component = entry['component']
+        if (component not in latest or
+            entry['written_at'] > latest[component][0]['written_at']):
+            latest[component] = [entry]
+        elif entry['written_at'] == latest[component][0]['written_at']:
+            latest[component].append(entry)
+
+    valid = {}
+    for component, entry_list in latest.items():
+        is_valid = True
+        for entry in entry_list:
+            path = entry['path']
+            if (not os.path.isfile(path) or
+                os.path.getsize(path) != entry['bytes']):
+                is_valid = False
+                break
+            if verify_checksum:
+                n_rows, n_bytes, checksum = file_stats(path)
+                if checksum != entry['checksum'] or n_rows != entry['rows']:
+                    is_valid = False
+                    break
+        if is_valid:
+            valid[component] = entry_list
+    return valid
+
+
+def summarize_journal(file_name):
+    """
+    Summarize the most recent run recorded in a journal.
+
+    Returns a dict with keys
+
+    obsHistID -- the visit
+    finished -- True if the run reached the 'done' event
+    components -- dict keyed on component name; values are dicts
+                  with 'rows', 'bytes', 'wall_time' and 'peak_rss_mb'
+    total_rows, total_bytes -- summed over components
+    wall_time -- seconds between the start and the last entry
+    peak_rss_mb -- largest peak RSS recorded
+    """
+    entries = read_journal(file_name)
+    i_start = 0
+    for i_entry, entry in enumerate(entries):
+        if entry.get('event') == 'start':
+            i_start = i_entry
+    entries = entries[i_start:]
+
+    summary = {'obsHistID': None, 'finished': False, 'components': {},
+               'total_rows': 0, 'total_bytes': 0, 'wall_time': 0.0,
+               'peak_rss_mb': 0.0}
+
+    if len(entries) == 0:
+        return summary
+
+    summary['obsHistID'] = entries[0].get('obsHistID')
+    summary['wall_time'] = entries[-1]['time'] - entries[0]['time']
+
+    for entry in entries:
+        if entry.get('event') == 'done':
+            summary['finished'] = True
+        if entry.get('event') != 'wrote':
+            continue
+        comp = summary['components'].setdefault(entry['component'],
+                                                {'rows': 0, 'bytes': 0,
+                                                 'wall_time': entry['wall_time'],
+                                                 'peak_rss_mb': entry['peak_rss_mb']})
+        comp['rows'] += entry['rows']
+        comp['bytes'] += entry['bytes']
+        summary['total_rows'] += entry['rows']
+        summary['total_bytes'] += entry['bytes']
+        summary['peak_rss_mb'] = max(summary['peak_rss_mb'],
+                                     entry['peak_rss_mb'])
+
+    return summary
@@ -0,0 +1,102 @@
+"""
+Code to keep the galaxy catalog loader within a resident set size budget
+by choosing how many rows of a healpixel to hold in memory at a time.
+"""
+import os
+import resource
+
+__all__ = ["current_rss_gb", "MemoryBudget"]
+
+
+def current_rss_gb():
+    """
+    Return the current resident set size of this process in GB.
+    Falls back on the peak resident set size where /proc is not
+    available.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as in_file:
+            n_pages = int(in_file.read().split()[1])
+        return n_pages*os.sysconf('SC_PAGE_SIZE')/1024.0**3
+    except (IOError, OSError, ValueError, IndexError):
+        # ru_maxrss is reported in kB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0**2
+
+
+class MemoryBudget(object):
+    """
+    Choose the number of catalog rows to load at a time so that the
+    process resident set size stays below max_rss_gb.
+
+    The number of rows is the memory left below headroom*max_rss_gb
+    divided by the size of a row times overhead (the InstanceCatalog
+    derives several columns from every loaded column).  Whenever the
+    resident set size is found above headroom*max_rss_gb after a
+    load, the largest allowed number of rows is halved, so repeated
+    dense healpixels shrink the chunking instead of running the node
+    out of memory.
+    """
+
+    def __init__(self, max_rss_gb, min_rows=10000, max_rows=2000000,
+                 headroom=0.8, overhead=4.0):
+        """
+        Parameters
+        ----------
+        max_rss_gb: float
+            The resident set size budget in GB
+        min_rows: int [10000]
+            The fewest rows ever loaded at a time
+        max_rows: int [2000000]
+            The most rows ever loaded at a time (the loader's
+            chunk size when no budget is given)
+        headroom: float [0.8]
+            The fraction of max_rss_gb the loader aims to use
+        overhead: float [4]
+            The ratio of the memory a row costs while the catalog
+            is written to the memory of its loaded columns
+        """
+        if max_rss_gb <= 0.0:
+            raise RuntimeError("max_rss_gb must be positive; you gave %e"
+                               % max_rss_gb)
+        self.max_rss_gb = max_rss_gb
+        self.min_rows = int(min_rows)
+        self.max_rows = int(max_rows)
+        self.headroom = headroom
+        self.overhead = overhead
+        self.row_cap = self.max_rows
+        self.n_shrinks = 0
+
+    def rss_gb(self):
+        """
+        The current resident set size of the process in GB
+        """
+        return current_rss_gb()
+
+    def loader_chunk_size(self, bytes_per_row):
+        """
+        Return the number of rows to load next.
+
+        Parameters
+        ----------
+        bytes_per_row: float
+            The summed item size of the columns being loaded
+        """
+        free_bytes = (self.headroom*self.max_rss_gb - self.rss_gb())*1024.0**3
+        n_rows = int(free_bytes/(max(bytes_per_row, 1.0)*self.overhead))
+        return max(self.min_rows, min(self.row_cap, n_rows))
+
+    def loaded(self, n_rows):
+        """
+        Report that n_rows were just loaded; shrinks the allowed
+        number of rows if the budget is being approached.
+
+        Returns True if the allowed number of rows was reduced.
+        """
+        if self.rss_gb() < self.headroom*self.max_rss_gb:
+            return False
+        new_cap = max(self.min_rows, min(self.row_cap, int(n_rows))//2)
+        if new_cap >= self.row_cap:
+            return False
+        self.row_cap = new_cap
+        self.n_shrinks += 1
+        return True
@@ -7,6 +7,7 @@ import sqlite3
 
 from desc.sims.GCRCatSimInterface import DESCQAObject
 from desc.sims.GCRCatSimInterface import deg2rad_double, arcsec2rad
+from desc.sims.GCRCatSimInterface import HtmRangePlan
 
 from lsst.sims.utils import angularSeparation
 from lsst.sims.catalogs.db import DBObject
@@ -276,25 +277,16 @@ class AGN_postprocessing_mixin(object):
 
         self._agn_query_results = {}
         self._cached_half_space = half_space
-        trixel_bounds = half_space.findAllTrixels(8)
-
-        where_clause = 'WHERE '
-        for i_bound, bound in enumerate(trixel_bounds):
-            if i_bound>0:
-                where_clause += 'OR '
-            if bound[0]==bound[1]:
-                where_clause += 'htmid_8 == %d ' % bound[0]
-            else:
-                where_clause += '(htmid_8 >= %d AND htmid_8 <= %d) ' % (bound[0], bound[1])
-
-        where_clause += 'ORDER BY galaxy_id'
+        htm_plan = HtmRangePlan(half_space, 8)
+
         query = 'SELECT galaxy_id, magNorm, varParamStr '
-        query += 'FROM agn_params '
-        query += where_clause
+        query += 'FROM %s ' % htm_plan.join('agn_params', 'htmid_8')
+        query += 'ORDER BY galaxy_id'
 
         with sqlite3.connect('file:%s?mode=ro' % self.agn_params_db,
                              uri=True) as conn:
             cursor = conn.cursor()
+            htm_plan.load(cursor)
             raw_results = np.array(cursor.execute(query).fetchall()).transpose()
 
         self._agn_query_results['galaxy_id'] = raw_results[0].astype(int)
@@ -0,0 +1,107 @@
+"""
+Array versions of lsst.sims.utils._getRotSkyPos and _getRotTelPos for
+converting between the sky and telescope rotator angles of many visits
+(each with its own pointing and date) at once.
+"""
+import numpy as np
+import palpy
+from lsst.sims.utils import ModifiedJulianDate, ObservationMetaData, Site
+from lsst.sims.utils import calcLmstLast, _observedFromICRS
+
+__all__ = ["_parallacticAngleArray", "_getRotSkyPosArray",
+           "_getRotTelPosArray"]
+
+
+def _parallacticAngleArray(ra, dec, mjd, site=None):
+    """
+    Parallactic angle of many pointings, as computed by
+    lsst.sims.utils._altAzPaFromRaDec (with refraction).
+
+    The dates are converted to UT1 (the expensive astropy step)
+    and the local sidereal times are computed for all pointings in one
+    vectorized call; only the conversion of each pointing to its
+    observed place is done visit by visit.
+
+    Parameters
+    ----------
+    ra, dec: numpy arrays
+        ICRS pointings in radians
+    mjd: numpy array
+        TAI MJDs of the pointings
+    site: lsst.sims.utils.Site [None]
+        The observatory (default: LSST)
+
+    Returns
+    -------
+    numpy array of parallactic angles in radians
+    """
+    ra = np.atleast_1d(np.asarray(ra, dtype=float))
+    dec = np.atleast_1d(np.asarray(dec, dtype=float))
+    mjd = np.atleast_1d(np.asarray(mjd, dtype=float))
+    if len(ra) != len(dec) or len(ra) != len(mjd):
+        raise RuntimeError("_parallacticAngleArray: ra, dec and mjd "
+                           "have lengths %d, %d, %d" % (len(ra), len(dec), len(mjd)))
+    if site is None:
+        site = Site(name='LSST')
+
+    mjd_list = ModifiedJulianDate.get_list(TAI=mjd)
+
+    ra_obs = np.zeros(len(ra), dtype=float)
+    dec_obs = np.zeros(len(ra), dtype=float)
+    for ii, mjd_obj in enumerate(mjd_list):
+        obs = ObservationMetaData(mjd=mjd_obj, site=site)
+        ra_obs[ii], dec_obs[ii] = _observedFromICRS(ra[ii], dec[ii],
+                                                    obs_metadata=obs,
+                                                    epoch=2000.0,
+                                                    includeRefraction=True)
+
+    ut1 = np.array([mjd_obj.UT1 for mjd_obj in mjd_list])
+    last = calcLmstLast(ut1, site.longitude_rad)[1]
+    ha = np.radians(last*15.0) - ra_obs
+    return palpy.paVector(ha, dec_obs, site.latitude_rad)
+
+
+def _getRotSkyPosArray(ra, dec, mjd, rotTel, site=None):
+    """
+    Array version of lsst.sims.utils._getRotSkyPos
+
+    Parameters
+    ----------
+    ra, dec: numpy arrays
+        ICRS pointings in radians
+    mjd: numpy array
+        TAI MJDs of the pointings
+    rotTel: numpy array
+        rotTelPos of the pointings in radians
+    site: lsst.sims.utils.Site [None]
+        The observatory (default: LSST)
+
+    Returns
+    -------
+    numpy array of rotSkyPos in radians
+    """
+    pa = _parallacticAngleArray(ra, dec, mjd, site=site)
+    return (np.asarray(rotTel, dtype=float) - pa) % (2.0*np.pi)
+
+
+def _getRotTelPosArray(ra, dec, mjd, rotSky, site=None):
+    """
+    Array version of lsst.sims.utils._getRotTelPos
+
+    Parameters
+    ----------
+    ra, dec: numpy arrays
+        ICRS pointings in radians
+    mjd: numpy array
+        TAI MJDs of the pointings
+    rotSky: numpy array
+        rotSkyPos of the pointings in radians
+    site: lsst.sims.utils.Site [None]
+        The observatory (default: LSST)
+
+    Returns
+    -------
+    numpy array of rotTelPos in radians
+    """
+    pa = _parallacticAngleArray(ra, dec, mjd, site=site)
+    return (np.asarray(rotSky, dtype=float) + pa) % (2.0*np.pi)
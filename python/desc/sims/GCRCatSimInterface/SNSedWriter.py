@@ -0,0 +1,284 @@
+"""
+Batched evaluation and writing of the rest-frame supernova spectra
+referenced by the SN InstanceCatalogs.  The SALT2 model of all the SNe
+in a catalog chunk is evaluated in one vectorized call on the
+wavelength grid SNObject.SNObjectSourceSED uses, and the spectra of a
+visit can be written into a single archive file (with an index of byte
+offsets) instead of one file per SN.
+"""
+import os
+import numbers
+import tempfile
+from collections import OrderedDict
+import numpy as np
+from lsst.sims.photUtils import Bandpass, Sed
+from lsst.sims.catUtils.supernovae import SNObject
+
+__all__ = ["SNSedWriter", "read_sn_sed_archive", "extract_sn_sed_archive"]
+
+
+def _salt2_flambda(source, wavelen, phase, x0, x1, c):
+    """
+    Evaluate the rest-frame SALT2 spectra of many SNe, as
+    SNObject.SNObjectSourceSED does for one.
+
+    Parameters
+    ----------
+    source: sncosmo.SALT2Source
+        The source of an SNObject (its parameters are overwritten)
+    wavelen: numpy array
+        Wavelength grid in nm
+    phase: numpy array
+        Rest-frame phases (days) of the SNe
+    x0, x1, c: numpy arrays
+        SALT2 parameters of the SNe
+
+    Returns
+    -------
+    flambda, an array of shape (len(phase), len(wavelen)) in
+    erg/cm^2/s/nm, and a boolean array marking the SNe whose
+    phase is within the range of the model (the others have no flux)
+    """
+    flambda = np.zeros((len(phase), len(wavelen)), dtype=float)
+    in_time = (phase > source.minphase()) & (phase < source.maxphase())
+    wave = wavelen*10.0
+    in_wave = (wave >= source.minwave()) & (wave <= source.maxwave())
+    if not in_time.any() or not in_wave.any():
+        return flambda, in_time
+
+    i_sn = np.where(in_time)[0]
+    i_sn = i_sn[np.argsort(phase[i_sn], kind='mergesort')]
+    wave = wave[in_wave]
+    # the SALT2 flux is x0*(M0 + x1*M1)*10**(-0.4*c*CL(wave));
+    # M0 and M0+M1 are the fluxes of the source with x0=1, c=0
+    # and x1=0 or 1, evaluated for all the phases at once
+    source.set(x0=1.0, x1=0.0, c=0.0)
+    m0 = source.flux(phase[i_sn], wave)
+    source.set(x1=1.0)
+    m1 = source.flux(phase[i_sn], wave) - m0
+    color_law = source.colorlaw(wave)
+    flux = (x0[i_sn, None]*(m0 + x1[i_sn, None]*m1)
+            *10.0**(-0.4*c[i_sn, None]*color_law[None, :]))
+
+    # erg/cm^2/s/Angstrom -> erg/cm^2/s/nm; negative model
+    # fluxes are set to zero, as SNObject does with rectifySED
+    flambda[np.ix_(i_sn, np.where(in_wave)[0])] = np.maximum(10.0*flux, 0.0)
+    return flambda, in_time
+
+
+class SNSedWriter(object):
+    """
+    Evaluate and write the rest-frame SED files and magNorms of the SNe
+    in a DC2PhosimCatalogSN.  The spectra and file names are those of
+    PhoSimCatalogSN.get_phosimVars (SNObject.SNObjectSourceSED written
+    to prefix + snid + '_' + mjd + '_' + band + '.dat').
+
+    Parameters
+    ----------
+    wavelen: numpy array [None]
+        The wavelength grid (in nm) of the spectra; by default the
+        native grid of the SALT2 model, as in SNObjectSourceSED
+    archive: bool [False]
+        If True, the spectra of a directory are appended to one
+        archive file (see read_sn_sed_archive) instead of being
+        written to individual files
+    """
+
+    archive_name = 'sn_sed_archive.dat'
+    index_name = 'sn_sed_archive.idx'
+
+    def __init__(self, wavelen=None, archive=False):
+        sn_obj = SNObject()
+        if wavelen is None:
+            sn_obj.set(t0=0.0, z=0.0, x0=1.0, x1=0.0, c=0.0)
+            wavelen = sn_obj.SNObjectSourceSED(time=0.0).wavelen
+        self.wavelen = np.asarray(wavelen, dtype=float)
+        self.archive = archive
+        self._source = sn_obj.source
+        self._init_mag_norm()
+
+    def _init_mag_norm(self):
+        """
+        Set up the linear map from flambda on self.wavelen to the flux in
+        the imsim bandpass, as computed by Sed.calcMag (which linearly
+        interpolates the SED onto the wavelength grid of the bandpass)
+        """
+        imsim_bp = Bandpass()
+        imsim_bp.imsimBandpass()
+        imsim_bp.sbTophi()
+        i_bp = np.where(imsim_bp.phi > 0.0)[0]
+        lam = imsim_bp.wavelen[i_bp]
+        i_hi = np.clip(np.searchsorted(self.wavelen, lam), 1, len(self.wavelen)-1)
+        self._mag_i_lo = i_hi-1
+        self._mag_i_hi = i_hi
+        self._mag_frac = ((lam - self.wavelen[i_hi-1])
+                          /(self.wavelen[i_hi] - self.wavelen[i_hi-1]))
+        # f_nu is proportional to f_lambda*lambda^2
+        self._mag_weight = imsim_bp.phi[i_bp]*lam**2
+        # normalize with the magnitude of a flat f_lambda
+        flat_sed = Sed(wavelen=self.wavelen, flambda=np.ones(len(self.wavelen)))
+        self._mag_flat = flat_sed.calcMag(imsim_bp)
+        self._flux_flat = self._mag_weight.sum()
+
+    def mag_norm(self, flambda):
+        """
+        Return the magnitudes in the imsim bandpass of the spectra in
+        flambda (shape (n_sne, len(self.wavelen))); NaN for no flux
+        """
+        flux = (flambda[:, self._mag_i_lo]*(1.0-self._mag_frac)
+                + flambda[:, self._mag_i_hi]*self._mag_frac).dot(self._mag_weight)
+        mag = np.full(len(flux), np.NaN)
+        valid = flux > 0.0
+        mag[valid] = self._mag_flat - 2.5*np.log10(flux[valid]/self._flux_flat)
+        return mag
+
+    def evaluate(self, mjd, t0, x0, x1, c, z):
+        """
+        Return the rest-frame spectra (shape (n_sne, len(self.wavelen)))
+        and magNorms of the SNe at TAI MJD mjd
+        """
+        params = [np.asarray(arr, dtype=float) for arr in (t0, x0, x1, c, z)]
+        flambda = np.zeros((len(params[0]), len(self.wavelen)), dtype=float)
+        mag_norm = np.full(len(params[0]), np.NaN)
+
+        valid = np.ones(len(params[0]), dtype=bool)
+        for arr in params:
+            valid &= np.isfinite(arr)
+        if not valid.any():
+            return flambda, mag_norm
+
+        t0, x0, x1, c, z = [arr[valid] for arr in params]
+        flambda[valid] = _salt2_flambda(self._source, self.wavelen,
+                                        (mjd - t0)/(1.0+z), x0, x1, c)[0]
+        mag_norm[valid] = self.mag_norm(flambda[valid])
+        return flambda, mag_norm
+
+    @staticmethod
+    def file_names(file_prefix, snid, mjd, band):
+        """
+        Return the names of the spectra of the SNe snid at TAI MJD mjd
+        in band, as PhoSimCatalogSN names them
+        """
+        suffix = '_%.4f_%s.dat' % (mjd, band)
+        return np.array([file_prefix +
+                         (str(int(sn)) if isinstance(sn, numbers.Number) else str(sn))
+                         + suffix for sn in snid], dtype=str)
+
+    def write(self, file_prefix, snid, mjd, band, t0, x0, x1, c, z,
+              write_files=True):
+        """
+        Evaluate and write the spectra of a chunk of SNe.
+
+        Parameters
+        ----------
+        file_prefix: str
+            The spectra are named as in file_names
+        snid: array
+            The SN ids
+        mjd: float
+            TAI MJD of the visit
+        band: str
+            The band of the visit
+        t0, x0, x1, c, z: numpy arrays
+            The SALT2 parameters and redshifts (NaN for SNe that
+            are not in the catalog)
+        write_files: bool [True]
+            If False, only compute the file names and magNorms
+
+        Returns
+        -------
+        The file names ('None' for SNe with no flux) and magNorms
+        """
+        flambda, mag_norm = self.evaluate(mjd, t0, x0, x1, c, z)
+        has_flux = np.isfinite(mag_norm)
+        file_names = np.where(has_flux,
+                              self.file_names(file_prefix, snid, mjd, band),
+                              'None')
+        if write_files and has_flux.any():
+            self._write_spectra(file_names[has_flux], flambda[has_flux])
+        return file_names, mag_norm
+
+    def archive_files(self, out_dir):
+        """
+        Return the paths of the archive and index files in out_dir
+        that exist
+        """
+        return [os.path.join(out_dir, name)
+                for name in (self.archive_name, self.index_name)
+                if os.path.exists(os.path.join(out_dir, name))]
+
+    def clear_archive(self, out_dir):
+        """
+        Delete the archive and index files in out_dir
+        """
+        for file_name in self.archive_files(out_dir):
+            os.unlink(file_name)
+
+    def _write_spectra(self, file_names, flambda):
+        if not self.archive:
+            for name, sed in zip(file_names, flambda):
+                Sed(wavelen=self.wavelen, flambda=sed).writeSED(name)
+            return
+
+        # each spectrum is written by Sed.writeSED to one scratch file
+        # and copied into the archive, so that the archived spectra are
+        # those that would have been written to individual files
+        out_dir = os.path.dirname(file_names[0])
+        scratch_fd, scratch_name = tempfile.mkstemp(dir=out_dir, suffix='.dat')
+        os.close(scratch_fd)
+        try:
+            with open(os.path.join(out_dir, self.archive_name), 'ab') as archive, \
+                 open(os.path.join(out_dir, self.index_name), 'a') as index:
+                archive.seek(0, os.SEEK_END)
+                offset = archive.tell()
+                for name, sed in zip(file_names, flambda):
+                    Sed(wavelen=self.wavelen, flambda=sed).writeSED(scratch_name)
+                    with open(scratch_name, 'rb') as in_file:
+                        data = in_file.read()
+                    archive.write(data)
+                    index.write('%s %d %d\n' % (os.path.basename(name), offset, len(data)))
+                    offset += len(data)
+        finally:
+            os.unlink(scratch_name)
+
+
+def read_sn_sed_archive(archive_dir, file_name=None):
+    """
+    Read the index of the SN spectra archive written by an SNSedWriter
+    into archive_dir.
+
+    If file_name (the base name of one spectrum) is given, return the
+    text of that spectrum; otherwise return a dict mapping the names of
+    the spectra to their (offset, number of bytes) in the archive.
+    """
+    index = OrderedDict()
+    with open(os.path.join(archive_dir, SNSedWriter.index_name), 'r') as in_file:
+        for line in in_file:
+            name, offset, n_bytes = line.split()
+            index[name] = (int(offset), int(n_bytes))
+    if file_name is None:
+        return index
+    if file_name not in index:
+        raise RuntimeError("%s is not in the SN spectra archive of %s"
+                           % (file_name, archive_dir))
+    offset, n_bytes = index[file_name]
+    with open(os.path.join(archive_dir, SNSedWriter.archive_name), 'rb') as in_file:
+        in_file.seek(offset)
+        return in_file.read(n_bytes).decode()
+
+
+def extract_sn_sed_archive(archive_dir, out_dir=None):
+    """
+    Write the spectra of the archive in archive_dir to individual files
+    in out_dir (default: archive_dir), the names referenced by the
+    InstanceCatalog.  Returns the number of files written.
+    """
+    if out_dir is None:
+        out_dir = archive_dir
+    index = read_sn_sed_archive(archive_dir)
+    with open(os.path.join(archive_dir, SNSedWriter.archive_name), 'rb') as in_file:
+        for name, (offset, n_bytes) in index.items():
+            in_file.seek(offset)
+            with open(os.path.join(out_dir, name), 'wb') as out_file:
+                out_file.write(in_file.read(n_bytes))
+    return len(index)
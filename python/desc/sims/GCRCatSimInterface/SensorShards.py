@@ -0,0 +1,266 @@
+"""
+Code to split the object catalogs of a visit into one InstanceCatalog
+per LSST sensor so that a sensor-level job (e.g. imSim) only has to
+read the objects that can land on its sensor.
+"""
+import os
+import json
+import numpy as np
+from lsst.afw.cameraGeom import DetectorType
+from lsst.sims.utils import angularSeparation
+from lsst.sims.utils import _observedFromAppGeo, _pupilCoordsFromObserved
+from lsst.sims.coordUtils import lsst_camera, getCornerPixels
+from lsst.sims.coordUtils import pixelCoordsFromRaDecLSST
+from lsst.sims.coordUtils import pixelCoordsFromPupilCoordsLSST
+from lsst.sims.coordUtils import raDecFromPixelCoordsLSST
+from lsst.sims.catUtils.mixins import PhoSimAstrometryBase
+
+__all__ = ["sensor_file_name", "detector_layout", "detector_centers",
+           "sensor_geometry", "assign_sensors", "shard_instance_catalog"]
+
+
+# LSST pixels are 0.2 arcsec on a side
+_pixel_deg = 0.2/3600.0
+
+# objects further than this (in degrees) from the pointing
+# cannot be on any detector
+_focal_plane_radius = 2.11
+
+# an LSST sensor is 4000 x 4072 pixels of 0.2 arcsec, so every point
+# on it is within 0.16 degrees of its center; the extra allows for the
+# difference between PhoSim and ICRS coordinates
+_sensor_radius = 0.175
+
+
+def sensor_file_name(sensor_name, obsHistID):
+    """
+    Convert a sensor name like 'R:2,2 S:1,1' into the name of its
+    InstanceCatalog, e.g. 'instcat_00000230_R22_S11.txt'
+    """
+    tag = sensor_name.replace(':', '').replace(',', '').replace(' ', '_')
+    return 'instcat_%.8d_%s.txt' % (obsHistID, tag)
+
+
+_layout_cache = {}
+
+
+def detector_layout(science_only=True):
+    """
+    Return the names of the LSST detectors (a numpy array) and their
+    pixel bounds (an array of shape (n_detectors, 4) holding x_min,
+    x_max, y_min, y_max).  The camera is read once per process.
+
+    Parameters
+    ----------
+    science_only: bool [True]
+        If True, only return the science sensors
+    """
+    if science_only not in _layout_cache:
+        camera = lsst_camera()
+        names = []
+        bounds = []
+        for det in camera:
+            if science_only and det.getType() != DetectorType.SCIENCE:
+                continue
+            name = det.getName()
+            corners = getCornerPixels(name, camera)
+            names.append(name)
+            bounds.append((min(cc[0] for cc in corners),
+                           max(cc[0] for cc in corners),
+                           min(cc[1] for cc in corners),
+                           max(cc[1] for cc in corners)))
+        _layout_cache[science_only] = (np.array(names), np.array(bounds))
+    return _layout_cache[science_only]
+
+
+def detector_centers(names, bounds, obs_md):
+    """
+    Return the RA and Dec (in degrees) of the centers of the detectors
+    described by detector_layout() during the visit obs_md
+    """
+    return raDecFromPixelCoordsLSST(0.5*(bounds[:, 0]+bounds[:, 1]),
+                                    0.5*(bounds[:, 2]+bounds[:, 3]),
+                                    names, obs_metadata=obs_md)
+
+
+def sensor_geometry(obs_md):
+    """
+    Return a list of tuples (name, (x_min, x_max, y_min, y_max),
+    center_ra, center_dec) describing the pixel bounds of each LSST
+    science sensor and the position (in degrees) of its center
+    during the visit obs_md.
+    """
+    names, bounds = detector_layout()
+    center_ra, center_dec = detector_centers(names, bounds, obs_md)
+    return [(name, tuple(bb), ra, dec)
+            for name, bb, ra, dec in zip(names, bounds, center_ra, center_dec)]
+
+
+def assign_sensors(ra, dec, obs_md, margin=0.0, phosim_coords=False,
+                   sensors=None):
+    """
+    Find the science sensors whose footprint (grown by margin)
+    contains each object.  An object near a sensor edge can be
+    assigned to more than one sensor.
+
+    Parameters
+    ----------
+    ra, dec: numpy arrays
+        The position of the objects in degrees
+    obs_md: ObservationMetaData
+        The visit
+    margin: float [0]
+        The number of pixels by which to grow each sensor
+    phosim_coords: bool [False]
+        If True, ra and dec are the raPhoSim, decPhoSim written to
+        InstanceCatalogs rather than ICRS coordinates
+    sensors: list [None]
+        The output of sensor_geometry(obs_md), if already computed
+
+    Returns
+    -------
+    A dict keyed on sensor name whose values are the indices of
+    the objects assigned to that sensor
+    """
+    margin_deg = margin*_pixel_deg
+
+    assignment = {}
+    if len(ra) == 0:
+        return assignment
+
+    # objects that cannot be on the focal plane at all
+    candidates = np.where(angularSeparation(ra, dec,
+                                            obs_md.pointingRA,
+                                            obs_md.pointingDec)
+                          < _focal_plane_radius + margin_deg)[0]
+    if len(candidates) == 0:
+        return assignment
+    ra = ra[candidates]
+    dec = dec[candidates]
+
+    if phosim_coords:
+        ra_app, dec_app = PhoSimAstrometryBase._appGeoFromPhoSim(np.radians(ra),
+                                                                np.radians(dec),
+                                                                obs_md)
+        ra_obs, dec_obs = _observedFromAppGeo(ra_app, dec_app,
+                                              obs_metadata=obs_md,
+                                              includeRefraction=False)
+        x_pupil, y_pupil = _pupilCoordsFromObserved(ra_obs, dec_obs, obs_md)
+
+    if sensors is None:
+        sensors = sensor_geometry(obs_md)
+
+    for name, (x_min, x_max, y_min, y_max), center_ra, center_dec in sensors:
+        near = np.where(angularSeparation(ra, dec, center_ra, center_dec)
+                        < _sensor_radius + margin_deg)[0]
+        if len(near) == 0:
+            continue
+
+        if phosim_coords:
+            xpix, ypix = pixelCoordsFromPupilCoordsLSST(x_pupil[near],
+                                                        y_pupil[near],
+                                                        chipName=[name]*len(near))
+        else:
+            xpix, ypix = pixelCoordsFromRaDecLSST(ra[near], dec[near],
+                                                  chipName=[name]*len(near),
+                                                  obs_metadata=obs_md)
+
+        # the bounds are the centers of the corner pixels; the
+        # sensor extends half a pixel beyond them
+        edge = margin + 0.5
+        on_sensor = np.where(np.logical_and(
+                             np.logical_and(xpix >= x_min - edge,
+                                            xpix <= x_max + edge),
+                             np.logical_and(ypix >= y_min - edge,
+                                            ypix <= y_max + edge)))[0]
+        if len(on_sensor) > 0:
+            assignment[name] = candidates[near[on_sensor]]
+
+    return assignment
+
+
+def shard_instance_catalog(header_name, object_file_list, obs_md, out_dir,
+                           margin=0.0, chunk_size=100000):
+    """
+    Write one InstanceCatalog per sensor containing the PhoSim
+    header and every object that falls on that sensor (see
+    assign_sensors).  A json manifest listing the sensors, their
+    catalogs and row counts is also written.
+
+    Parameters
+    ----------
+    header_name: str
+        The visit's PhoSim header file (made by make_instcat_header).
+        Its 'includeobj' lines are dropped from the sensor catalogs.
+    object_file_list: list
+        The object catalogs to split.  Each line must start
+        with 'object uniqueId raPhoSim decPhoSim'.
+    obs_md: ObservationMetaData
+        The visit
+    out_dir: str
+        The directory in which to write the sensor catalogs
+    margin: float [0]
+        The number of pixels by which to grow each sensor
+    chunk_size: int
+        The number of object lines to process at a time
+
+    Returns
+    -------
+    The name of the manifest file
+    """
+    obsHistID = obs_md.OpsimMetaData['obsHistID']
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(header_name, 'r') as in_file:
+        header = ''.join(line for line in in_file
+                         if not line.startswith('includeobj'))
+
+    sensors = sensor_geometry(obs_md)
+    handles = {}
+    counts = {}
+
+    def write_chunk(lines, component):
+        fields = [line.split(None, 4) for line in lines]
+        ra = np.array([float(ff[2]) for ff in fields])
+        dec = np.array([float(ff[3]) for ff in fields])
+        for name, dexes in assign_sensors(ra, dec, obs_md, margin=margin,
+                                          phosim_coords=True,
+                                          sensors=sensors).items():
+            if name not in handles:
+                handles[name] = open(os.path.join(out_dir,
+                                     sensor_file_name(name, obsHistID)), 'w')
+                handles[name].write(header)
+                counts[name] = {}
+            handles[name].writelines(lines[ii] for ii in dexes)
+            counts[name][component] = counts[name].get(component, 0) + len(dexes)
+
+    try:
+        for file_name in object_file_list:
+            component = os.path.basename(file_name)
+            lines = []
+            with open(file_name, 'r') as in_file:
+                for line in in_file:
+                    if not line.startswith('object'):
+                        continue
+                    lines.append(line)
+                    if len(lines) >= chunk_size:
+                        write_chunk(lines, component)
+                        lines = []
+            if len(lines) > 0:
+                write_chunk(lines, component)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    manifest = {'obsHistID': obsHistID, 'margin_pixels': margin,
+                'sensors': []}
+    for name in sorted(counts):
+        manifest['sensors'].append({'sensor': name,
+                                    'file': sensor_file_name(name, obsHistID),
+                                    'rows': sum(counts[name].values()),
+                                    'components': counts[name]})
+
+    manifest_name = os.path.join(out_dir, 'sensor_manifest_%.8d.json' % obsHistID)
+    with open(manifest_name, 'w') as out_file:
+        json.dump(manifest, out_file, indent=2)
+    return manifest_name
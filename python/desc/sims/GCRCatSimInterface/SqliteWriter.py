@@ -0,0 +1,228 @@
+"""
+Bulk loading of numpy columns into the sqlite files written by the
+truth catalog and database creation scripts.  The columns are converted
+to python values with one tolist() call each (rather than one int() or
+float() per value), rows are inserted in large transactions under
+PRAGMAs tuned for loading, and indexes are created after the tables
+are filled.
+"""
+import os
+import sqlite3
+import numpy as np
+
+__all__ = ["SqliteBulkWriter", "native_columns"]
+
+
+def native_columns(columns, n_rows=None):
+    """
+    Convert columns of data into lists of native python values.
+
+    Parameters
+    ----------
+    columns: list of columns
+        Each column is a numpy array, a list, or a scalar; scalars
+        are repeated for every row
+    n_rows: int [None]
+        The number of rows; if None, taken from the first
+        column that is not a scalar
+
+    Returns
+    -------
+    A list of lists of python values (one list per column)
+    """
+    if n_rows is None:
+        for col in columns:
+            if np.ndim(col) > 0:
+                n_rows = len(col)
+                break
+        else:
+            n_rows = 1
+
+    native = []
+    for col in columns:
+        if np.ndim(col) == 0:
+            if isinstance(col, np.generic):
+                col = col.item()
+            native.append([col]*n_rows)
+            continue
+        if len(col) != n_rows:
+            raise RuntimeError("column has %d rows; expected %d"
+                               % (len(col), n_rows))
+        native.append(np.asarray(col).tolist())
+    return native
+
+
+class SqliteBulkWriter(object):
+    """
+    Load columns of data into a sqlite file.
+
+    Parameters
+    ----------
+    file_name: str
+        The sqlite file to write
+    transaction_rows: int [1000000]
+        Commit after at least this many rows have been inserted
+    page_size: int [65536]
+        The page size in bytes (only applied to a new file)
+    cache_mb: int [512]
+        The size of sqlite's page cache in MB
+    synchronous: str ['NORMAL']
+        The synchronous PRAGMA (use 'OFF' for files that are
+        rebuilt from scratch if the load fails)
+
+    The writer is a context manager; the deferred indexes are built
+    and the file is returned to the rollback journal when it is closed.
+    If the block raises, a file the writer created is deleted.  The
+    load into a file that already existed is not atomic: the open
+    transaction is rolled back, but the rows of earlier transactions
+    are kept (without the deferred indexes).
+    """
+
+    def __init__(self, file_name, transaction_rows=1000000,
+                 page_size=65536, cache_mb=512, synchronous='NORMAL'):
+        self.file_name = file_name
+        self.transaction_rows = transaction_rows
+        self._created = not os.path.exists(file_name)
+        self.connection = sqlite3.connect(file_name)
+        self.cursor = self.connection.cursor()
+        self._indexes = []
+        self._analyze = False
+        self._pending_rows = 0
+        self._n_columns = {}
+
+        # page_size must be set before WAL mode is entered
+        self.cursor.execute('PRAGMA page_size=%d' % page_size)
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=%s' % synchronous)
+        self.cursor.execute('PRAGMA cache_size=%d' % (-1024*cache_mb))
+        self.cursor.execute('PRAGMA temp_store=MEMORY')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def create_table(self, table, columns):
+        """
+        Create a table.
+
+        Parameters
+        ----------
+        table: str
+            The name of the table
+        columns: list of (name, sqlite type) tuples
+        """
+        cmd = 'CREATE TABLE %s (%s)' % (table, ', '.join('%s %s' % cc
+                                                         for cc in columns))
+        self.cursor.execute(cmd)
+        self.connection.commit()
+        self._n_columns[table] = len(columns)
+
+    def add_index(self, name, table, columns, analyze=False):
+        """
+        Declare an index to be created when the writer is closed.
+
+        Parameters
+        ----------
+        name: str
+            The name of the index
+        table: str
+            The table being indexed
+        columns: list of str
+            The indexed columns
+        analyze: bool [False]
+            If True, run ANALYZE after building the indexes so that
+            sqlite can choose between them
+        """
+        self._indexes.append('CREATE INDEX %s ON %s (%s)'
+                             % (name, table, ', '.join(columns)))
+        self._analyze = self._analyze or analyze
+
+    def insert(self, table, columns):
+        """
+        Insert rows into a table.
+
+        Parameters
+        ----------
+        table: str
+            The name of the table
+        columns: a list of columns or a dict of columns
+            The columns in the order of the table's columns (a dict
+            is read in its insertion order).  See native_columns
+            for what a column can be.
+
+        Returns
+        -------
+        The number of rows inserted
+        """
+        if isinstance(columns, dict):
+            columns = list(columns.values())
+        if table in self._n_columns and len(columns) != self._n_columns[table]:
+            raise RuntimeError("%s has %d columns; got %d"
+                               % (table, self._n_columns[table], len(columns)))
+
+        native = native_columns(columns)
+        n_rows = len(native[0])
+        if n_rows == 0:
+            return 0
+
+        cmd = 'INSERT INTO %s VALUES (%s)' % (table, ','.join(['?']*len(native)))
+        self.cursor.executemany(cmd, zip(*native))
+        self._pending_rows += n_rows
+        if self._pending_rows >= self.transaction_rows:
+            self.commit()
+        return n_rows
+
+    def commit(self):
+        """
+        Commit the current transaction
+        """
+        self.connection.commit()
+        self._pending_rows = 0
+
+    def abort(self):
+        """
+        Roll back the open transaction and close the file without
+        building the deferred indexes.  The file is deleted if the
+        writer created it.
+        """
+        self.connection.rollback()
+        self._indexes = []
+        if self._created:
+            self._disconnect()
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(self.file_name + suffix):
+                    os.unlink(self.file_name + suffix)
+            return
+        self.cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.cursor.execute('PRAGMA journal_mode=DELETE')
+        self._disconnect()
+
+    def close(self):
+        """
+        Build the deferred indexes and close the file
+        """
+        self.commit()
+        for cmd in self._indexes:
+            self.cursor.execute(cmd)
+        if self._analyze:
+            self.cursor.execute('ANALYZE')
+        self.commit()
+        self._indexes = []
+        self.cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.cursor.execute('PRAGMA journal_mode=DELETE')
+        self._disconnect()
+
+    def _disconnect(self):
+        """
+        Close the cursor and the connection.  The cursor's last
+        statement would otherwise keep the file open (and locked)
+        until the writer is garbage collected.
+        """
+        self.cursor.close()
+        self.connection.close()
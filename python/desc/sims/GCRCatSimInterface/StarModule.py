@@ -1,9 +1,9 @@
 import numpy as np
-from sqlalchemy import text
 from lsst.sims.utils import htmModule as htm
 from lsst.sims.catalogs.db import CatalogDBObject
 from lsst.sims.catalogs.db import ChunkIterator
 from lsst.sims.utils import _angularSeparation
+from . import HtmRangePlan
 
 __all__ = ["DC2StarObj"]
 
@@ -17,6 +17,9 @@ class DC2StarObj(CatalogDBObject):
     raColKey = 'ra'
     decColKey = 'decl'
 
+    # the maximum number of htmid intervals in a query (see HtmRangePlan)
+    max_htm_ranges = 32
+
     columns = [('id', 'simobjid', int),
                ('raJ2000', 'ra*PI()/180.'),
                ('decJ2000', 'decl*PI()/180.'),
@@ -51,19 +54,10 @@ class DC2StarObj(CatalogDBObject):
                                             obs_metadata.pointingDec,
                                             obs_metadata.boundLength)
 
-        htmid_bounds = half_space.findAllTrixels(6)
-        htmid_clause = '('
-        for bound in htmid_bounds:
-            if htmid_clause != '(':
-                htmid_clause += ' OR'
-            if bound[0] == bound[1]:
-                htmid_clause += '(htmid_6 == %d)' % bound[0]
-            else:
-                htmid_clause += '(htmid_6 <= %d AND htmid_6 >= %d)'  % (bound[1], bound[0])
-
-        htmid_clause += ')'
-
-        query = query.filter(text(htmid_clause))
+        # _final_pass removes the stars from the extra trixels of a
+        # coarsened plan
+        htm_plan = HtmRangePlan(half_space, 6, max_ranges=self.max_htm_ranges)
+        query = query.filter(htm_plan.sql_filter('htmid_6'))
 
         return ChunkIterator(self, query, chunk_size)
 
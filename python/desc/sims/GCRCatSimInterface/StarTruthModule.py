@@ -2,7 +2,6 @@ import os
 import healpy as hp
 import numpy as np
 import multiprocessing as mp
-import sqlite3
 
 import time
 
@@ -12,20 +11,19 @@ from lsst.sims.utils import defaultSpecMap
 from lsst.sims.photUtils import BandpassDict
 from lsst.sims.photUtils import Sed, getImsimFluxNorm
 from lsst.sims.catUtils.baseCatalogModels import StarObj
+from . import SqliteBulkWriter
 
 
 __all__ = ["write_stars_to_truth"]
 
 
-def write_results(conn, cursor, mag_dict, position_dict):
+def write_results(writer, mag_dict, position_dict):
     """
     Write star truth results to the truth table
 
     Parameters
     ----------
-    conn is a sqlite3 connection to the database
-
-    cursor is a sqlite3.conneciton.cursor() object
+    writer is the SqliteBulkWriter of the output database
 
     mag_dict is a dict of mags.  It is keyed on the pid of the
     Process used to process a chunk of magnitudes.  Each value
@@ -55,16 +53,9 @@ def write_results(conn, cursor, mag_dict, position_dict):
         if len(mm) != len(pp['ra']):
             raise RuntimeError('%d mm %d pp' % (len(mm), len(pp['ra'])))
 
-        values = ((int(pp['healpix'][i_obj]),
-                   int(pp['id'][i_obj]), 1, 0, 0,
-                   pp['ra'][i_obj], pp['dec'][i_obj], 0.0,
-                   mm[i_obj][0], mm[i_obj][1], mm[i_obj][2],
-                   mm[i_obj][3], mm[i_obj][4], mm[i_obj][5])
-                  for i_obj in range(len(pp['ra'])))
-
-        cursor.executemany('''INSERT INTO truth
-                           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', values)
-        conn.commit()
+        writer.insert('truth', [pp['healpix'], pp['id'], 1, 0, 0,
+                                pp['ra'], pp['dec'], 0.0]
+                               + [mm[:, i_bp] for i_bp in range(6)])
 
     return row_ct
 
@@ -154,8 +145,7 @@ def write_stars_to_truth(output=None,
     row_ct = 0
     iteration = 0
 
-    with sqlite3.connect(output) as out_conn:
-        out_cursor = out_conn.cursor()
+    with SqliteBulkWriter(output) as writer:
 
         data_iter = db.query_columns(colnames=['simobjid', 'sedFilename',
                                                'magNorm', 'ra', 'decl'],
@@ -187,8 +177,8 @@ def write_stars_to_truth(output=None,
             if len(p_list) >= n_procs:
                 for p in p_list:
                     p.join()
-                row_ct += write_results(out_conn, out_cursor,
-                                        mag_dict, position_dict)
+                row_ct += write_results(writer, mag_dict,
+                                        position_dict)
                 p_list = []
                 position_dict = {}
                 mag_dict = mgr.dict()
@@ -201,5 +191,4 @@ def write_stars_to_truth(output=None,
         if len(p_list) > 0:
             for p in p_list:
                 p.join()
-            write_results(out_conn, out_cursor,
-                          mag_dict, position_dict)
+            write_results(writer, mag_dict, position_dict)
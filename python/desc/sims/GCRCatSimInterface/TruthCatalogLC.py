@@ -1,77 +1,159 @@
 import os
 import numpy as np
 import shutil
-import sqlite3
 import json
 import multiprocessing
 import time
 from lsst.sims.utils import ObservationMetaData
-from lsst.sims.utils import angularSeparation
-from lsst.sims.coordUtils import chipNameFromRaDecLSST
 from lsst.sims.catalogs.db import DBObject
 from lsst.sims.catUtils.mixins import ExtraGalacticVariabilityModels
 from lsst.sims.photUtils import BandpassDict, Sed, getImsimFluxNorm
 from lsst.sims.catUtils.supernovae import SNObject
 from desc.twinkles import TimeDelayVariability
 from . import get_pointing_htmid
+from . import ChipAssigner
+from . import SqliteBulkWriter
 
 __all__ = ["write_sprinkled_lc"]
 
 
+# state of the SneSimulator pool workers, set by _init_sn_worker
+_sn_worker = {}
+
+
+def _band_weights(bp_dict):
+    """
+    Return a dict keyed on filter index (u=0 ... y=5) of the wavelength
+    grid (nm) of each bandpass and the weights w such that
+    Sed.calcFlux(bandpass) == (flambda*w).sum() for an SED sampled on
+    that grid
+    """
+    weights = {}
+    for i_filter, name in enumerate('ugrizy'):
+        bp = bp_dict[name]
+        if bp.phi is None:
+            bp.sbTophi()
+        fnu_per_flambda = Sed().flambdaTofnu(wavelen=bp.wavelen,
+                                             flambda=np.ones(len(bp.wavelen)))[1]
+        d_wavelen = bp.wavelen[1] - bp.wavelen[0]
+        weights[i_filter] = (bp.wavelen, fnu_per_flambda*bp.phi*d_wavelen)
+    return weights
+
+
+def _sn_light_curve(sn_obj, mjd_arr, filter_arr, band_weights, out_mags):
+    """
+    Compute the magnitudes (without Milky Way extinction) of one SN at
+    all of the times in mjd_arr (observed in the filters filter_arr) as
+    SNObject.SNObjectSED(mjd, bandpass=bp, applyExtinction=False) and
+    Sed.calcFlux would, evaluating the SN model once per filter for all
+    the times in that filter.  The magnitudes are written into out_mags;
+    times with no flux are left untouched.
+    """
+    in_time = (mjd_arr >= sn_obj.mintime()) & (mjd_arr <= sn_obj.maxtime())
+    for i_filter in np.unique(filter_arr[in_time]):
+        i_time = np.where(in_time & (filter_arr == i_filter))[0]
+        wavelen, weights = band_weights[i_filter]
+        in_wave = ((wavelen >= sn_obj.minwave()/10.0) &
+                   (wavelen <= sn_obj.maxwave()/10.0))
+        if not in_wave.any():
+            continue
+        # erg/cm^2/s/Angstrom -> erg/cm^2/s/nm
+        flambda = 10.0*sn_obj.flux(time=mjd_arr[i_time],
+                                   wave=wavelen[in_wave]*10.0)
+        flux = np.dot(flambda, weights[in_wave])
+        valid = flux > 1.0e-300
+        out_mags[i_time[valid]] = Sed().magFromFlux(flux[valid])
+
+
+def _init_sn_worker(bp_dict, mag_buffer):
+    """
+    Initialize a SneSimulator pool worker with the bandpass weights
+    and the shared output array
+    """
+    _sn_worker['band_weights'] = _band_weights(bp_dict)
+    _sn_worker['mag_buffer'] = mag_buffer
+
+
+def _sn_worker_batch(args):
+    """
+    Compute the light curves of a batch of SNe in a SneSimulator pool
+    worker, writing them into rows i_start onwards of the shared
+    (n_sne, n_times) output array
+    """
+    i_start, sn_truth_params, mjd_arr, filter_arr = args
+    mags = np.frombuffer(_sn_worker['mag_buffer'], dtype=float)
+    mags = mags[i_start*len(mjd_arr):
+                (i_start+len(sn_truth_params))*len(mjd_arr)].reshape(-1, len(mjd_arr))
+    mags[:] = np.NaN
+    for i_obj, sn_par in enumerate(sn_truth_params):
+        sn_obj = SNObject.fromSNState(json.loads(sn_par))
+        _sn_light_curve(sn_obj, mjd_arr, filter_arr,
+                        _sn_worker['band_weights'], mags[i_obj])
+    return len(sn_truth_params)
+
+
 class SneSimulator(object):
     """
     A class to enable the simulation of SNe photometry.
     See the method calculate_sn_magnitudes() for details.
+
+    The light curves are computed by a pool of n_processes worker
+    processes, started at the first call and kept until close()
+    is called.  The workers write the magnitudes into a shared
+    array, which is grown (and the pool restarted) when a call
+    needs more room.
     """
 
-    def __init__(self, bp_dict):
+    def __init__(self, bp_dict, n_processes=12, batch_size=12):
         """
         bp_dict is a BandpassDict containing the filters in which
         we will want to compute the supernovae's photometry
-        """
-        self._bp_dict = bp_dict
-
-    def _calculate_batch_of_sn(self, sn_truth_params, mjd_arr, filter_arr,
-                               out_dict, tag):
-        """
-        For processing SNe in batches using multiprocessing
-
-        -----
-        sn_truth_params is a numpy array of json-ized
-        dicts defining the state of an SNObject
-
-        mjd_arr is a numpy array of the TAI times of
-        observations
-
-        filter_arr is a numpy array of ints indicating
-        the filter being observed at each time
 
-        out_dict is a multprocessing.Manager().dict() to store
-        the results
+        n_processes is the number of worker processes (1 computes
+        the magnitudes in the calling process)
 
-        tag is an integer denoting which batch of SNe this is.
+        batch_size is the number of SNe handed to a worker at a time
         """
+        self._bp_dict = bp_dict
+        self._n_processes = n_processes
+        self._batch_size = batch_size
+        self._pool = None
+        self._mag_buffer = None
+        self._band_weights = None
 
-        int_to_filter = 'ugrizy'
+    def __enter__(self):
+        return self
 
-        mags = np.NaN*np.ones((len(sn_truth_params), len(mjd_arr)), dtype=float)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
 
-        for i_obj, sn_par in enumerate(sn_truth_params):
-            sn_obj = SNObject.fromSNState(json.loads(sn_par))
-            for i_time in range(len(mjd_arr)):
-                mjd = mjd_arr[i_time]
-                filter_name = int_to_filter[filter_arr[i_time]]
-                if mjd < sn_obj.mintime() or mjd > sn_obj.maxtime():
-                    continue
-                bp = self._bp_dict[filter_name]
-                sn_sed = sn_obj.SNObjectSED(mjd, bandpass=bp,
-                                            applyExtinction=False)
-                ff = sn_sed.calcFlux(bp)
-                if ff>1.0e-300:
-                    mm = sn_sed.magFromFlux(ff)
-                    mags[i_obj][i_time] = mm
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
+        self._mag_buffer = None
 
-        out_dict[tag] = mags
+    def _start_pool(self, n_values):
+        """
+        Make sure the pool is running with a shared array of at
+        least n_values floats
+        """
+        if self._mag_buffer is not None and len(self._mag_buffer) >= n_values:
+            return
+        capacity = n_values
+        if self._mag_buffer is not None:
+            capacity = max(n_values, 2*len(self._mag_buffer))
+        self.close()
+        self._mag_buffer = multiprocessing.RawArray('d', capacity)
+        self._pool = multiprocessing.Pool(self._n_processes,
+                                          initializer=_init_sn_worker,
+                                          initargs=(self._bp_dict,
+                                                    self._mag_buffer))
 
     def calculate_sn_magnitudes(self, sn_truth_params, mjd_arr, filter_arr):
         """
@@ -83,33 +165,35 @@ class SneSimulator(object):
 
         filter_arr is a numpy array of ints indicating
         the filter being observed at each time
+
+        Returns a numpy array of shape (len(sn_truth_params), len(mjd_arr))
+        of magnitudes (NaN where the SN has no flux)
         """
-        n_threads = 12
-        d_sne = max(12, len(sn_truth_params)//(n_threads-1))
-        p_list = []
-        mgr = multiprocessing.Manager()
-        out_dict = mgr.dict()
-        for i_start in range(0, len(sn_truth_params), d_sne):
-            i_end = i_start+d_sne
-            selection = slice(i_start, i_end)
-            p = multiprocessing.Process(target=self._calculate_batch_of_sn,
-                                        args=(sn_truth_params[selection],
-                                              mjd_arr, filter_arr,
-                                              out_dict, i_start))
-
-            p.start()
-            p_list.append(p)
-
-        for p in p_list:
-            p.join()
-
-        mags = np.NaN*np.ones((len(sn_truth_params), len(mjd_arr)), dtype=float)
-        for i_start in range(0, len(sn_truth_params), d_sne):
-            i_end = i_start + d_sne
-            selection = slice(i_start, i_end)
-            mags[selection] = out_dict[i_start]
-
-        return mags
+        mjd_arr = np.asarray(mjd_arr, dtype=float)
+        filter_arr = np.asarray(filter_arr, dtype=int)
+        n_sne = len(sn_truth_params)
+
+        if self._n_processes <= 1:
+            if self._band_weights is None:
+                self._band_weights = _band_weights(self._bp_dict)
+            mags = np.NaN*np.ones((n_sne, len(mjd_arr)), dtype=float)
+            for i_obj, sn_par in enumerate(sn_truth_params):
+                sn_obj = SNObject.fromSNState(json.loads(sn_par))
+                _sn_light_curve(sn_obj, mjd_arr, filter_arr,
+                                self._band_weights, mags[i_obj])
+            return mags
+
+        if n_sne == 0 or len(mjd_arr) == 0:
+            return np.NaN*np.ones((n_sne, len(mjd_arr)), dtype=float)
+
+        self._start_pool(n_sne*len(mjd_arr))
+        tasks = [(i_start, sn_truth_params[i_start:i_start+self._batch_size],
+                  mjd_arr, filter_arr)
+                 for i_start in range(0, n_sne, self._batch_size)]
+        self._pool.map(_sn_worker_batch, tasks)
+
+        mags = np.frombuffer(self._mag_buffer, dtype=float)
+        return mags[:n_sne*len(mjd_arr)].reshape(n_sne, len(mjd_arr)).copy()
 
 
 class AgnSimulator(ExtraGalacticVariabilityModels, TimeDelayVariability):
@@ -138,41 +222,93 @@ class AgnSimulator(ExtraGalacticVariabilityModels, TimeDelayVariability):
         return self._redshift_arr
 
 
-def create_sprinkled_sql_file(sql_name):
-    with sqlite3.connect(sql_name) as conn:
-        cursor = conn.cursor()
-        cmd = '''CREATE TABLE light_curves '''
-        cmd += '''(uniqueId int,
-                   obshistid int, mag float)'''
-        cursor.execute(cmd)
+def create_sprinkled_sql_file(writer):
+    """
+    Create the tables of the light curve database with the
+    SqliteBulkWriter writer; the indexes are built when the
+    writer is closed
+    """
+    writer.create_table('light_curves', [('uniqueId', 'int'),
+                                         ('obshistid', 'int'),
+                                         ('mag', 'float')])
 
-        cmd = '''CREATE TABLE obs_metadata '''
-        cmd += '''(obshistid int, mjd float, filter int)'''
-        cursor.execute(cmd)
+    writer.create_table('obs_metadata', [('obshistid', 'int'),
+                                         ('mjd', 'float'),
+                                         ('filter', 'int')])
 
-        cmd = '''CREATE TABLE variables_and_transients '''
-        cmd += '''(uniqueId int, galaxy_id int,
-                   ra float, dec float, sprinkled int,
-                   agn int, sn int)'''
-        cursor.execute(cmd)
+    writer.create_table('variables_and_transients', [('uniqueId', 'int'),
+                                                     ('galaxy_id', 'int'),
+                                                     ('ra', 'float'),
+                                                     ('dec', 'float'),
+                                                     ('sprinkled', 'int'),
+                                                     ('agn', 'int'),
+                                                     ('sn', 'int')])
 
-        conn.commit()
+    writer.add_index('obs_filter', 'obs_metadata', ['obshistid', 'filter'])
+    writer.add_index('unq_obs', 'light_curves', ['uniqueId', 'obshistid'])
 
 
-def _actually_on_chip(ra, dec, obs_md):
+def _actually_on_chip(ra, dec, obs_md, chip_assigner=None,
+                      object_id=None, obsHistID=None):
     """
     Take a numpy array of RA in degrees, a numpy array of Decin degrees
     and an ObservationMetaData and return a boolean array indicating
     which of the objects are actually on a chip and which are not
+
+    chip_assigner is an optional ChipAssigner to use; if object_id
+    and obsHistID are given, it caches the results under them
     """
-    out_arr = np.array([False]*len(ra))
-    d_ang = 2.11
-    good_radii = np.where(angularSeparation(ra, dec, obs_md.pointingRA, obs_md.pointingDec)<d_ang)
-    if len(good_radii[0]) > 0:
-        chip_names = chipNameFromRaDecLSST(ra[good_radii], dec[good_radii], obs_metadata=obs_md).astype(str)
-        vals = np.where(np.char.find(chip_names, 'None')==0, False, True)
-        out_arr[good_radii] = vals
-    return out_arr
+    if chip_assigner is None:
+        chip_assigner = ChipAssigner(cache=False)
+    if object_id is None:
+        obsHistID = None
+    return chip_assigner.on_chip(object_id, ra, dec, obs_md,
+                                 obsHistID=obsHistID)
+
+
+def _pointings_by_htmid(htmid_dict, htmid_list):
+    """
+    Find the pointings overlapping each trixel in htmid_list.
+
+    htmid_dict maps obsHistID to the list of [min, max] htmid bounds
+    of the trixels covered by the pointing (see get_pointing_htmid).
+
+    Returns an array of the obsHistIDs (in the order of htmid_dict),
+    and CSR pointer and index arrays such that the pointings overlapping
+    htmid_list[i] are obsHistIDs[visits[ptr[i]:ptr[i+1]]], sorted in the
+    order of htmid_dict.
+    """
+    obs_list = np.array(list(htmid_dict.keys()))
+    htmid_list = np.asarray(htmid_list, dtype=np.int64)
+    bounds_lo = []
+    bounds_hi = []
+    bounds_visit = []
+    for i_obs, obshistid in enumerate(htmid_dict):
+        for bounds in htmid_dict[obshistid]:
+            bounds_lo.append(bounds[0])
+            bounds_hi.append(bounds[1])
+            bounds_visit.append(i_obs)
+
+    # each bound covers a contiguous run of the sorted htmids
+    order = np.argsort(htmid_list, kind='mergesort')
+    sorted_htmid = htmid_list[order]
+    i_first = np.searchsorted(sorted_htmid, np.array(bounds_lo, dtype=np.int64),
+                              side='left')
+    i_last = np.searchsorted(sorted_htmid, np.array(bounds_hi, dtype=np.int64),
+                             side='right')
+    n_covered = np.maximum(i_last-i_first, 0)
+    n_pairs = n_covered.sum()
+    offset = np.arange(n_pairs) - np.repeat(np.cumsum(n_covered)-n_covered, n_covered)
+    pair_htmid = order[np.repeat(i_first, n_covered) + offset]
+    pair_visit = np.repeat(np.array(bounds_visit, dtype=np.int64), n_covered)
+
+    # a pointing is listed once per trixel even if several bounds cover it
+    pair_key = np.unique(pair_htmid*max(1, len(obs_list)) + pair_visit)
+    pair_htmid = pair_key//max(1, len(obs_list))
+    visits = pair_key % max(1, len(obs_list))
+    ptr = np.zeros(len(htmid_list)+1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(pair_htmid, minlength=len(htmid_list)))
+    return obs_list, ptr, visits
 
 
 def write_sprinkled_lc(out_file_name, total_obs_md,
@@ -181,7 +317,10 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
                        dec_colname='descDitheredDec',
                        rottel_colname = 'descDitheredRotTelPos',
                        sql_file_name=None,
-                       bp_dict=None):
+                       bp_dict=None,
+                       visit_index=None,
+                       sn_processes=12,
+                       chip_assigner=None):
 
     """
     Create database of light curves
@@ -218,6 +357,16 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
 
     bp_dict is a BandpassDict of the telescope filters to be used
 
+    visit_index is an optional VisitIndex (see build_visit_index) from
+    which to take the trixels covered by each pointing
+
+    sn_processes is the number of processes simulating the supernova
+    light curves (see SneSimulator)
+
+    chip_assigner is an optional ChipAssigner with which to find the
+    objects that land on a detector; pass one with cache=True that is
+    shared with later passes over these objects to reuse its results
+
     Returns
     -------
     None
@@ -250,75 +399,84 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
         raise RuntimeError('%s does not exist' % sql_file_name)
 
 
-    sn_simulator = SneSimulator(bp_dict)
+    if chip_assigner is None:
+        # each (object, visit) is only looked up once in this pass
+        chip_assigner = ChipAssigner(cache=False)
     sed_dir = os.environ['SIMS_SED_LIBRARY_DIR']
 
-    create_sprinkled_sql_file(out_file_name)
+    with SneSimulator(bp_dict, n_processes=sn_processes) as sn_simulator, \
+            SqliteBulkWriter(out_file_name) as writer:
+        create_sprinkled_sql_file(writer)
+
+        t_start = time.time()
 
-    t_start = time.time()
+        # get data about the pointings being simulated
+        (htmid_dict,
+         mjd_dict,
+         filter_dict,
+         obsmd_dict) = get_pointing_htmid(pointing_dir, opsim_db_name,
+                                          ra_colname=ra_colname,
+                                          dec_colname=dec_colname,
+                                          visit_index=visit_index)
 
-    # get data about the pointings being simulated
-    (htmid_dict,
-     mjd_dict,
-     filter_dict,
-     obsmd_dict) = get_pointing_htmid(pointing_dir, opsim_db_name,
-                                      ra_colname=ra_colname,
-                                      dec_colname=dec_colname)
+        t_htmid_dict = time.time()-t_start
 
-    t_htmid_dict = time.time()-t_start
+        bp_to_int = {'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}
 
-    bp_to_int = {'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}
+        # put the data about the pointings in the obs_metadata table
+        obs_list = list(mjd_dict.keys())
+        writer.insert('obs_metadata',
+                      [np.array(obs_list, dtype=int),
+                       np.array([mjd_dict[obs] for obs in obs_list], dtype=float),
+                       np.array([bp_to_int[filter_dict[obs]] for obs in obs_list],
+                                dtype=int)])
 
-    # put the data about the pointings in the obs_metadata table
-    with sqlite3.connect(out_file_name) as conn:
-        cursor = conn.cursor()
-        values = ((int(obs), mjd_dict[obs], bp_to_int[filter_dict[obs]])
-                  for obs in mjd_dict)
-        cursor.executemany('''INSERT INTO obs_metadata VALUES (?,?,?)''', values)
-        cursor.execute('''CREATE INDEX obs_filter
-                       ON obs_metadata (obshistid, filter)''')
-        conn.commit()
+        print('\ngot htmid_dict -- %d in %e seconds' % (len(htmid_dict), t_htmid_dict))
 
-    print('\ngot htmid_dict -- %d in %e seconds' % (len(htmid_dict), t_htmid_dict))
+        db = DBObject(sql_file_name, driver='sqlite')
 
-    db = DBObject(sql_file_name, driver='sqlite')
+        # get a list of htmid corresponding to trixels in which
+        # variables and transients can be found
+        query = 'SELECT DISTINCT htmid FROM zpoint WHERE is_agn=1 OR is_sn=1'
+        dtype = np.dtype([('htmid', int)])
 
-    # get a list of htmid corresponding to trixels in which
-    # variables and transients can be found
-    query = 'SELECT DISTINCT htmid FROM zpoint WHERE is_agn=1 OR is_sn=1'
-    dtype = np.dtype([('htmid', int)])
+        results = db.execute_arbitrary(query, dtype=dtype)
 
-    results = db.execute_arbitrary(query, dtype=dtype)
+        object_htmid = results['htmid']
 
-    object_htmid = results['htmid']
+        agn_dtype = np.dtype([('uniqueId', int), ('galaxy_id', int),
+                              ('ra', float), ('dec', float),
+                              ('redshift', float), ('sed', str, 500),
+                              ('magnorm', float), ('varParamStr', str, 500),
+                              ('is_sprinkled', int)])
 
-    agn_dtype = np.dtype([('uniqueId', int), ('galaxy_id', int),
-                          ('ra', float), ('dec', float),
-                          ('redshift', float), ('sed', str, 500),
-                          ('magnorm', float), ('varParamStr', str, 500),
-                          ('is_sprinkled', int)])
+        agn_base_query = 'SELECT uniqueId, galaxy_id, '
+        agn_base_query += 'raJ2000, decJ2000, '
+        agn_base_query += 'redshift, sedFilepath, '
+        agn_base_query += 'magNorm, varParamStr, is_sprinkled '
+        agn_base_query += 'FROM zpoint WHERE is_agn=1 '
 
-    agn_base_query = 'SELECT uniqueId, galaxy_id, '
-    agn_base_query += 'raJ2000, decJ2000, '
-    agn_base_query += 'redshift, sedFilepath, '
-    agn_base_query += 'magNorm, varParamStr, is_sprinkled '
-    agn_base_query += 'FROM zpoint WHERE is_agn=1 '
+        sn_dtype = np.dtype([('uniqueId', int), ('galaxy_id', int),
+                             ('ra', float), ('dec', float),
+                             ('redshift', float), ('sn_truth_params', str, 500),
+                             ('is_sprinkled', int)])
 
-    sn_dtype = np.dtype([('uniqueId', int), ('galaxy_id', int),
-                         ('ra', float), ('dec', float),
-                         ('redshift', float), ('sn_truth_params', str, 500),
-                         ('is_sprinkled', int)])
+        sn_base_query = 'SELECT uniqueId, galaxy_id, '
+        sn_base_query += 'raJ2000, decJ2000, '
+        sn_base_query += 'redshift, sn_truth_params, is_sprinkled '
+        sn_base_query += 'FROM zpoint WHERE is_sn=1 '
 
-    sn_base_query = 'SELECT uniqueId, galaxy_id, '
-    sn_base_query += 'raJ2000, decJ2000, '
-    sn_base_query += 'redshift, sn_truth_params, is_sprinkled '
-    sn_base_query += 'FROM zpoint WHERE is_sn=1 '
+        filter_to_int = {'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}
 
-    filter_to_int = {'u':0, 'g':1, 'r':2, 'i':3, 'z':4, 'y':5}
+        # the pointings overlapping each trixel
+        (pointing_obs,
+         pointing_ptr,
+         pointing_visits) = _pointings_by_htmid(htmid_dict, object_htmid)
+        pointing_mjd = np.array([mjd_dict[obs] for obs in pointing_obs])
+        pointing_filter = np.array([filter_to_int[filter_dict[obs]]
+                                    for obs in pointing_obs], dtype=int)
 
-    n_floats = 0
-    with sqlite3.connect(out_file_name) as conn:
-        cursor = conn.cursor()
+        n_floats = 0
         t_before_htmid = time.time()
 
         # loop over trixels containing variables and transients, simulating
@@ -329,26 +487,14 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
                 htmid_prediction = len(object_htmid)*htmid_duration/htmid_dex
                 print('%d htmid out of %d in %e hours; predict %e hours remaining' %
                 (htmid_dex, len(object_htmid), htmid_duration,htmid_prediction-htmid_duration))
-            mjd_arr = []
-            obs_arr = []
-            filter_arr = []
 
             # Find only those pointings which overlap the current trixel
-            for obshistid in htmid_dict:
-                is_contained = False
-                for bounds in htmid_dict[obshistid]:
-                    if htmid<=bounds[1] and htmid>=bounds[0]:
-                        is_contained = True
-                        break
-                if is_contained:
-                    mjd_arr.append(mjd_dict[obshistid])
-                    obs_arr.append(obshistid)
-                    filter_arr.append(filter_to_int[filter_dict[obshistid]])
-            if len(mjd_arr) == 0:
+            visits = pointing_visits[pointing_ptr[htmid_dex]:pointing_ptr[htmid_dex+1]]
+            if len(visits) == 0:
                 continue
-            mjd_arr = np.array(mjd_arr)
-            obs_arr = np.array(obs_arr)
-            filter_arr = np.array(filter_arr)
+            mjd_arr = pointing_mjd[visits]
+            obs_arr = pointing_obs[visits]
+            filter_arr = pointing_filter[visits]
             sorted_dex = np.argsort(mjd_arr)
             mjd_arr = mjd_arr[sorted_dex]
             obs_arr = obs_arr[sorted_dex]
@@ -363,16 +509,13 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
             # put static data about the AGN (position, etc.) into the
             # variables_and_transients table
             for i_chunk, agn_results in enumerate(agn_iter):
-                values = ((int(agn_results['uniqueId'][i_obj]),
-                           int(agn_results['galaxy_id'][i_obj]),
-                           np.degrees(agn_results['ra'][i_obj]),
-                           np.degrees(agn_results['dec'][i_obj]),
-                           int(agn_results['is_sprinkled'][i_obj]),
-                           1,0)
-                          for i_obj in range(len(agn_results)))
-
-                cursor.executemany('''INSERT INTO variables_and_transients VALUES
-                                      (?,?,?,?,?,?,?)''', values)
+                writer.insert('variables_and_transients',
+                              [agn_results['uniqueId'],
+                               agn_results['galaxy_id'],
+                               np.degrees(agn_results['ra']),
+                               np.degrees(agn_results['dec']),
+                               agn_results['is_sprinkled'],
+                               1, 0])
 
                 agn_simulator = AgnSimulator(agn_results['redshift'])
 
@@ -399,22 +542,23 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
                     # only include objects that were actually on a detector
                     are_on_chip = _actually_on_chip(np.degrees(agn_results['ra']),
                                                     np.degrees(agn_results['dec']),
-                                                    obsmd_dict[obshistid])
+                                                    obsmd_dict[obshistid],
+                                                    chip_assigner=chip_assigner,
+                                                    object_id=agn_results['uniqueId'],
+                                                    obsHistID=obshistid)
 
                     valid_agn = np.where(are_on_chip)
 
                     if len(valid_agn[0])==0:
                         continue
 
-                    values = ((int(agn_results['uniqueId'][i_obj]),
-                               int(obs_arr[i_time]),
-                               quiescent_mag[i_obj][filter_arr[i_time]]+
-                               dmag[filter_arr[i_time]][i_obj][i_time])
-                              for i_obj in valid_agn[0])
-                    cursor.executemany('''INSERT INTO light_curves VALUES
-                                       (?,?,?)''', values)
+                    i_filter = filter_arr[i_time]
+                    writer.insert('light_curves',
+                                  [agn_results['uniqueId'][valid_agn],
+                                   obs_arr[i_time],
+                                   quiescent_mag[valid_agn[0], i_filter]+
+                                   dmag[i_filter][valid_agn[0], i_time]])
 
-                conn.commit()
                 n_floats += len(dmag.flatten())
 
             sn_query = sn_base_query + 'AND htmid=%d' % htmid
@@ -428,17 +572,13 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
 
                 # write static information about SNe to the
                 # variables_and_transients table
-                values = ((int(sn_results['uniqueId'][i_obj]),
-                           int(sn_results['galaxy_id'][i_obj]),
-                           np.degrees(sn_results['ra'][i_obj]),
-                           np.degrees(sn_results['dec'][i_obj]),
-                           int(sn_results['is_sprinkled'][i_obj]),
-                           0,1)
-                          for i_obj in range(len(sn_results)))
-
-                cursor.executemany('''INSERT INTO variables_and_transients VALUES
-                                      (?,?,?,?,?,?,?)''', values)
-                conn.commit()
+                writer.insert('variables_and_transients',
+                              [sn_results['uniqueId'],
+                               sn_results['galaxy_id'],
+                               np.degrees(sn_results['ra']),
+                               np.degrees(sn_results['dec']),
+                               sn_results['is_sprinkled'],
+                               0, 1])
 
                 sn_mags = sn_simulator.calculate_sn_magnitudes(sn_results['sn_truth_params'],
                                                                mjd_arr, filter_arr)
@@ -451,7 +591,10 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
                     # only include objects that fell on a detector
                     are_on_chip = _actually_on_chip(np.degrees(sn_results['ra']),
                                                     np.degrees(sn_results['dec']),
-                                                    obsmd_dict[obshistid])
+                                                    obsmd_dict[obshistid],
+                                                    chip_assigner=chip_assigner,
+                                                    object_id=sn_results['uniqueId'],
+                                                    obsHistID=obshistid)
 
                     valid_obj = np.where(np.logical_and(np.isfinite(sn_mags[:,i_time]),
                                                         are_on_chip))
@@ -459,17 +602,11 @@ def write_sprinkled_lc(out_file_name, total_obs_md,
                     if len(valid_obj[0]) == 0:
                         continue
 
-                    values = ((int(sn_results['uniqueId'][i_obj]),
-                               int(obs_arr[i_time]),
-                               sn_mags[i_obj][i_time])
-                              for i_obj in valid_obj[0])
-
-                    cursor.executemany('''INSERT INTO light_curves VALUES (?,?,?)''', values)
-                    conn.commit()
+                    writer.insert('light_curves',
+                                  [sn_results['uniqueId'][valid_obj],
+                                   obs_arr[i_time],
+                                   sn_mags[valid_obj[0], i_time]])
                     n_floats += len(valid_obj[0])
 
-        cursor.execute('CREATE INDEX unq_obs ON light_curves (uniqueId, obshistid)')
-        conn.commit()
-
     print('n_floats %d' % n_floats)
     print('in %e seconds' % (time.time()-t0_master))
@@ -5,16 +5,15 @@ import time
 
 from lsst.sims.catalogs.decorators import cached, compound
 from lsst.sims.catalogs.definitions import InstanceCatalog
-from lsst.sims.catalogs.db import DBObject
 from lsst.sims.utils import findHtmid, halfSpaceFromRaDec
 from lsst.sims.utils import defaultSpecMap
-from lsst.sims.utils import _getRotSkyPos
 from lsst.sims.utils import ObservationMetaData
 from lsst.sims.photUtils import Sed, getImsimFluxNorm
 from lsst.sims.catUtils.baseCatalogModels import StarObj
 from desc.sims.GCRCatSimInterface.TwinklesClasses import sprinklerCompound_DC2_truth
 from desc.sims.GCRCatSimInterface.TwinklesClasses import TwinklesCompoundInstanceCatalog_DC2
 from . import SQLSubCatalogMixin
+from . import VisitTable, _getRotSkyPosArray
 from . import diskDESCQAObject_protoDC2 as diskDESCQAObject
 from . import bulgeDESCQAObject_protoDC2 as bulgeDESCQAObject
 from . import agnDESCQAObject_protoDC2 as agnDESCQAObject
@@ -217,10 +216,32 @@ def write_sprinkled_param_db(obs, field_ra=55.064, field_dec=-29.783,
     return full_file_name, table_name_list
 
 
+def _htmid_bounds(htmid_list, htmid_level):
+    """
+    Convert a sorted list of trixels at htmid_level into the
+    [min, max] ranges of the trixels at _truth_trixel_level they
+    contain, as returned by HalfSpace.findAllTrixels
+    """
+    if htmid_level > _truth_trixel_level:
+        raise RuntimeError("Cannot convert trixels at level %d to level %d"
+                           % (htmid_level, _truth_trixel_level))
+    shift = 2*(_truth_trixel_level-htmid_level)
+    bounds = []
+    for htmid in htmid_list:
+        lo = int(htmid) << shift
+        hi = ((int(htmid)+1) << shift) - 1
+        if len(bounds) > 0 and bounds[-1][1]+1 == lo:
+            bounds[-1][1] = hi
+        else:
+            bounds.append([lo, hi])
+    return bounds
+
+
 def get_pointing_htmid(pointing_dir, opsim_db_name,
                        ra_colname = 'descDitheredRA',
                        dec_colname = 'descDitheredDec',
-                       rottel_colname = 'descDitheredRotTelPos'):
+                       rottel_colname = 'descDitheredRotTelPos',
+                       visit_index=None):
     """
     For a list of OpSim pointings, find dicts mapping those pointings to:
     - The trixels filling the pointings
@@ -246,6 +267,15 @@ def get_pointing_htmid(pointing_dir, opsim_db_name,
     rottel_colname is the column used for the rotTelPos of the pointing
     (default: desckDitheredRotTelPos')
 
+    visit_index is an optional VisitIndex of the same pointings (see
+    build_visit_index).  If given, the trixels of each pointing are taken
+    from it instead of being found with HalfSpace.findAllTrixels.  They
+    are then a coarser superset of the trixels found without the index
+    (the index's field of view and trixel level are used).  A
+    RuntimeError is raised if the index was not built from the
+    pointings in ra_colname, dec_colname or covers less than the
+    field of view.
+
     Returns
     -------
     htmid_bound_dict -- a dict keyed on ObsHistID.  Values are the list of trixels filling
@@ -279,55 +309,55 @@ def get_pointing_htmid(pointing_dir, opsim_db_name,
             else:
                 obs_data = np.concatenate((obs_data, data['obshistid']), axis=0)
 
-    obs_data = np.sort(obs_data)
-
-    db = DBObject(opsim_db_name, driver='sqlite')
-    dtype = np.dtype([('obshistid', int), ('mjd', float), ('band', str, 1),
-                      ('ra', float), ('dec', float), ('rotTelPos', float)])
+    obs_data = np.unique(obs_data)
+
+    if visit_index is not None:
+        index_cols = (('descDitheredRA', 'descDitheredDec') if visit_index.dither
+                      else ('fieldRA', 'fieldDec'))
+        if visit_index.dither is None or index_cols != (ra_colname, dec_colname):
+            raise RuntimeError("visit_index was built from the %s pointings; "
+                               "get_pointing_htmid was asked for %s, %s"
+                               % ({True: 'dithered', False: 'undithered',
+                                   None: 'unknown'}[visit_index.dither],
+                                  ra_colname, dec_colname))
+        if visit_index.fov < radius:
+            raise RuntimeError("visit_index covers a field of view of %.2f "
+                               "degrees; need at least %.2f"
+                               % (visit_index.fov, radius))
+
+    visit_table = VisitTable.from_opsim(opsim_db_name,
+                                        columns=['expMJD', 'filter', ra_colname,
+                                                 dec_colname, rottel_colname],
+                                        obsHistID_list=obs_data)
 
     htmid_bound_dict = {}
     mjd_dict = {}
     filter_dict = {}
     obsmd_dict = {}
 
-    d_obs = len(obs_data)//5
-    for i_start in range(0,len(obs_data), d_obs):
-        i_end = i_start + d_obs
-        if len(obs_data)-i_start < d_obs:
-            i_end = len(obs_data)
-
-        subset = obs_data[i_start:i_end]
-
-        query = 'SELECT obsHistId, expMJD, filter,'
-        query += ' %s, %s, %s FROM Summary' % (ra_colname, dec_colname, rottel_colname)
-        query += ' WHERE obsHistID BETWEEN %d and %e' % (subset.min(), subset.max())
-        query += ' GROUP BY obsHistID'
-
-        results = db.execute_arbitrary(query, dtype=dtype)
-
-        for ii in range(len(results)):
-            obshistid = results['obshistid'][ii]
-            if obshistid not in obs_data:
-                continue
-
-            hs = halfSpaceFromRaDec(np.degrees(results['ra'][ii]),
-                                    np.degrees(results['dec'][ii]),
-                                    radius)
-
+    rotsky_rad = _getRotSkyPosArray(visit_table[ra_colname],
+                                    visit_table[dec_colname],
+                                    visit_table['expMJD'],
+                                    visit_table[rottel_colname])
+
+    for row, obshistid in enumerate(visit_table.obsHistID):
+        ra = visit_table[ra_colname][row]
+        dec = visit_table[dec_colname][row]
+        mjd = visit_table['expMJD'][row]
+
+        if visit_index is not None:
+            trixel_bounds = _htmid_bounds(visit_index.htmids(obshistid),
+                                          visit_index.htmid_level)
+        else:
+            hs = halfSpaceFromRaDec(np.degrees(ra), np.degrees(dec), radius)
             trixel_bounds = hs.findAllTrixels(_truth_trixel_level)
-            htmid_bound_dict[obshistid] = trixel_bounds
-            mjd_dict[obshistid] = results['mjd'][ii]
-            filter_dict[obshistid] = results['band'][ii]
-            obs_md = ObservationMetaData(pointingRA=np.degrees(results['ra'][ii]),
-                                         pointingDec=np.degrees(results['dec'][ii]),
-                                         mjd = results['mjd'][ii])
-
-            rotsky_rad = _getRotSkyPos(results['ra'][ii], results['dec'][ii],
-                                       obs_md, results['rotTelPos'][ii])
-            obsmd_dict[obshistid] = ObservationMetaData(pointingRA=np.degrees(results['ra'][ii]),
-                                                        pointingDec=np.degrees(results['dec'][ii]),
-                                                        mjd = results['mjd'][ii],
-                                                        rotSkyPos=np.degrees(rotsky_rad))
+        htmid_bound_dict[obshistid] = trixel_bounds
+        mjd_dict[obshistid] = mjd
+        filter_dict[obshistid] = visit_table['filter'][row]
+        obsmd_dict[obshistid] = ObservationMetaData(pointingRA=np.degrees(ra),
+                                                    pointingDec=np.degrees(dec),
+                                                    mjd=mjd,
+                                                    rotSkyPos=np.degrees(rotsky_rad[row]))
     assert len(obs_data) == len(htmid_bound_dict)
 
     return htmid_bound_dict, mjd_dict, filter_dict, obsmd_dict
@@ -0,0 +1,336 @@
+"""
+A bidirectional index between OpSim visits and the sky cells (nside=32
+healpixels and level 6 trixels) their fields of view touch.  The index
+is built in one vectorized pass over a VisitTable, stored in one HDF5
+file and read back by the tools that need to know which visits observe
+a region of the sky or which regions a visit observes.
+
+Each direction is stored CSR-style: a sorted array of keys, an array of
+values and an array of pointers such that the values of key[i] are
+values[ptr[i]:ptr[i+1]].
+"""
+import numpy as np
+import h5py
+import healpy
+from lsst.sims.utils import trixelFromHtmid, cartesianFromSpherical
+
+__all__ = ["VisitIndex", "build_visit_index"]
+
+
+# the per-visit columns stored in the index, as named in the file
+_visit_columns = ('obsHistID', 'ra', 'dec', 'rotTelPos', 'mjd', 'filter')
+
+
+def _csr(keys, values):
+    """
+    Group values by keys.  Returns the sorted unique keys, the pointers
+    into the values array and the values (sorted within each key).
+    """
+    order = np.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    ptr = np.zeros(len(unique_keys)+1, dtype=np.int64)
+    ptr[1:] = np.cumsum(counts)
+    return unique_keys, ptr, values
+
+
+class VisitIndex(object):
+    """
+    The visit<->healpixel and visit<->trixel index.  Visits are referred
+    to by obsHistID; the per-visit columns (pointing in radians, TAI MJD,
+    rotTelPos in radians and filter as an int, u=0 ... y=5) are
+    available with column().  The attribute dither records whether
+    the index was built from the dithered pointings (None for an
+    index written before it was recorded).
+
+    Do not instantiate directly; use build_visit_index() or read().
+    """
+
+    def __init__(self, visits, cell_maps, nside, htmid_level, fov,
+                 dither=None):
+        self._visits = visits
+        self._maps = cell_maps
+        self.nside = nside
+        self.htmid_level = htmid_level
+        self.fov = fov
+        self.dither = dither
+
+    @classmethod
+    def read(cls, file_name):
+        """
+        Read an index written by write()
+        """
+        with h5py.File(file_name, 'r') as in_file:
+            visits = {name: in_file['visits/%s' % name][()]
+                      for name in _visit_columns}
+            cell_maps = {}
+            for kind in ('healpix', 'htmid'):
+                group = in_file[kind]
+                cell_maps[kind] = {name: group[name][()] for name in group.keys()}
+            dither = None
+            if 'dither' in in_file.attrs:
+                dither = bool(in_file.attrs['dither'])
+            return cls(visits, cell_maps, int(in_file.attrs['nside']),
+                       int(in_file.attrs['htmid_level']),
+                       float(in_file.attrs['fov']), dither=dither)
+
+    @staticmethod
+    def read_cell(file_name, cell, kind='healpix',
+                  columns=('ra', 'dec', 'rotTelPos', 'mjd', 'filter')):
+        """
+        Read the visits touching one cell from an index written by
+        write(), without reading the rest of the index.
+
+        Parameters
+        ----------
+        file_name: str
+            The index file
+        cell: int
+            The healpixel (RING ordered) or trixel
+        kind: str ['healpix']
+            'healpix' or 'htmid'
+        columns: list
+            The per-visit columns to read
+
+        Returns
+        -------
+        The sorted obsHistIDs of the visits (as visits_in_healpix or
+        visits_in_htmid return them) and a dict of their columns
+        """
+        with h5py.File(file_name, 'r') as in_file:
+            group = in_file[kind]
+            cell_ids = group['cell_ids'][()]
+            i_cell = np.searchsorted(cell_ids, cell)
+            rows = np.zeros(0, dtype=np.int64)
+            if i_cell < len(cell_ids) and cell_ids[i_cell] == cell:
+                i_start, i_end = group['cell_ptr'][i_cell:i_cell+2]
+                rows = group['cell_visits'][i_start:i_end]
+
+            # the rows of a cell are sorted, as h5py requires
+            values = {}
+            for name in ('obsHistID',) + tuple(columns):
+                data = in_file['visits/%s' % name]
+                values[name] = data[rows] if len(rows) > 0 else data[0:0]
+        return values.pop('obsHistID'), values
+
+    def write(self, file_name):
+        """
+        Write the index to an HDF5 file
+        """
+        with h5py.File(file_name, 'w') as out_file:
+            out_file.attrs['nside'] = self.nside
+            out_file.attrs['htmid_level'] = self.htmid_level
+            out_file.attrs['fov'] = self.fov
+            if self.dither is not None:
+                out_file.attrs['dither'] = self.dither
+            for name in _visit_columns:
+                out_file.create_dataset('visits/%s' % name,
+                                        data=self._visits[name])
+            for kind in self._maps:
+                for name, data in self._maps[kind].items():
+                    out_file.create_dataset('%s/%s' % (kind, name), data=data)
+
+    def __len__(self):
+        return len(self._visits['obsHistID'])
+
+    @property
+    def obsHistID(self):
+        """
+        The sorted obsHistIDs of the indexed visits
+        """
+        return self._visits['obsHistID']
+
+    def column(self, name, obsHistID=None):
+        """
+        Return the per-visit column name ('ra', 'dec', 'rotTelPos',
+        'mjd' or 'filter') of the visits in obsHistID (default: all)
+        """
+        if obsHistID is None:
+            return self._visits[name]
+        return self._visits[name][self._rows(obsHistID)]
+
+    def _rows(self, obsHistID):
+        obsHistID = np.asarray(obsHistID)
+        rows = np.searchsorted(self._visits['obsHistID'], obsHistID)
+        rows = np.minimum(rows, len(self)-1)
+        if len(self) == 0 or (self._visits['obsHistID'][rows] != obsHistID).any():
+            raise RuntimeError("obsHistIDs %s are not in the VisitIndex"
+                               % np.setdiff1d(obsHistID, self._visits['obsHistID']))
+        return rows
+
+    def _cells_of_visit(self, kind, obsHistID):
+        cell_map = self._maps[kind]
+        row = self._rows(obsHistID)
+        return cell_map['visit_cells'][cell_map['visit_ptr'][row]:
+                                       cell_map['visit_ptr'][row+1]]
+
+    def _visits_of_cell(self, kind, cell):
+        cell_map = self._maps[kind]
+        i_cell = np.searchsorted(cell_map['cell_ids'], cell)
+        if i_cell >= len(cell_map['cell_ids']) or cell_map['cell_ids'][i_cell] != cell:
+            return np.zeros(0, dtype=self._visits['obsHistID'].dtype)
+        rows = cell_map['cell_visits'][cell_map['cell_ptr'][i_cell]:
+                                       cell_map['cell_ptr'][i_cell+1]]
+        return self._visits['obsHistID'][rows]
+
+    def healpixels(self, obsHistID):
+        """
+        Return the sorted (RING ordered) healpixels touched by a visit
+        """
+        return self._cells_of_visit('healpix', obsHistID)
+
+    def htmids(self, obsHistID):
+        """
+        Return the sorted trixels touched by a visit
+        """
+        return self._cells_of_visit('htmid', obsHistID)
+
+    def visits_in_healpix(self, healpix):
+        """
+        Return the sorted obsHistIDs of the visits touching a healpixel
+        """
+        return self._visits_of_cell('healpix', healpix)
+
+    def visits_in_htmid(self, htmid):
+        """
+        Return the sorted obsHistIDs of the visits touching a trixel
+        """
+        return self._visits_of_cell('htmid', htmid)
+
+    def healpix_list(self):
+        """
+        Return the sorted healpixels touched by any visit
+        """
+        return self._maps['healpix']['cell_ids']
+
+    def htmid_list(self):
+        """
+        Return the sorted trixels touched by any visit
+        """
+        return self._maps['htmid']['cell_ids']
+
+
+def _match_cells(visit_xyz, cell_xyz, cell_radius, fov, chunk_size):
+    """
+    Find the (visit, cell) pairs for which the bounding circle of the
+    cell intersects the field of view of the visit.
+
+    Parameters
+    ----------
+    visit_xyz: numpy array of shape (n_visits, 3)
+    cell_xyz: numpy array of shape (n_cells, 3)
+    cell_radius: float or numpy array
+        Radius of the bounding circles of the cells in radians
+    fov: float
+        Field-of-view radius in radians
+    chunk_size: int
+        The number of visits matched at a time
+
+    Returns
+    -------
+    Arrays of visit rows and cell rows
+    """
+    cos_max = np.cos(np.minimum(np.pi, fov + cell_radius))
+    visit_rows = []
+    cell_rows = []
+    for i_start in range(0, len(visit_xyz), chunk_size):
+        cos_dist = np.dot(visit_xyz[i_start:i_start+chunk_size], cell_xyz.T)
+        rows, cols = np.nonzero(cos_dist >= cos_max)
+        visit_rows.append(rows + i_start)
+        cell_rows.append(cols)
+    if len(visit_rows) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(visit_rows), np.concatenate(cell_rows)
+
+
+def build_visit_index(visit_table, fov=2.1, nside=32, htmid_level=6,
+                      dither=True, hs_list=None, chunk_size=256):
+    """
+    Build the VisitIndex of the visits in a VisitTable.
+
+    A cell is associated with a visit if the circle bounding the cell
+    intersects the field of view, so the cells of a visit are a (slight)
+    superset of those returned by healpy.query_disc(inclusive=True) and
+    HalfSpace.findAllTrixels.
+
+    Parameters
+    ----------
+    visit_table: VisitTable
+        The visits (must hold the pointing, rotTelPos, expMJD
+        and filter columns)
+    fov: float [2.1]
+        Field-of-view radius in degrees
+    nside: int [32]
+        The healpix resolution (RING ordering, as in the GCR catalogs)
+    htmid_level: int [6]
+        The trixel level
+    dither: bool [True]
+        If True, use the descDithered pointings and rotTelPos
+    hs_list: list [None]
+        Optional list of lsst.sims.utils.HalfSpaces; only visits whose
+        field of view intersects all of them are indexed
+    chunk_size: int [256]
+        The number of visits matched against the cells at a time
+
+    Returns
+    -------
+    A VisitIndex
+    """
+    if dither:
+        ra_col, dec_col, rot_col = ('descDitheredRA', 'descDitheredDec',
+                                    'descDitheredRotTelPos')
+    else:
+        ra_col, dec_col, rot_col = 'fieldRA', 'fieldDec', 'rotTelPos'
+
+    fov_rad = np.radians(fov)
+    ra = visit_table[ra_col]
+    dec = visit_table[dec_col]
+    visit_xyz = cartesianFromSpherical(ra, dec)
+
+    keep = np.ones(len(ra), dtype=bool)
+    if hs_list is not None:
+        for hs in hs_list:
+            keep &= np.dot(visit_xyz, hs.vector) >= np.cos(min(np.pi, hs.phi + fov_rad))
+
+    visit_xyz = visit_xyz[keep]
+    visits = {'obsHistID': visit_table.obsHistID[keep],
+              'ra': ra[keep], 'dec': dec[keep],
+              'rotTelPos': visit_table[rot_col][keep],
+              'mjd': visit_table['expMJD'][keep],
+              'filter': np.array(['ugrizy'.index(bp) for bp in
+                                  visit_table['filter'][keep]], dtype=int)}
+
+    n_pix = healpy.nside2npix(nside)
+    hp_xyz = np.array(healpy.pix2vec(nside, np.arange(n_pix), nest=False)).T
+    hp_radius = healpy.max_pixrad(nside)
+
+    htmid_list = np.arange(8*4**htmid_level, 16*4**htmid_level)
+    trixel_list = [trixelFromHtmid(htmid) for htmid in htmid_list]
+    trixel_center = np.radians(np.array([trixel.get_center()
+                                         for trixel in trixel_list]))
+    trixel_xyz = cartesianFromSpherical(trixel_center[:, 0], trixel_center[:, 1])
+    trixel_radius = np.radians(np.array([trixel.get_radius()
+                                         for trixel in trixel_list]))
+
+    cell_maps = {}
+    for kind, cell_xyz, cell_radius, cell_ids in \
+            (('healpix', hp_xyz, hp_radius, np.arange(n_pix)),
+             ('htmid', trixel_xyz, trixel_radius, htmid_list)):
+        visit_rows, cell_rows = _match_cells(visit_xyz, cell_xyz, cell_radius,
+                                             fov_rad, chunk_size)
+        # the pairs come out sorted on visit, then cell, so they are
+        # already in the visit->cell CSR order; every visit gets a
+        # (possibly empty) slot
+        cells = cell_ids[cell_rows]
+        visit_ptr = np.zeros(len(visit_xyz)+1, dtype=np.int64)
+        visit_ptr[1:] = np.cumsum(np.bincount(visit_rows, minlength=len(visit_xyz)))
+        unique_cells, cell_ptr, cell_visits = _csr(cells, visit_rows)
+        cell_maps[kind] = {'visit_ptr': visit_ptr,
+                           'visit_cells': cells,
+                           'cell_ids': unique_cells,
+                           'cell_ptr': cell_ptr,
+                           'cell_visits': cell_visits}
+
+    return VisitIndex(visits, cell_maps, nside, htmid_level, fov,
+                      dither=dither)
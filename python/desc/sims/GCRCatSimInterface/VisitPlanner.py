@@ -0,0 +1,197 @@
+"""
+Code to order and group visits so that the visits processed by one
+worker overlap on the sky, letting consecutive visits reuse the
+healpixels (and the file system pages behind them) that were just read.
+"""
+import numpy as np
+import healpy
+from . import VisitTable
+
+__all__ = ["visit_pointings", "visit_healpixels", "group_visits",
+           "order_healpixels", "plan_visits"]
+
+
+def visit_pointings(opsim_db, obsHistID_list, dither=True):
+    """
+    Read the pointings of visits from an OpSim database.
+
+    Parameters
+    ----------
+    opsim_db: str or VisitTable
+        Path to the OpSim database, or a VisitTable already read from it
+    obsHistID_list: list
+        The visits to read
+    dither: bool [True]
+        If True, use the descDithered pointings; otherwise fieldRA, fieldDec
+
+    Returns
+    -------
+    A dict keyed on obsHistID whose values are (RA, Dec) in radians
+    """
+    if dither:
+        ra_col, dec_col = 'descDitheredRA', 'descDitheredDec'
+    else:
+        ra_col, dec_col = 'fieldRA', 'fieldDec'
+
+    obsHistID_list = np.array([int(obs) for obs in obsHistID_list], dtype=int)
+    if isinstance(opsim_db, VisitTable):
+        visit_table = opsim_db
+    else:
+        visit_table = VisitTable.from_opsim(opsim_db, columns=[ra_col, dec_col],
+                                            obsHistID_list=obsHistID_list)
+
+    rows = visit_table.rows(obsHistID_list)
+    ra = visit_table[ra_col][rows]
+    dec = visit_table[dec_col][rows]
+    return {int(obs_id): (ra[ii], dec[ii])
+            for ii, obs_id in enumerate(obsHistID_list)}
+
+
+def visit_healpixels(opsim_db, obsHistID_list, fov=2.0, dither=True,
+                     nside=32):
+    """
+    Find the healpixels touched by each visit, as
+    DESCQAChunkIterator_healpix does.
+
+    Parameters
+    ----------
+    opsim_db: str or VisitTable
+        Path to the OpSim database, or a VisitTable already read from it
+    obsHistID_list: list
+        The visits to consider
+    fov: float [2]
+        Field-of-view angular radius in degrees
+    dither: bool [True]
+        If True, use the descDithered pointings; otherwise fieldRA, fieldDec
+    nside: int [32]
+        The healpix resolution (RING ordering, as in the GCR catalogs)
+
+    Returns
+    -------
+    A dict keyed on obsHistID whose values are sorted numpy arrays of
+    healpixels, and a dict keyed on obsHistID whose values are
+    the NESTED healpixel containing the pointing
+    """
+    hp_dict = {}
+    center_dict = {}
+    pointings = visit_pointings(opsim_db, obsHistID_list, dither=dither)
+    for obs_id, (ra, dec) in pointings.items():
+        vv = np.array([np.cos(dec)*np.cos(ra),
+                       np.cos(dec)*np.sin(ra),
+                       np.sin(dec)])
+        hp_dict[obs_id] = np.sort(healpy.query_disc(nside, vv,
+                                                    np.radians(fov),
+                                                    inclusive=True,
+                                                    nest=False))
+        center_dict[obs_id] = healpy.vec2pix(nside, vv[0], vv[1], vv[2],
+                                             nest=True)
+    return hp_dict, center_dict
+
+
+def group_visits(center_dict, n_groups):
+    """
+    Divide visits into n_groups groups of overlapping visits.
+
+    Visits are sorted along the NESTED healpix space-filling curve
+    of their pointings (visits with the same pointing pixel are
+    adjacent and share most of their footprint) and the curve is cut
+    into n_groups contiguous pieces holding nearly equal numbers of
+    visits.  Visits sharing a pointing pixel are not split across
+    groups unless that is required to make n_groups groups.
+
+    Parameters
+    ----------
+    center_dict: dict
+        Keyed on obsHistID; values are the NESTED healpixel of the
+        pointing (see visit_healpixels)
+    n_groups: int
+        The number of groups to make
+
+    Returns
+    -------
+    A list of lists of obsHistIDs, ordered along the curve
+    """
+    ordered = sorted(center_dict.keys(),
+                     key=lambda obs_id: (center_dict[obs_id], obs_id))
+    n_groups = max(1, min(n_groups, len(ordered)))
+
+    groups = []
+    i_start = 0
+    for i_group in range(n_groups):
+        n_left = n_groups - i_group
+        i_end = i_start + int(np.ceil((len(ordered)-i_start)/n_left))
+        # extend to the end of the run of visits sharing a pointing pixel,
+        # as long as that leaves a visit for every remaining group
+        while (i_end < len(ordered) and
+               len(ordered) - (i_end+1) >= n_left - 1 and
+               center_dict[ordered[i_end]] == center_dict[ordered[i_end-1]]):
+            i_end += 1
+        groups.append(ordered[i_start:i_end])
+        i_start = i_end
+    return [gg for gg in groups if len(gg) > 0]
+
+
+def order_healpixels(group, hp_dict):
+    """
+    Choose the order in which each visit of a group loads its
+    healpixels.  Healpixels the previous visit loaded come first,
+    most recently loaded first, so they are still warm; the rest
+    follow in increasing order.
+
+    Parameters
+    ----------
+    group: list
+        obsHistIDs, in the order in which they will be processed
+    hp_dict: dict
+        Keyed on obsHistID; values are arrays of healpixels
+        (see visit_healpixels)
+
+    Returns
+    -------
+    A dict keyed on obsHistID whose values are lists of healpixels
+    in processing order
+    """
+    order = {}
+    previous = []
+    for obs_id in group:
+        hp_set = set(int(hp) for hp in hp_dict[obs_id])
+        warm = [hp for hp in reversed(previous) if hp in hp_set]
+        warm_set = set(warm)
+        cold = sorted(hp for hp in hp_set if hp not in warm_set)
+        order[obs_id] = warm + cold
+        previous = order[obs_id]
+    return order
+
+
+def plan_visits(opsim_db, obsHistID_list, n_groups, fov=2.0, dither=True):
+    """
+    Group visits by overlapping nside=32 footprint and choose a
+    deterministic healpixel order for each visit.
+
+    Parameters
+    ----------
+    opsim_db: str or VisitTable
+        Path to the OpSim database, or a VisitTable already read from it
+    obsHistID_list: list
+        The visits to process
+    n_groups: int
+        The number of groups (e.g. the number of workers)
+    fov: float [2]
+        Field-of-view angular radius in degrees
+    dither: bool [True]
+        Whether to use the dithered pointings
+
+    Returns
+    -------
+    A list of groups (lists of obsHistIDs in processing order) and a
+    dict keyed on obsHistID whose values are lists of healpixels in
+    processing order (to be set as the healpix_order of the
+    DESCQAObjects queried for that visit)
+    """
+    hp_dict, center_dict = visit_healpixels(opsim_db, obsHistID_list,
+                                            fov=fov, dither=dither)
+    groups = group_visits(center_dict, n_groups)
+    healpix_order = {}
+    for group in groups:
+        healpix_order.update(order_healpixels(group, hp_dict))
+    return groups, healpix_order
@@ -0,0 +1,288 @@
+"""
+A columnar, in-memory copy of the OpSim Summary table.  The columns
+needed to describe the visits are read once into numpy arrays, and the
+rows are indexed on obsHistID so that looking up a visit (or building
+its ObservationMetaData) does not query the database again.  The table
+can be saved to and reloaded from a .npz file.
+"""
+import os
+import sqlite3
+import numpy as np
+from lsst.sims.utils import ObservationMetaData
+from . import _getRotSkyPosArray
+
+__all__ = ["VisitTable"]
+
+
+class VisitTable(object):
+    """
+    The OpSim (v3 schema) Summary columns of a set of visits, one numpy
+    array per column sorted on obsHistID.  Angles are in radians, as in
+    the OpSim database.
+
+    Parameters
+    ----------
+    columns: dict
+        Keyed on column name; values are equal-length arrays.
+        Must contain 'obsHistID'.  Rows are re-sorted on obsHistID.
+    """
+
+    # the Summary columns read by default: those used to build the
+    # ObservationMetaData, those written to the PhoSim header and
+    # the DC2 dithered pointings
+    default_columns = ('obsHistID', 'fieldRA', 'fieldDec', 'expMJD',
+                       'filter', 'rotSkyPos', 'rotTelPos', 'fiveSigmaDepth',
+                       'FWHMeff', 'FWHMgeom', 'rawSeeing', 'airmass',
+                       'altitude', 'azimuth', 'dist2Moon', 'moonRA',
+                       'moonDec', 'moonAlt', 'moonPhase', 'sunAlt',
+                       'visitExpTime', 'filtSkyBrightness', 'night',
+                       'descDitheredRA', 'descDitheredDec',
+                       'descDitheredRotTelPos')
+
+    def __init__(self, columns):
+        if 'obsHistID' not in columns:
+            raise RuntimeError("VisitTable needs an obsHistID column")
+
+        obsHistID = np.asarray(columns['obsHistID']).astype(np.int64)
+        order = np.argsort(obsHistID, kind='mergesort')
+        self._columns = {}
+        for name in columns:
+            self._columns[name] = np.asarray(columns[name])[order]
+        self._columns['obsHistID'] = obsHistID[order]
+
+        if len(obsHistID) > 0 and obsHistID.min() < 0:
+            raise RuntimeError("VisitTable cannot index negative obsHistIDs")
+
+        # dense map from obsHistID to row so that lookups are O(1)
+        # and vectorized (OpSim obsHistIDs are small, dense integers)
+        n_ids = self._columns['obsHistID'][-1]+1 if len(obsHistID) > 0 else 0
+        self._row_index = np.full(n_ids, -1, dtype=np.int32)
+        self._row_index[self._columns['obsHistID']] = np.arange(len(obsHistID),
+                                                                dtype=np.int32)
+
+    @classmethod
+    def from_opsim(cls, opsim_db, columns=None, obsHistID_list=None):
+        """
+        Read the Summary table of an OpSim database.
+
+        Parameters
+        ----------
+        opsim_db: str
+            Path to the OpSim database
+        columns: list [None]
+            The columns to read.  None reads those of default_columns
+            that are present in the table.  'obsHistID' is always read.
+        obsHistID_list: list [None]
+            The visits to read (default: all of them).  Visits not in
+            the database are left out of the table.
+
+        Returns
+        -------
+        A VisitTable
+        """
+        if not os.path.isfile(opsim_db):
+            raise RuntimeError('%s is not a file' % opsim_db)
+
+        with sqlite3.connect(opsim_db) as conn:
+            cursor = conn.cursor()
+            available = [row[1] for row in
+                         cursor.execute('PRAGMA table_info(Summary)')]
+            if len(available) == 0:
+                raise RuntimeError('%s has no Summary table' % opsim_db)
+
+            if columns is None:
+                columns = [name for name in cls.default_columns
+                           if name in available]
+            else:
+                missing = [name for name in columns if name not in available]
+                if len(missing) > 0:
+                    raise RuntimeError('Summary table of %s has no columns %s'
+                                       % (opsim_db, missing))
+            columns = ['obsHistID'] + [name for name in columns
+                                       if name != 'obsHistID']
+
+            # the v3 Summary table has one row per proposal a visit
+            # satisfies; keep one per obsHistID
+            query = 'SELECT %s FROM Summary' % ', '.join(columns)
+            if obsHistID_list is not None:
+                cursor.execute('CREATE TEMP TABLE visit_table_ids '
+                               '(obsHistID int PRIMARY KEY)')
+                cursor.executemany('INSERT OR IGNORE INTO visit_table_ids VALUES (?)',
+                                   ((int(obs),) for obs in obsHistID_list))
+                query += ' WHERE obsHistID IN (SELECT obsHistID FROM visit_table_ids)'
+            query += ' GROUP BY obsHistID'
+            rows = cursor.execute(query).fetchall()
+
+        data = {}
+        for i_col, name in enumerate(columns):
+            data[name] = np.array([row[i_col] for row in rows])
+            if data[name].dtype == object:
+                data[name] = data[name].astype(str)
+        if len(rows) == 0:
+            data['obsHistID'] = np.zeros(0, dtype=np.int64)
+
+        return cls(data)
+
+    @classmethod
+    def read(cls, file_name):
+        """
+        Read a VisitTable written by write()
+        """
+        with np.load(file_name, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    @classmethod
+    def load(cls, opsim_db, cache_file=None, columns=None):
+        """
+        Return the VisitTable of opsim_db, reading it from cache_file
+        if that file exists and writing it there otherwise.
+
+        Parameters
+        ----------
+        opsim_db: str
+            Path to the OpSim database
+        cache_file: str [None]
+            Path to the .npz copy of the table (None disables caching)
+        columns: list [None]
+            The columns to read from opsim_db (see from_opsim)
+        """
+        if cache_file is not None and os.path.isfile(cache_file):
+            return cls.read(cache_file)
+        table = cls.from_opsim(opsim_db, columns=columns)
+        if cache_file is not None:
+            table.write(cache_file)
+        return table
+
+    def write(self, file_name):
+        """
+        Write the table to file_name as an uncompressed .npz file.
+        The file is written under a temporary name and then renamed
+        so that concurrent jobs never read a partial table.
+        """
+        tmp_name = '%s.tmp.%d' % (file_name, os.getpid())
+        with open(tmp_name, 'wb') as out_file:
+            np.savez(out_file, **self._columns)
+        os.rename(tmp_name, file_name)
+
+    def __len__(self):
+        return len(self._columns['obsHistID'])
+
+    def __contains__(self, obsHistID):
+        return (0 <= obsHistID < len(self._row_index) and
+                self._row_index[obsHistID] >= 0)
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    @property
+    def columns(self):
+        """
+        The names of the columns held by the table
+        """
+        return list(self._columns.keys())
+
+    @property
+    def obsHistID(self):
+        """
+        The sorted obsHistIDs of the visits in the table
+        """
+        return self._columns['obsHistID']
+
+    def rows(self, obsHistID):
+        """
+        Return the row indices of the visits in obsHistID (an int or an
+        array of ints).  Raises a RuntimeError if any are not in the table.
+        """
+        obsHistID = np.asarray(obsHistID, dtype=np.int64)
+        in_range = (obsHistID >= 0) & (obsHistID < len(self._row_index))
+        rows = np.full(obsHistID.shape, -1, dtype=np.int64)
+        rows[in_range] = self._row_index[obsHistID[in_range]]
+        if (rows < 0).any():
+            raise RuntimeError("obsHistIDs %s are not in the VisitTable"
+                               % np.atleast_1d(obsHistID)[np.atleast_1d(rows) < 0])
+        return rows
+
+    def get(self, name, obsHistID):
+        """
+        Return the values of column name for the visits in obsHistID
+        (an int or an array of ints)
+        """
+        return self._columns[name][self.rows(obsHistID)]
+
+    def record(self, obsHistID):
+        """
+        Return a dict of the column values of one visit, as the
+        OpsimMetaData of the ObservationMetaDataGenerator
+        """
+        row = self.rows(obsHistID)
+        return {name: self._columns[name][row].item()
+                for name in self._columns}
+
+    def dithered_rot_sky_pos(self, obsHistID):
+        """
+        Return rotSkyPos (in radians) of the visits in obsHistID (an
+        array of ints) at the descDithered pointings, given their
+        descDitheredRotTelPos.  All visits are converted at once
+        (see _getRotSkyPosArray).
+        """
+        rows = np.atleast_1d(self.rows(obsHistID))
+        return _getRotSkyPosArray(self._columns['descDitheredRA'][rows],
+                                  self._columns['descDitheredDec'][rows],
+                                  self._columns['expMJD'][rows],
+                                  self._columns['descDitheredRotTelPos'][rows])
+
+    def obs_metadata_list(self, obsHistID_list, fov=2, dither=True,
+                          boundType='circle'):
+        """
+        Build the ObservationMetaData of many visits the way the
+        ObservationMetaDataGenerator does.  OpsimMetaData holds the
+        columns present in the table.
+
+        Parameters
+        ----------
+        obsHistID_list: list
+            The visits
+        fov: float [2]
+            Field-of-view angular radius in degrees
+        dither: bool [True]
+            If True, point at descDitheredRA, descDitheredDec and use
+            descDitheredRotTelPos to recompute rotSkyPos
+        boundType: str ['circle']
+            The boundType of the ObservationMetaData
+
+        Returns
+        -------
+        A list of lsst.sims.utils.ObservationMetaData
+        """
+        obsHistID_list = np.atleast_1d(np.asarray(obsHistID_list, dtype=np.int64))
+        if dither:
+            rot_sky_pos = self.dithered_rot_sky_pos(obsHistID_list)
+
+        obs_md_list = []
+        for ii, obsHistID in enumerate(obsHistID_list):
+            opsim_md = self.record(obsHistID)
+            obs_md = ObservationMetaData(pointingRA=np.degrees(opsim_md['fieldRA']),
+                                         pointingDec=np.degrees(opsim_md['fieldDec']),
+                                         rotSkyPos=np.degrees(opsim_md['rotSkyPos']),
+                                         mjd=opsim_md['expMJD'],
+                                         bandpassName=opsim_md['filter'],
+                                         m5=opsim_md.get('fiveSigmaDepth'),
+                                         seeing=opsim_md.get('FWHMeff'),
+                                         boundType=boundType,
+                                         boundLength=fov)
+            obs_md.OpsimMetaData = opsim_md
+
+            if dither:
+                obs_md.pointingRA = np.degrees(opsim_md['descDitheredRA'])
+                obs_md.pointingDec = np.degrees(opsim_md['descDitheredDec'])
+                opsim_md['rotTelPos'] = opsim_md['descDitheredRotTelPos']
+                obs_md.rotSkyPos = np.degrees(rot_sky_pos[ii])
+            obs_md_list.append(obs_md)
+        return obs_md_list
+
+    def obs_metadata(self, obsHistID, fov=2, dither=True, boundType='circle'):
+        """
+        Build the ObservationMetaData of one visit (see obs_metadata_list)
+        """
+        return self.obs_metadata_list([obsHistID], fov=fov, dither=dither,
+                                      boundType=boundType)[0]
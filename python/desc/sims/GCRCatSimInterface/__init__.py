@@ -1,6 +1,20 @@
 from __future__ import absolute_import
+from .HtmQueryPlanner import *
 from .StarModule import *
+from .MemoryBudget import *
+from .GetterProfiler import *
+from .RotationUtils import *
+from .VisitTable import *
+from .VisitIndex import *
 from .DatabaseEmulator import *
+from .ColumnarCatalog import *
+from .LineFormatter import *
+from .HealpixCheckpoint import *
+from .SensorShards import *
+from .ChipAssigner import *
+from .SNSedWriter import *
+from .SqliteWriter import *
+from .VisitPlanner import *
 from .CatalogClasses import *
 from .ProtoDC2DatabaseEmulator import *
 from .AGNModule import *
@@ -8,5 +22,7 @@ from .CompoundCatalogDBObjectClasses import *
 from .CompoundInstanceCatalogClasses import *
 from .HostImages import *
 from .om10_lensing_equations import * 
+from .JobJournal import *
+from .CostModel import *
 from .InstanceCatalogWriter import *
 from .SQLSubCatalog import *
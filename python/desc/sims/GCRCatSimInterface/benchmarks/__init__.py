@@ -0,0 +1,2 @@
+from .timing import *
+from .hot_paths import *
@@ -0,0 +1,251 @@
+"""
+Benchmarks of the performance-critical code paths, run against the
+synthetic fixtures written by desc.sims.GCRCatSimInterface.synthetic.
+
+Each benchmark is a function taking the fixtures manifest and a
+scratch directory and returning a setup callable suitable for
+timing.time_benchmark.
+"""
+import os
+import shutil
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+import h5py
+from lsst.sims.catalogs.definitions import InstanceCatalog
+from desc.sims.GCRCatSimInterface import PhoSimDESCQA
+from desc.sims.GCRCatSimInterface import SQLSubCatalogMixin
+from desc.sims.GCRCatSimInterface import diskDESCQAObject_protoDC2
+from desc.sims.GCRCatSimInterface import agnDESCQAObject_protoDC2
+from desc.sims.GCRCatSimInterface import hostImage
+from desc.sims.GCRCatSimInterface import InstanceCatalogWriter, get_obs_md
+from desc.sims.GCRCatSimInterface import VisitTable
+from desc.sims.GCRCatSimInterface.GalaxyTruthModule import calculate_mags
+
+__all__ = ["hot_path_benchmarks"]
+
+
+_galaxy_columns = ['galaxy_id', 'raJ2000', 'decJ2000', 'redshift',
+                   'majorAxis', 'minorAxis', 'positionAngle', 'sindex']
+
+
+class _BenchmarkSQLCatalog(SQLSubCatalogMixin, InstanceCatalog):
+    catalog_type = 'benchmark_sql_subcatalog'
+    column_outputs = _galaxy_columns
+    _table_name = 'benchmark'
+    _file_name = 'benchmark_sql.db'
+
+
+def _obs_md(manifest):
+    """
+    The ObservationMetaData of the first visit of the fixtures
+    """
+    visit_table = VisitTable.from_opsim(manifest['opsim_db'])
+    return get_obs_md(visit_table, manifest['obsHistID'][0], fov=2, dither=True)
+
+
+def _disk_db(manifest):
+    db_obj = diskDESCQAObject_protoDC2(manifest['descqa_catalog'])
+    db_obj.field_ra = 0.0
+    db_obj.field_dec = 0.0
+    return db_obj
+
+
+def bench_chunk_iterator(manifest, work_dir):
+    """
+    Iterate over all of the disk rows of one visit in chunks of 5000
+    """
+    def setup():
+        obs_md = _obs_md(manifest)
+        db_obj = _disk_db(manifest)
+        n_rows = sum(len(chunk) for chunk in
+                     db_obj.query_columns(colnames=_galaxy_columns,
+                                          chunk_size=5000,
+                                          obs_metadata=obs_md))
+
+        def func():
+            for chunk in db_obj.query_columns(colnames=_galaxy_columns,
+                                              chunk_size=5000,
+                                              obs_metadata=obs_md):
+                pass
+        return func, n_rows
+    return setup
+
+
+def bench_sed_lookup(manifest, work_dir):
+    """
+    Load the disk SED lookup tables of every healpixel
+    """
+    def setup():
+        obs_md = _obs_md(manifest)
+        cat = PhoSimDESCQA(_disk_db(manifest), obs_metadata=obs_md)
+        cat.sed_lookup_dir = manifest['sed_lookup_dir']
+        healpix_list = np.array(manifest['healpix'])
+        n_rows = len(cat._cache_sed_lookup(healpix_list, 'disk',
+                                           obs_md.bandpass)['galaxy_id'])
+
+        def func():
+            cat._cache_sed_lookup(healpix_list, 'disk', obs_md.bandpass)
+        return func, n_rows
+    return setup
+
+
+def bench_agn_postprocess(manifest, work_dir):
+    """
+    Query the AGN database and attach varParamStr and magNorm to a
+    chunk of galaxies, a tenth of which host AGN
+    """
+    def setup():
+        obs_md = _obs_md(manifest)
+        agn_db = agnDESCQAObject_protoDC2(manifest['descqa_catalog'])
+        agn_db.field_ra = 0.0
+        agn_db.field_dec = 0.0
+        agn_db.agn_params_db = manifest['agn_db']
+
+        with sqlite3.connect(manifest['agn_db']) as conn:
+            agn_id = np.array([row[0] for row in
+                               conn.execute('SELECT galaxy_id FROM agn_params')])
+        galaxy_id = np.union1d(agn_id, np.arange(1, 9*len(agn_id)+1))
+        chunk = np.zeros(len(galaxy_id),
+                         dtype=np.dtype([('galaxy_id', int),
+                                         ('varParamStr', (str, 500)),
+                                         ('agnMagNorm', float)]))
+        chunk['galaxy_id'] = galaxy_id
+
+        def func():
+            if hasattr(agn_db, '_agn_query_results'):
+                del agn_db._agn_query_results
+            agn_db._postprocess_results(np.copy(chunk), obs_md)
+        return func, len(chunk)
+    return setup
+
+
+def bench_sql_subcatalog(manifest, work_dir):
+    """
+    Insert the disk rows of one visit into a SQLSubCatalogMixin table
+    """
+    def setup():
+        obs_md = _obs_md(manifest)
+        db_obj = _disk_db(manifest)
+        cat = _BenchmarkSQLCatalog(db_obj, obs_metadata=obs_md)
+        chunk_list = list(db_obj.query_columns(colnames=_galaxy_columns,
+                                               chunk_size=5000,
+                                               obs_metadata=obs_md))
+        db_name = os.path.join(work_dir, _BenchmarkSQLCatalog._file_name)
+
+        def func():
+            # force the table to be recreated
+            SQLSubCatalogMixin._files_written.discard(db_name)
+            SQLSubCatalogMixin._tables_created.discard(_BenchmarkSQLCatalog._table_name)
+            with open(os.path.join(work_dir, 'benchmark_sql.txt'), 'w') as file_handle:
+                for chunk in chunk_list:
+                    cat._write_recarray(chunk, file_handle)
+        return func, sum(len(chunk) for chunk in chunk_list)
+    return setup
+
+
+def bench_host_cat(manifest, work_dir, n_hosts=2000):
+    """
+    Write the lensed host entries of n_hosts systems with
+    hostImage.write_host_cat (stamps are empty files; only their
+    names are read)
+    """
+    def setup():
+        obs_md = _obs_md(manifest)
+        image_dir = os.path.join(work_dir, 'host_stamps')
+        if os.path.exists(image_dir):
+            shutil.rmtree(image_dir)
+        os.makedirs(image_dir)
+
+        rng = np.random.RandomState(8812)
+        lens_id = (np.arange(1, n_hosts+1) << 10) + 97
+        csv_name = os.path.join(work_dir, 'host_data.csv')
+        with open(csv_name, 'w') as out_file:
+            out_file.write('uniqueId_lens,raPhoSim_lens,decPhoSim_lens,'
+                           'twinkles_system,sedFilepath,redshift,internalAv,'
+                           'internalRv,galacticAv,galacticRv\n')
+            for ii in range(n_hosts):
+                out_file.write('%d,%.7f,%.7f,%d,galaxySED/Burst.10E10.1Z.spec.gz,'
+                               '%.4f,0.1,3.1,0.05,3.1\n' %
+                               (lens_id[ii],
+                                obs_md.pointingRA + rng.uniform(-1.0, 1.0),
+                                obs_md.pointingDec + rng.uniform(-1.0, 1.0),
+                                ii, rng.uniform(0.1, 1.0)))
+                open(os.path.join(image_dir, '%d_%.2f_bulge.fits' %
+                                  (lens_id[ii], rng.uniform(18.0, 24.0))), 'w').close()
+
+        host_cat = hostImage(obs_md.pointingRA, obs_md.pointingDec, 2.0)
+        out_name = os.path.join(work_dir, 'host_cat.txt')
+
+        def func():
+            host_cat.write_host_cat(image_dir, csv_name, out_name)
+        return func, n_hosts
+    return setup
+
+
+def bench_galaxy_truth_mags(manifest, work_dir, n_galaxies=500):
+    """
+    Compute the total bulge+disk magnitudes of n_galaxies galaxies
+    with GalaxyTruthModule.calculate_mags
+    """
+    def setup():
+        healpix = manifest['healpix'][0]
+        with h5py.File(os.path.join(manifest['sed_lookup_dir'],
+                                    'sed_fit_%d.h5' % healpix), 'r') as data:
+            sed_names = data['sed_names'][()].astype(str)
+            n_gal = min(n_galaxies, len(data['galaxy_id']))
+            bulge_sed = sed_names[data['bulge_sed'][:n_gal]]
+            disk_sed = sed_names[data['disk_sed'][:n_gal]]
+            bulge_magnorm = data['bulge_magnorm'][2][:n_gal]
+            disk_magnorm = data['disk_magnorm'][2][:n_gal]
+
+        rng = np.random.RandomState(4432)
+        redshift = rng.uniform(0.1, 2.0, size=n_gal)
+        shear = rng.normal(0.0, 0.01, size=(3, n_gal))
+
+        # tuples laid out as calculate_mags expects them
+        galaxy_list = [(bulge_sed[ii], bulge_magnorm[ii],
+                        disk_sed[ii], disk_magnorm[ii],
+                        None, None, redshift[ii],
+                        None, None, None, None, None,
+                        shear[0][ii], shear[1][ii], shear[2][ii])
+                       for ii in range(n_gal)]
+
+        def func():
+            calculate_mags(galaxy_list, {})
+        return func, n_gal
+    return setup
+
+
+def bench_write_catalog(manifest, work_dir):
+    """
+    Write the InstanceCatalog of one visit: stars, bulge and disk
+    galaxies and SNe (the writer is built without the sprinkler, so
+    no AGN are written)
+    """
+    def setup():
+        writer = InstanceCatalogWriter(manifest['opsim_db'],
+                                       manifest['descqa_catalog'],
+                                       star_db_name=manifest['star_db'],
+                                       sed_lookup_dir=manifest['sed_lookup_dir'],
+                                       agn_db_name=manifest['agn_db'],
+                                       sn_db_name=manifest['sne_db'])
+        out_dir = os.path.join(work_dir, 'instcat')
+        obsHistID = manifest['obsHistID'][0]
+
+        def func():
+            if os.path.exists(out_dir):
+                shutil.rmtree(out_dir)
+            writer.write_catalog(obsHistID, out_dir=out_dir, fov=2)
+        return func, 1
+    return setup
+
+
+# the benchmarks in the order they are run
+hot_path_benchmarks = OrderedDict([('chunk_iterator', bench_chunk_iterator),
+                                   ('sed_lookup', bench_sed_lookup),
+                                   ('agn_postprocess', bench_agn_postprocess),
+                                   ('sql_subcatalog', bench_sql_subcatalog),
+                                   ('host_cat', bench_host_cat),
+                                   ('galaxy_truth_mags', bench_galaxy_truth_mags),
+                                   ('write_catalog', bench_write_catalog)])
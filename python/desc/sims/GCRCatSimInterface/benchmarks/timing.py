@@ -0,0 +1,161 @@
+"""
+Code to time benchmarks, store their results as json and compare
+results against a baseline.
+"""
+import os
+import sys
+import time
+import json
+import socket
+import platform
+import subprocess
+import numpy as np
+
+__all__ = ["time_benchmark", "run_benchmarks", "write_results",
+           "read_results", "compare_results"]
+
+
+def time_benchmark(setup, repeat=3):
+    """
+    Time one benchmark.
+
+    Parameters
+    ----------
+    setup: callable
+        Called once (untimed); returns (func, n_items) where func is
+        the callable to time and n_items is the number of items
+        (rows, objects, ...) func processes per call
+    repeat: int [3]
+        The number of times to call func
+
+    Returns
+    -------
+    A dict with the 'min', 'median' and 'mean' wall time per call in
+    seconds, 'repeat', 'n_items' and 'items_per_sec' (n_items over the
+    fastest call)
+    """
+    func, n_items = setup()
+    times = []
+    for i_repeat in range(repeat):
+        t_start = time.perf_counter()
+        func()
+        times.append(time.perf_counter()-t_start)
+    t_min = min(times)
+    return {'min': t_min, 'median': float(np.median(times)),
+            'mean': float(np.mean(times)), 'repeat': repeat,
+            'n_items': n_items,
+            'items_per_sec': n_items/t_min if t_min > 0.0 else None}
+
+
+def _git_revision():
+    """
+    Return the git revision of this package, or None
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(benchmarks, names=None, repeat=3, verbose=True):
+    """
+    Run a set of benchmarks.
+
+    Parameters
+    ----------
+    benchmarks: dict
+        Keyed on benchmark name; values are setup callables
+        (see time_benchmark)
+    names: list [None]
+        The benchmarks to run (default: all of them)
+    repeat: int [3]
+        The number of timed calls of each benchmark
+    verbose: bool [True]
+        If True, print each result as it is measured
+
+    Returns
+    -------
+    A dict with 'metadata' (host, python, git revision, time) and
+    'benchmarks' (keyed on name; values are the output of
+    time_benchmark)
+    """
+    if names is None:
+        names = list(benchmarks.keys())
+    unknown = [name for name in names if name not in benchmarks]
+    if len(unknown) > 0:
+        raise RuntimeError("Unknown benchmarks %s; choose from %s"
+                           % (unknown, list(benchmarks.keys())))
+
+    results = {'metadata': {'host': socket.gethostname(),
+                            'platform': platform.platform(),
+                            'python': sys.version.split()[0],
+                            'git_revision': _git_revision(),
+                            'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+               'benchmarks': {}}
+    for name in names:
+        results['benchmarks'][name] = time_benchmark(benchmarks[name],
+                                                     repeat=repeat)
+        if verbose:
+            print('%-24s %10.4f s  (%s items)' %
+                  (name, results['benchmarks'][name]['min'],
+                   results['benchmarks'][name]['n_items']))
+            sys.stdout.flush()
+    return results
+
+
+def write_results(results, file_name):
+    """
+    Write the output of run_benchmarks as json
+    """
+    with open(file_name, 'w') as out_file:
+        json.dump(results, out_file, indent=2, sort_keys=True)
+
+
+def read_results(file_name):
+    """
+    Read results written by write_results
+    """
+    with open(file_name, 'r') as in_file:
+        return json.load(in_file)
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    Compare benchmark results against a baseline.  Times are
+    compared per item processed so that runs on fixtures of
+    different sizes can be compared.
+
+    Parameters
+    ----------
+    baseline, current: dict
+        Outputs of run_benchmarks (or read_results)
+    threshold: float [0.2]
+        The fractional slow-down beyond which a benchmark
+        is flagged as a regression
+
+    Returns
+    -------
+    A list of (name, baseline time, current time, ratio, flag) tuples
+    for the benchmarks present in both, where the times are the fastest
+    seconds per item, ratio is current/baseline and flag is
+    'REGRESSION', 'improved' or ''
+    """
+    comparison = []
+    for name in sorted(current['benchmarks']):
+        if name not in baseline['benchmarks']:
+            continue
+        base = baseline['benchmarks'][name]
+        cur = current['benchmarks'][name]
+        base_time = base['min']/max(base['n_items'], 1)
+        cur_time = cur['min']/max(cur['n_items'], 1)
+        ratio = cur_time/base_time if base_time > 0.0 else np.inf
+        if ratio > 1.0+threshold:
+            flag = 'REGRESSION'
+        elif ratio < 1.0/(1.0+threshold):
+            flag = 'improved'
+        else:
+            flag = ''
+        comparison.append((name, base_time, cur_time, ratio, flag))
+    return comparison
@@ -0,0 +1,2 @@
+from .mock_catalog import *
+from .fixtures import *
@@ -0,0 +1,450 @@
+"""
+Code to write small synthetic stand-ins for the inputs of the
+InstanceCatalog and truth catalog code: a healpix-partitioned mock
+galaxy catalog with its yaml config, the matching sed_fit_*.h5 SED
+lookup files, AGN, SNe and star sqlite databases and an OpSim
+Summary table, all covering one patch of sky.
+"""
+import os
+import json
+import sqlite3
+import numpy as np
+import h5py
+import healpy
+import yaml
+from lsst.sims.utils import findHtmid, galacticFromEquatorial
+from . import mock_galaxy_quantities
+
+__all__ = ["random_positions", "write_mock_catalog", "write_sed_fit_files",
+           "write_agn_db", "write_sne_db", "write_star_db",
+           "write_opsim_db", "make_fixtures"]
+
+
+# SEDs from sims_sed_library assigned to the mock objects
+_galaxy_sed_names = ('galaxySED/Burst.10E10.1Z.spec.gz',
+                     'galaxySED/Const.1E10.1Z.spec.gz',
+                     'galaxySED/Exp.10E10.02Z.spec.gz',
+                     'galaxySED/Inst.10E10.1Z.spec.gz')
+
+_star_sed_names = ('starSED/kurucz/km10_5750.fits_g40_5790.gz',
+                   'starSED/mlt/m2.0Full.dat')
+
+_agn_varparam_format = ('{"m": "applyAgn", "p": {"seed": %d, '
+                        '"agn_sf_u": %.3e, "agn_sf_g": %.3e, "agn_sf_r": %.3e, '
+                        '"agn_sf_i": %.3e, "agn_sf_z": %.3e, "agn_sf_y": %.3e, '
+                        '"agn_tau_u" : %.3e, "agn_tau_g" : %.3e, '
+                        '"agn_tau_r" : %.3e, "agn_tau_i" : %.3e, '
+                        '"agn_tau_z" : %.3e, "agn_tau_y" : %.3e}}')
+
+
+def random_positions(rng, n_obj, ra0, dec0, radius):
+    """
+    Draw n_obj positions uniformly distributed on the sphere within
+    radius degrees of (ra0, dec0).  Returns RA, Dec in degrees.
+    """
+    cos_theta = rng.uniform(np.cos(np.radians(radius)), 1.0, size=n_obj)
+    sin_theta = np.sqrt(1.0-cos_theta**2)
+    phi = rng.uniform(0.0, 2.0*np.pi, size=n_obj)
+
+    ra0_rad = np.radians(ra0)
+    dec0_rad = np.radians(dec0)
+    center = np.array([np.cos(dec0_rad)*np.cos(ra0_rad),
+                       np.cos(dec0_rad)*np.sin(ra0_rad),
+                       np.sin(dec0_rad)])
+    east = np.array([-np.sin(ra0_rad), np.cos(ra0_rad), 0.0])
+    north = np.cross(center, east)
+
+    xyz = (np.outer(cos_theta, center) +
+           np.outer(sin_theta*np.cos(phi), east) +
+           np.outer(sin_theta*np.sin(phi), north))
+
+    ra = np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0])) % 360.0
+    dec = np.degrees(np.arcsin(np.clip(xyz[:, 2], -1.0, 1.0)))
+    return ra, dec
+
+
+def write_mock_catalog(out_dir, rng, n_galaxies, ra0, dec0, radius):
+    """
+    Write a mock galaxy catalog as one HDF5 file per nside=32
+    healpixel (see mock_catalog.MockHealpixCatalog) and the yaml
+    config with which to load it.
+
+    Parameters
+    ----------
+    out_dir: str
+        The directory in which to write the catalog
+    rng: numpy.random.RandomState
+    n_galaxies: int
+        The number of galaxies to simulate
+    ra0, dec0: float
+        The center of the patch in degrees
+    radius: float
+        The radius of the patch in degrees
+
+    Returns
+    -------
+    The name of the yaml config and a dict of numpy arrays holding
+    the galaxies (keyed on the mock_galaxy_quantities names and
+    'healpix_pixel')
+    """
+    catalog_dir = os.path.join(out_dir, 'mock_galaxies')
+    os.makedirs(catalog_dir, exist_ok=True)
+
+    ra, dec = random_positions(rng, n_galaxies, ra0, dec0, radius)
+    healpix = healpy.ang2pix(32, ra, dec, lonlat=True, nest=False)
+    sorted_dex = np.argsort(healpix, kind='mergesort')
+
+    gal = {}
+    gal['healpix_pixel'] = healpix[sorted_dex]
+    gal['galaxy_id'] = np.arange(1, n_galaxies+1, dtype=np.int64)
+    gal['ra'] = ra[sorted_dex]
+    gal['dec'] = dec[sorted_dex]
+    gal['redshift_true'] = np.clip(rng.gamma(2.0, 0.35, size=n_galaxies), 0.01, 3.0)
+    gal['redshift'] = gal['redshift_true'] + rng.normal(0.0, 0.001, size=n_galaxies)
+    gal['shear_1'] = rng.normal(0.0, 0.01, size=n_galaxies)
+    gal['shear_2_phosim'] = rng.normal(0.0, 0.01, size=n_galaxies)
+    gal['convergence'] = rng.normal(0.0, 0.01, size=n_galaxies)
+    gal['position_angle_true'] = rng.uniform(0.0, 180.0, size=n_galaxies)
+    gal['size_disk_true'] = rng.lognormal(0.0, 0.5, size=n_galaxies)
+    gal['size_minor_disk_true'] = gal['size_disk_true']*rng.uniform(0.2, 1.0, size=n_galaxies)
+    gal['size_bulge_true'] = 0.5*rng.lognormal(0.0, 0.5, size=n_galaxies)
+    gal['size_minor_bulge_true'] = gal['size_bulge_true']*rng.uniform(0.5, 1.0, size=n_galaxies)
+    gal['sersic_disk'] = np.ones(n_galaxies)
+    gal['sersic_bulge'] = 4.0*np.ones(n_galaxies)
+    gal['stellar_mass_disk'] = 10.0**rng.uniform(7.0, 11.0, size=n_galaxies)
+    gal['stellar_mass_bulge'] = np.where(rng.random_sample(n_galaxies) < 0.3, 0.0,
+                                         10.0**rng.uniform(7.0, 11.0, size=n_galaxies))
+    gal['knots_flux_ratio'] = rng.uniform(0.0, 0.5, size=n_galaxies)
+    gal['n_knots'] = rng.randint(1, 100, size=n_galaxies).astype(float)
+
+    # number counts rise toward the faint end; some galaxies fall
+    # below the mag_r <= 29 cut applied by DESCQAChunkIterator_healpix
+    gal['mag_r_lsst'] = np.clip(29.5 - rng.exponential(2.5, size=n_galaxies), 16.0, None)
+    for bp, color in zip('ugizy', (1.2, 0.5, -0.3, -0.5, -0.6)):
+        gal['mag_%s_lsst' % bp] = (gal['mag_r_lsst'] + color +
+                                   rng.normal(0.0, 0.2, size=n_galaxies))
+    gal['mag_true_i_lsst'] = gal['mag_i_lsst'] + rng.normal(0.0, 0.01, size=n_galaxies)
+
+    for name, dtype in mock_galaxy_quantities:
+        gal[name] = gal[name].astype(dtype)
+
+    hp_list, hp_start = np.unique(gal['healpix_pixel'], return_index=True)
+    hp_end = np.append(hp_start[1:], n_galaxies)
+    for hp, i_start, i_end in zip(hp_list, hp_start, hp_end):
+        file_name = os.path.join(catalog_dir, 'mock_galaxies_healpix_%d.hdf5' % hp)
+        with h5py.File(file_name, 'w') as out_file:
+            for name, dtype in mock_galaxy_quantities:
+                out_file.create_dataset(name, data=gal[name][i_start:i_end])
+
+    config = {'subclass_name': 'desc.sims.GCRCatSimInterface.synthetic.'
+                               'mock_catalog.MockHealpixCatalog',
+              'catalog_root_dir': os.path.abspath(catalog_dir),
+              'description': 'synthetic healpix-partitioned galaxy catalog '
+                             'of %d galaxies' % n_galaxies}
+    yaml_name = os.path.join(out_dir, 'mock_galaxies.yaml')
+    with open(yaml_name, 'w') as out_file:
+        yaml.safe_dump(config, out_file, default_flow_style=False)
+
+    return yaml_name, gal
+
+
+def write_sed_fit_files(out_dir, rng, gal):
+    """
+    Write an SED lookup file sed_fit_<healpix>.h5 for every healpixel
+    of the mock catalog gal (see write_mock_catalog) in the format
+    read by PhoSimDESCQA._cache_sed_lookup.
+
+    Returns the names of the files written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    sed_names = np.array([name.encode() for name in _galaxy_sed_names])
+    n_gal = len(gal['galaxy_id'])
+    mags = np.array([gal['mag_%s_lsst' % bp] for bp in 'ugrizy'])
+
+    file_names = []
+    hp_list, hp_start = np.unique(gal['healpix_pixel'], return_index=True)
+    hp_end = np.append(hp_start[1:], n_gal)
+    for hp, i_start, i_end in zip(hp_list, hp_start, hp_end):
+        n_hp = i_end - i_start
+        file_name = os.path.join(out_dir, 'sed_fit_%d.h5' % hp)
+        with h5py.File(file_name, 'w') as out_file:
+            out_file.create_dataset('sed_names', data=sed_names)
+            out_file.create_dataset('galaxy_id', data=gal['galaxy_id'][i_start:i_end])
+            out_file.create_dataset('ra', data=gal['ra'][i_start:i_end])
+            out_file.create_dataset('dec', data=gal['dec'][i_start:i_end])
+            for component, offset in (('disk', 0.4), ('bulge', 1.2)):
+                out_file.create_dataset('%s_sed' % component,
+                                        data=rng.randint(0, len(sed_names), size=n_hp))
+                magnorm = (mags[:, i_start:i_end] + offset +
+                           rng.normal(0.0, 0.1, size=(6, n_hp)))
+                out_file.create_dataset('%s_magnorm' % component, data=magnorm)
+                out_file.create_dataset('%s_av' % component,
+                                        data=rng.uniform(0.0, 1.0, size=n_hp))
+                out_file.create_dataset('%s_rv' % component,
+                                        data=rng.uniform(2.0, 4.0, size=n_hp))
+        file_names.append(file_name)
+    return file_names
+
+
+def write_agn_db(file_name, rng, gal, agn_fraction):
+    """
+    Write an AGN parameter database with the schema made by
+    bin.src/create_agn_db.py for a random agn_fraction of the
+    galaxies in gal (see write_mock_catalog).
+
+    Returns the number of AGN written.
+    """
+    n_agn = int(agn_fraction*len(gal['galaxy_id']))
+    dexes = np.sort(rng.choice(len(gal['galaxy_id']), size=n_agn, replace=False))
+    mag_norm = rng.uniform(20.0, 27.0, size=n_agn)
+    sf = rng.uniform(0.05, 0.5, size=(n_agn, 6))
+    tau = rng.uniform(50.0, 1000.0, size=(n_agn, 6))
+    seed = rng.randint(0, 2**30, size=n_agn)
+
+    vals = []
+    for i_agn, dex in enumerate(dexes):
+        htmid = findHtmid(gal['ra'][dex], gal['dec'][dex], max_level=8)
+        params = (seed[i_agn],) + tuple(sf[i_agn]) + tuple(tau[i_agn])
+        vals.append((int(gal['galaxy_id'][dex]), int(htmid),
+                     float(mag_norm[i_agn]), _agn_varparam_format % params))
+
+    with sqlite3.connect(file_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''CREATE TABLE agn_params
+                          (galaxy_id int, htmid_8 int, magNorm real, varParamStr text)''')
+        cursor.executemany('INSERT INTO agn_params VALUES(?, ?, ?, ?)', vals)
+        cursor.execute('CREATE INDEX htmid ON agn_params (htmid_8)')
+        conn.commit()
+    return n_agn
+
+
+def write_sne_db(file_name, rng, gal, n_sne, mjd_min, mjd_max):
+    """
+    Write a SNe parameter database with the schema made by
+    bin.src/create_sne_db.py.  Each SN is hosted by a random galaxy
+    of gal (see write_mock_catalog) at z < 1.4 and peaks between
+    mjd_min-50 and mjd_max+20.
+
+    Returns the number of SNe written.
+    """
+    candidates = np.where(gal['redshift_true'] < 1.4)[0]
+    hosts = rng.choice(candidates, size=n_sne, replace=True)
+    offset = rng.normal(0.0, 1.0/3600.0, size=(2, n_sne))
+    sn_ra = gal['ra'][hosts] + offset[0]/np.cos(np.radians(gal['dec'][hosts]))
+    sn_dec = gal['dec'][hosts] + offset[1]
+    c_in = rng.normal(0.0, 0.1, size=n_sne)
+    x1_in = rng.normal(0.0, 1.0, size=n_sne)
+    # Hubble-law distance modulus with c/H0 = 4300 Mpc
+    mB = -19.3 + 5.0*np.log10(gal['redshift_true'][hosts]*4300.0) + 25.0
+    x0_in = 10.0**(-0.4*(mB - 10.635))
+    t0_in = rng.uniform(mjd_min-50.0, mjd_max+20.0, size=n_sne)
+
+    vals = []
+    for i_sn, host in enumerate(hosts):
+        htmid = findHtmid(sn_ra[i_sn], sn_dec[i_sn], max_level=6)
+        vals.append((int(htmid), int(gal['galaxy_id'][host]),
+                     float(c_in[i_sn]), float(mB[i_sn]), float(t0_in[i_sn]),
+                     float(x0_in[i_sn]), float(x1_in[i_sn]),
+                     float(gal['redshift_true'][host]),
+                     'MS_%d_%d' % (gal['healpix_pixel'][host], i_sn),
+                     float(sn_ra[i_sn]), float(sn_dec[i_sn])))
+
+    with sqlite3.connect(file_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""CREATE TABLE sne_params (
+                          htmid_level_6 int,
+                          galaxy_id int,
+                          c_in real,
+                          mB real,
+                          t0_in real,
+                          x0_in real,
+                          x1_in real,
+                          z_in real,
+                          snid_in text,
+                          snra_in real,
+                          sndec_in real)""")
+        cursor.executemany('''INSERT INTO sne_params
+                           VALUES(?,?,?,?,?,?,?,?,?,?,?)''', vals)
+        cursor.execute('''CREATE INDEX htmid_index ON sne_params (htmid_level_6)''')
+        cursor.execute('''CREATE INDEX t0_index ON sne_params (t0_in)''')
+        conn.commit()
+    return n_sne
+
+
+def write_star_db(file_name, rng, n_stars, ra0, dec0, radius):
+    """
+    Write a star database with the 'stars' table read by
+    StarModule.DC2StarObj, holding n_stars non-variable stars within
+    radius degrees of (ra0, dec0).
+
+    Returns the number of stars written.
+    """
+    ra, dec = random_positions(rng, n_stars, ra0, dec0, radius)
+    gal_l, gal_b = galacticFromEquatorial(ra, dec)
+    mag_norm = np.clip(25.0 - rng.exponential(3.0, size=n_stars), 12.0, None)
+    mura = rng.normal(0.0, 5.0, size=n_stars)
+    mudecl = rng.normal(0.0, 5.0, size=n_stars)
+    parallax = rng.uniform(0.01, 2.0, size=n_stars)
+    ebv = rng.uniform(0.0, 0.05, size=n_stars)
+    radial_velocity = rng.normal(0.0, 50.0, size=n_stars)
+    sed_dex = rng.randint(0, len(_star_sed_names), size=n_stars)
+
+    vals = []
+    for i_star in range(n_stars):
+        htmid = findHtmid(ra[i_star], dec[i_star], max_level=6)
+        vals.append((i_star+1, int(htmid), float(ra[i_star]), float(dec[i_star]),
+                     float(gal_l[i_star]), float(gal_b[i_star]),
+                     float(mag_norm[i_star]), float(mura[i_star]),
+                     float(mudecl[i_star]), float(parallax[i_star]),
+                     float(ebv[i_star]), float(radial_velocity[i_star]),
+                     'None', _star_sed_names[sed_dex[i_star]]))
+
+    with sqlite3.connect(file_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''CREATE TABLE stars
+                          (simobjid int, htmid_6 int, ra real, decl real,
+                           gal_l real, gal_b real, magNorm real,
+                           mura real, mudecl real, parallax real,
+                           ebv real, radialVelocity real,
+                           varParamStr text, sedFilename text)''')
+        cursor.executemany('INSERT INTO stars VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+                           vals)
+        cursor.execute('CREATE INDEX star_htmid ON stars (htmid_6)')
+        conn.commit()
+    return n_stars
+
+
+def write_opsim_db(file_name, rng, n_visits, ra0, dec0, mjd_start,
+                   dither_radius=0.5):
+    """
+    Write an OpSim (v3 schema) database whose Summary table holds
+    n_visits visits pointed within dither_radius degrees of
+    (ra0, dec0), one every 40 seconds starting at mjd_start, with
+    the descDithered columns used by the DC2 code.  Angles are in
+    radians, as in the OpSim v3 outputs.
+
+    Returns the obsHistIDs written.
+    """
+    obsHistID = np.arange(1, n_visits+1)
+    field_ra = np.radians(ra0)*np.ones(n_visits)
+    field_dec = np.radians(dec0)*np.ones(n_visits)
+    dith_ra, dith_dec = random_positions(rng, n_visits, ra0, dec0, dither_radius)
+    exp_mjd = mjd_start + 40.0*np.arange(n_visits)/86400.0
+    band = np.array(list('ugrizy'))[np.arange(n_visits) % 6]
+    rot_tel_pos = rng.uniform(-0.5*np.pi, 0.5*np.pi, size=n_visits)
+    rot_sky_pos = rng.uniform(0.0, 2.0*np.pi, size=n_visits)
+    fwhm_eff = rng.uniform(0.6, 1.2, size=n_visits)
+    sky = {'u': 22.9, 'g': 22.3, 'r': 21.2, 'i': 20.5, 'z': 19.6, 'y': 18.6}
+    m5 = {'u': 23.7, 'g': 24.8, 'r': 24.4, 'i': 23.9, 'z': 23.3, 'y': 22.4}
+
+    columns = (('obsHistID', 'int'), ('sessionID', 'int'), ('propID', 'int'),
+               ('fieldID', 'int'), ('fieldRA', 'real'), ('fieldDec', 'real'),
+               ('filter', 'text'), ('expDate', 'int'), ('expMJD', 'real'),
+               ('night', 'int'), ('visitTime', 'real'), ('visitExpTime', 'real'),
+               ('finRank', 'real'), ('FWHMeff', 'real'), ('FWHMgeom', 'real'),
+               ('transparency', 'real'), ('airmass', 'real'),
+               ('vSkyBright', 'real'), ('filtSkyBrightness', 'real'),
+               ('rotSkyPos', 'real'), ('rotTelPos', 'real'), ('lst', 'real'),
+               ('altitude', 'real'), ('azimuth', 'real'), ('dist2Moon', 'real'),
+               ('solarElong', 'real'), ('moonRA', 'real'), ('moonDec', 'real'),
+               ('moonAlt', 'real'), ('moonAZ', 'real'), ('moonPhase', 'real'),
+               ('sunAlt', 'real'), ('sunAz', 'real'), ('phaseAngle', 'real'),
+               ('rScatter', 'real'), ('mieScatter', 'real'),
+               ('moonIllum', 'real'), ('moonBright', 'real'),
+               ('darkBright', 'real'), ('rawSeeing', 'real'), ('wind', 'real'),
+               ('humidity', 'real'), ('slewDist', 'real'), ('slewTime', 'real'),
+               ('fiveSigmaDepth', 'real'), ('ditheredRA', 'real'),
+               ('ditheredDec', 'real'), ('descDitheredRA', 'real'),
+               ('descDitheredDec', 'real'), ('descDitheredRotTelPos', 'real'))
+
+    vals = []
+    for ii in range(n_visits):
+        bp = band[ii]
+        row = {'obsHistID': int(obsHistID[ii]), 'sessionID': 1000,
+               'propID': 54, 'fieldID': 1427,
+               'fieldRA': field_ra[ii], 'fieldDec': field_dec[ii],
+               'filter': bp,
+               'expDate': int((exp_mjd[ii]-mjd_start)*86400.0),
+               'expMJD': exp_mjd[ii], 'night': 0,
+               'visitTime': 34.0, 'visitExpTime': 30.0, 'finRank': 1.0,
+               'FWHMeff': fwhm_eff[ii], 'FWHMgeom': 0.822*fwhm_eff[ii]+0.052,
+               'transparency': 0.0, 'airmass': 1.1,
+               'vSkyBright': 21.5, 'filtSkyBrightness': sky[bp],
+               'rotSkyPos': rot_sky_pos[ii], 'rotTelPos': rot_tel_pos[ii],
+               'lst': 1.0, 'altitude': 1.1, 'azimuth': 3.0,
+               'dist2Moon': 2.0, 'solarElong': 2.0,
+               'moonRA': 0.5, 'moonDec': 0.1, 'moonAlt': -0.5,
+               'moonAZ': 1.0, 'moonPhase': 10.0,
+               'sunAlt': -0.6, 'sunAz': 1.0, 'phaseAngle': 2.0,
+               'rScatter': 0.0, 'mieScatter': 0.0, 'moonIllum': 0.1,
+               'moonBright': 0.0, 'darkBright': 100.0,
+               'rawSeeing': 0.7*fwhm_eff[ii], 'wind': 0.0, 'humidity': 0.0,
+               'slewDist': 0.0, 'slewTime': 4.0,
+               'fiveSigmaDepth': m5[bp],
+               'ditheredRA': np.radians(dith_ra[ii]),
+               'ditheredDec': np.radians(dith_dec[ii]),
+               'descDitheredRA': np.radians(dith_ra[ii]),
+               'descDitheredDec': np.radians(dith_dec[ii]),
+               'descDitheredRotTelPos': rot_tel_pos[ii]}
+        vals.append(tuple(row[name] if isinstance(row[name], (int, str))
+                          else float(row[name]) for name, _ in columns))
+
+    with sqlite3.connect(file_name) as conn:
+        cursor = conn.cursor()
+        cursor.execute('CREATE TABLE Summary (%s)' %
+                       ', '.join('%s %s' % cc for cc in columns))
+        cursor.executemany('INSERT INTO Summary VALUES(%s)' %
+                           ','.join(['?']*len(columns)), vals)
+        cursor.execute('CREATE INDEX obsHistID_index ON Summary (obsHistID)')
+        conn.commit()
+    return [int(obs) for obs in obsHistID]
+
+
+def make_fixtures(out_dir, n_galaxies=100000, n_stars=20000, n_sne=2000,
+                  agn_fraction=0.02, n_visits=12, ra0=55.0, dec0=-29.0,
+                  radius=2.5, mjd_start=59580.0, seed=6712):
+    """
+    Write a complete set of synthetic inputs covering a patch of
+    sky of the given radius (degrees) about (ra0, dec0) to out_dir,
+    along with 'fixtures.json', a manifest of the files written.
+
+    Returns the manifest as a dict with keys 'descqa_catalog' (the
+    yaml config), 'sed_lookup_dir', 'agn_db', 'sne_db', 'star_db',
+    'opsim_db', 'obsHistID' and the parameters used.
+    """
+    if os.path.exists(os.path.join(out_dir, 'fixtures.json')):
+        raise RuntimeError('%s already holds fixtures' % out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+
+    yaml_name, gal = write_mock_catalog(out_dir, rng, n_galaxies,
+                                        ra0, dec0, radius)
+    sed_lookup_dir = os.path.join(out_dir, 'sed_lookup')
+    write_sed_fit_files(sed_lookup_dir, rng, gal)
+
+    obsHistID = write_opsim_db(os.path.join(out_dir, 'opsim.db'), rng,
+                               n_visits, ra0, dec0, mjd_start)
+    mjd_end = mjd_start + 40.0*n_visits/86400.0
+
+    write_agn_db(os.path.join(out_dir, 'agn_params.db'), rng, gal,
+                 agn_fraction)
+    write_sne_db(os.path.join(out_dir, 'sne_params.db'), rng, gal, n_sne,
+                 mjd_start, mjd_end)
+    write_star_db(os.path.join(out_dir, 'stars.db'), rng, n_stars,
+                  ra0, dec0, radius)
+
+    manifest = {'descqa_catalog': os.path.abspath(yaml_name),
+                'sed_lookup_dir': os.path.abspath(sed_lookup_dir),
+                'agn_db': os.path.abspath(os.path.join(out_dir, 'agn_params.db')),
+                'sne_db': os.path.abspath(os.path.join(out_dir, 'sne_params.db')),
+                'star_db': os.path.abspath(os.path.join(out_dir, 'stars.db')),
+                'opsim_db': os.path.abspath(os.path.join(out_dir, 'opsim.db')),
+                'obsHistID': obsHistID,
+                'healpix': sorted(int(hp) for hp in np.unique(gal['healpix_pixel'])),
+                'n_galaxies': n_galaxies, 'n_stars': n_stars, 'n_sne': n_sne,
+                'agn_fraction': agn_fraction, 'ra0': ra0, 'dec0': dec0,
+                'radius': radius, 'mjd_start': mjd_start, 'seed': seed}
+
+    with open(os.path.join(out_dir, 'fixtures.json'), 'w') as out_file:
+        json.dump(manifest, out_file, indent=2)
+    return manifest
@@ -0,0 +1,113 @@
+"""
+A GCR reader for the small healpix-partitioned mock galaxy catalogs
+written by synthetic.fixtures.write_mock_catalog.  It exposes the
+cosmoDC2 quantities that DESCQAObject and the InstanceCatalog classes
+read, so the galaxy code paths can be run without cosmoDC2.
+"""
+import os
+import re
+import numpy as np
+import h5py
+
+_GCR_IS_AVAILABLE = True
+try:
+    from GCR import BaseGenericCatalog
+except ImportError:
+    _GCR_IS_AVAILABLE = False
+    BaseGenericCatalog = object
+
+__all__ = ["MockHealpixCatalog", "mock_galaxy_quantities"]
+
+
+# the quantities written to every healpixel file of a mock catalog
+# and their dtypes
+mock_galaxy_quantities = (('galaxy_id', np.int64),
+                          ('ra', np.float64),
+                          ('dec', np.float64),
+                          ('redshift', np.float64),
+                          ('redshift_true', np.float64),
+                          ('shear_1', np.float64),
+                          ('shear_2_phosim', np.float64),
+                          ('convergence', np.float64),
+                          ('position_angle_true', np.float64),
+                          ('size_disk_true', np.float32),
+                          ('size_minor_disk_true', np.float32),
+                          ('size_bulge_true', np.float32),
+                          ('size_minor_bulge_true', np.float32),
+                          ('sersic_disk', np.float32),
+                          ('sersic_bulge', np.float32),
+                          ('stellar_mass_disk', np.float32),
+                          ('stellar_mass_bulge', np.float32),
+                          ('knots_flux_ratio', np.float32),
+                          ('n_knots', np.float32),
+                          ('mag_true_i_lsst', np.float32),
+                          ('mag_u_lsst', np.float32),
+                          ('mag_g_lsst', np.float32),
+                          ('mag_r_lsst', np.float32),
+                          ('mag_i_lsst', np.float32),
+                          ('mag_z_lsst', np.float32),
+                          ('mag_y_lsst', np.float32))
+
+
+def _arcsec2rad(x):
+    return np.radians(x/3600.0)
+
+
+class MockHealpixCatalog(BaseGenericCatalog):
+    """
+    GCR reader for a directory of HDF5 files, one per nside=32
+    healpixel, each holding one flat dataset per quantity.
+
+    Config entries
+    --------------
+    catalog_root_dir: the directory holding the files
+    filename_pattern: regular expression matching the file names whose
+        first group is the healpixel (default
+        'mock_galaxies_healpix_(\\d+).hdf5')
+    """
+    _native_filter_quantities = {'healpix_pixel'}
+
+    def _subclass_init(self, catalog_root_dir, filename_pattern=None, **kwargs):
+        if not _GCR_IS_AVAILABLE:
+            raise RuntimeError("You cannot use MockHealpixCatalog\n"
+                               "You do not have *GCR* installed and setup")
+        if not os.path.isdir(catalog_root_dir):
+            raise RuntimeError('%s is not a directory' % catalog_root_dir)
+
+        if filename_pattern is None:
+            filename_pattern = r'mock_galaxies_healpix_(\d+).hdf5'
+        file_re = re.compile(filename_pattern)
+
+        self._healpix_files = {}
+        for file_name in sorted(os.listdir(catalog_root_dir)):
+            match = file_re.match(file_name)
+            if match is not None:
+                self._healpix_files[int(match.group(1))] = \
+                    os.path.join(catalog_root_dir, file_name)
+
+        if len(self._healpix_files) == 0:
+            raise RuntimeError('No files matching %s in %s'
+                               % (filename_pattern, catalog_root_dir))
+
+        # alias every native quantity to itself so that DESCQAObject can
+        # copy its modifier onto the names CatSim expects; the knots
+        # quantities are those DESCQAObject._transform_knots adds to
+        # the composite cosmoDC2 catalogs
+        self._quantity_modifiers = {name: name
+                                    for name in self._generate_native_quantity_list()}
+        self._quantity_modifiers['sindex::knots'] = 'n_knots'
+        self._quantity_modifiers['majorAxis::knots'] = (_arcsec2rad, 'size_disk_true')
+        self._quantity_modifiers['minorAxis::knots'] = (_arcsec2rad, 'size_minor_disk_true')
+
+    def _generate_native_quantity_list(self):
+        file_name = self._healpix_files[min(self._healpix_files)]
+        with h5py.File(file_name, 'r') as data:
+            return list(data.keys())
+
+    def _iter_native_dataset(self, native_filters=None):
+        for hp in sorted(self._healpix_files):
+            if (native_filters is not None and
+                    not native_filters.check_scalar({'healpix_pixel': hp})):
+                continue
+            with h5py.File(self._healpix_files[hp], 'r') as data:
+                yield lambda name: data[name][()]
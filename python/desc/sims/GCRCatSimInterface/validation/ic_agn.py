@@ -9,6 +9,7 @@ from GCR import GCRQuery
 import healpy
 
 from lsst.sims.catUtils.mixins import ExtraGalacticVariabilityModels
+from desc.sims.GCRCatSimInterface import HtmRangePlan
 
 import argparse
 
@@ -101,9 +102,14 @@ def validate_agn_mags(cat_dir, obsid, agn_db,
     agn_gid = []
     agn_magnorm = []
     agn_varParamStr = []
+    # only read the AGN in the trixels overlapping the pointing
+    htm_plan = HtmRangePlan.from_circle(np.degrees(pointing_ra),
+                                        np.degrees(pointing_dec), 2.2, 8)
     with sqlite3.connect(agn_db) as agn_params_conn:
         agn_params_cursor = agn_params_conn.cursor()
-        query = 'SELECT galaxy_id, magNorm, varParamStr FROM agn_params'
+        htm_plan.load(agn_params_cursor)
+        query = 'SELECT galaxy_id, magNorm, varParamStr '
+        query += 'FROM %s' % htm_plan.join('agn_params', 'htmid_8')
         agn_query = agn_params_cursor.execute(query)
         agn_chunk = agn_query.fetchmany(size=chunk_size)
         while len(agn_chunk)>0:
@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from desc.sims.GCRCatSimInterface.benchmarks import time_benchmark
+from desc.sims.GCRCatSimInterface.benchmarks import run_benchmarks
+from desc.sims.GCRCatSimInterface.benchmarks import write_results
+from desc.sims.GCRCatSimInterface.benchmarks import read_results
+from desc.sims.GCRCatSimInterface.benchmarks import compare_results
+
+
+class BenchmarkTimingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='benchmarks')
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_time_benchmark(self):
+        """
+        Verify that setup is called once and func repeat times
+        """
+        calls = {'setup': 0, 'func': 0}
+
+        def setup():
+            calls['setup'] += 1
+
+            def func():
+                calls['func'] += 1
+            return func, 10
+        result = time_benchmark(setup, repeat=4)
+        self.assertEqual(calls, {'setup': 1, 'func': 4})
+        self.assertEqual(result['n_items'], 10)
+        self.assertLessEqual(result['min'], result['mean'])
+
+    def test_round_trip_and_compare(self):
+        """
+        Write results, read them back and compare against a baseline
+        """
+        def make_setup(n_items):
+            def setup():
+                return (lambda: sum(range(1000))), n_items
+            return setup
+
+        results = run_benchmarks({'a': make_setup(5), 'b': make_setup(7)},
+                                 repeat=2, verbose=False)
+        file_name = os.path.join(self.out_dir, 'results.json')
+        write_results(results, file_name)
+        self.assertEqual(read_results(file_name)['benchmarks'],
+                         results['benchmarks'])
+
+        with self.assertRaises(RuntimeError):
+            run_benchmarks({'a': make_setup(5)}, names=['c'], verbose=False)
+
+        baseline = {'benchmarks': {'a': {'min': 1.0, 'n_items': 10},
+                                   'b': {'min': 1.0, 'n_items': 10},
+                                   'c': {'min': 1.0, 'n_items': 10},
+                                   'd': {'min': 1.0, 'n_items': 10}}}
+        current = {'benchmarks': {'a': {'min': 1.5, 'n_items': 10},
+                                  'b': {'min': 1.1, 'n_items': 10},
+                                  'c': {'min': 1.0, 'n_items': 20},
+                                  'e': {'min': 1.0, 'n_items': 10}}}
+        comparison = compare_results(baseline, current, threshold=0.2)
+        self.assertEqual([cc[0] for cc in comparison], ['a', 'b', 'c'])
+        self.assertEqual([cc[4] for cc in comparison],
+                         ['REGRESSION', '', 'improved'])
+        self.assertAlmostEqual(comparison[0][3], 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
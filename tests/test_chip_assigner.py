@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+
+from lsst.sims.utils import ObservationMetaData
+from lsst.sims.coordUtils import chipNameFromRaDecLSST
+from desc.sims.GCRCatSimInterface import ChipAssigner
+
+
+class ChipAssignerTestCase(unittest.TestCase):
+
+    def test_chip_names(self):
+        rng = np.random.RandomState(6512)
+        n_obj = 5000
+        ra = 55.0 + rng.uniform(-2.5, 2.5, size=n_obj)/np.cos(np.radians(30.0))
+        dec = -30.0 + rng.uniform(-2.5, 2.5, size=n_obj)
+        object_id = rng.permutation(n_obj)*3
+
+        obs_md_list = [ObservationMetaData(pointingRA=55.0, pointingDec=-30.0,
+                                           rotSkyPos=rot, mjd=60000.0+rot/100.0)
+                       for rot in (12.0, 83.0)]
+        obsHistID_list = [11, 12]
+
+        assigner = ChipAssigner()
+        for obs_md, obsHistID in zip(obs_md_list, obsHistID_list):
+            control = chipNameFromRaDecLSST(ra, dec, obs_metadata=obs_md).astype(str)
+            chip_names = assigner.chip_names(object_id, ra, dec, obs_md,
+                                             obsHistID=obsHistID)
+            np.testing.assert_array_equal(chip_names, control)
+
+            # the cached results, in a different order and mixed with
+            # objects not seen before
+            subset = rng.choice(n_obj, size=1000, replace=False)
+            new_ra = np.append(ra[subset], [55.0, 60.0])
+            new_dec = np.append(dec[subset], [-30.0, -30.0])
+            new_id = np.append(object_id[subset], [-1, -2])
+            chip_names = assigner.chip_names(new_id, new_ra, new_dec, obs_md,
+                                             obsHistID=obsHistID)
+            np.testing.assert_array_equal(chip_names[:-2], control[subset])
+            self.assertNotEqual(chip_names[-2], 'None')
+            self.assertEqual(chip_names[-1], 'None')
+
+        mask = assigner.on_chip_visits(object_id, ra, dec, obs_md_list,
+                                       obsHistID_list)
+        self.assertEqual(mask.shape, (n_obj, 2))
+        self.assertTrue(mask.any())
+        self.assertFalse(mask.all())
+
+        # only the most recent visits are remembered
+        assigner = ChipAssigner(max_visits=1)
+        for obs_md, obsHistID in zip(obs_md_list, obsHistID_list):
+            assigner.chip_names(object_id, ra, dec, obs_md, obsHistID=obsHistID)
+        self.assertEqual(list(assigner._chip_cache.keys()), [12])
+        self.assertEqual(list(assigner._center_cache.keys()), [12])
+
+        # nothing is remembered without the cache
+        assigner = ChipAssigner(cache=False)
+        np.testing.assert_array_equal(assigner.on_chip(object_id, ra, dec,
+                                                       obs_md_list[0],
+                                                       obsHistID=11),
+                                      mask[:, 0])
+        self.assertEqual(len(assigner._chip_cache), 0)
+        self.assertEqual(len(assigner._center_cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
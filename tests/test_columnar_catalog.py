@@ -0,0 +1,86 @@
+import unittest
+import os
+import tempfile
+import shutil
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import write_columnar_chunk
+from desc.sims.GCRCatSimInterface import read_columnar_catalog
+from desc.sims.GCRCatSimInterface import columnar_to_phosim_text
+
+
+class ColumnarCatalogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='columnar_catalog')
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_round_trip(self):
+        """
+        Write a catalog in two chunks; verify that the arrays read back
+        match and that the regenerated text is identical to what the
+        template would have produced directly.
+        """
+        rng = np.random.RandomState(88)
+        names = ['prefix', 'uniqueId', 'raPhoSim', 'sedFilepath', 'magNorm']
+        template = '%s %d %.17g %s %.9g\n'
+        header = '# prefix uniqueId raPhoSim sedFilepath magNorm\n'
+        h5_name = os.path.join(self.out_dir, 'cat.txt.h5')
+        expected_text = header
+        chunks = []
+        for i_chunk, n_rows in enumerate((7, 12)):
+            cols = [np.array(['object']*n_rows),
+                    rng.randint(0, 1000000, size=n_rows),
+                    rng.random_sample(n_rows)*360.0,
+                    np.array(['sed_%d.txt' % ii for ii in range(n_rows)]),
+                    rng.random_sample(n_rows)*10.0+15.0]
+            chunks.append(cols)
+            expected_text += ''.join(template % line for line in zip(*cols))
+            write_columnar_chunk(h5_name, names, cols, template,
+                                 write_mode='w' if i_chunk == 0 else 'a',
+                                 header=header)
+
+        data = read_columnar_catalog(h5_name)
+        self.assertEqual(list(data.keys()), names)
+        for i_name, name in enumerate(names):
+            expected = np.concatenate([cc[i_name] for cc in chunks])
+            np.testing.assert_array_equal(data[name], expected)
+        self.assertEqual(data['uniqueId'].dtype, chunks[0][1].dtype)
+
+        text_name = os.path.join(self.out_dir, 'cat.txt')
+        self.assertEqual(columnar_to_phosim_text(h5_name, text_name,
+                                                 chunk_size=5), 19)
+        with open(text_name, 'r') as in_file:
+            self.assertEqual(in_file.read(), expected_text)
+
+    def test_object_columns(self):
+        """
+        Object columns are only stored as numbers when the template
+        formats them as numbers; '%s' columns come back verbatim
+        """
+        names = ['prefix', 'id', 'count', 'mag']
+        template = '%s %s %d %.4f\n'
+        cols = [np.array(['object']*4, dtype=object),
+                np.array(['01', '1e5', '123456789012345678901', '7'], dtype=object),
+                np.array([3, 40, 2**40, 7], dtype=object),
+                np.array([20.5, 21.25, 19, 18.125], dtype=object)]
+        expected_text = ''.join(template % line for line in zip(*cols))
+
+        h5_name = os.path.join(self.out_dir, 'obj.txt.h5')
+        write_columnar_chunk(h5_name, names, cols, template, write_mode='w')
+        data = read_columnar_catalog(h5_name)
+        self.assertEqual(list(data['id']), list(cols[1]))
+        self.assertEqual(data['count'].dtype, np.int64)
+        self.assertEqual(data['mag'].dtype, float)
+
+        text_name = os.path.join(self.out_dir, 'obj.txt')
+        columnar_to_phosim_text(h5_name, text_name)
+        with open(text_name, 'r') as in_file:
+            self.assertEqual(in_file.read(), expected_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
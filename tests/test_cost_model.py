@@ -0,0 +1,108 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import VisitCostModel, pack_visits
+from desc.sims.GCRCatSimInterface import plan_catalogs
+from desc.sims.GCRCatSimInterface.synthetic import make_fixtures
+
+
+class CostModelTestCase(unittest.TestCase):
+
+    def test_fit(self):
+        """
+        Verify that VisitCostModel recovers the coefficients used to
+        generate fake measurements, and that measured costs override
+        predictions
+        """
+        rng = np.random.RandomState(5513)
+        features = {}
+        measured = {}
+        for obs_id in range(40):
+            features[obs_id] = {'n_star': rng.randint(10000, 1000000),
+                                'n_gal': rng.randint(1000000, 100000000),
+                                'max_hp': rng.randint(1000000, 20000000),
+                                'n_agn': rng.randint(0, 100000),
+                                'n_sne': rng.randint(0, 1000)}
+            ff = features[obs_id]
+            measured[obs_id] = (100.0 + 3.0e-4*ff['n_star']
+                                + 1.0e-4*ff['n_gal'] + 2.0e-3*ff['n_agn']
+                                + 0.5*ff['n_sne'],
+                                2.0 + 3.0e-7*ff['max_hp'])
+
+        model = VisitCostModel()
+        self.assertEqual(model.fit(features, measured), 40)
+        np.testing.assert_allclose(model.runtime_coeffs,
+                                   [100.0, 3.0e-4, 1.0e-4, 2.0e-3, 0.5],
+                                   rtol=1.0e-6)
+        np.testing.assert_allclose(model.memory_coeffs, [2.0, 3.0e-7],
+                                   rtol=1.0e-6)
+
+        costs = model.predict(features, measured={3: (1.0, 2.0)})
+        self.assertEqual(costs[3], (1.0, 2.0))
+        self.assertAlmostEqual(costs[4][0], measured[4][0], 6)
+
+    def test_pack_visits(self):
+        """
+        Verify that the bins balance runtime and respect the
+        memory limit
+        """
+        costs = {1: (10.0, 5.0), 2: (9.0, 5.0), 3: (5.0, 1.0),
+                 4: (4.0, 1.0), 5: (1.0, 1.0), 6: (1.0, 1.0)}
+        bins = pack_visits(costs, 2)
+        self.assertEqual(sorted(sum([bb['obsHistID'] for bb in bins], [])),
+                         sorted(costs.keys()))
+        runtimes = sorted(bb['runtime'] for bb in bins)
+        self.assertEqual(runtimes, [15.0, 15.0])
+
+        # with two visits at a time, the two big visits cannot share
+        # a bin under a limit of 8
+        bins = pack_visits(costs, 2, n_parallel=2, max_memory=8.0)
+        for bb in bins:
+            self.assertLessEqual(bb['memory'], 8.0)
+            self.assertFalse(1 in bb['obsHistID'] and 2 in bb['obsHistID'])
+
+    def test_plan_catalogs(self):
+        """
+        Plan the visits of the synthetic fixtures, including one
+        that is not in the OpSim database
+        """
+        out_dir = tempfile.mkdtemp(prefix='plan_catalogs')
+        try:
+            manifest = make_fixtures(out_dir, n_galaxies=2000, n_stars=300,
+                                     n_sne=50, n_visits=3)
+            obs_list = list(manifest['obsHistID'])
+            missing = max(obs_list) + 1000
+            lines, plan = plan_catalogs(manifest['opsim_db'],
+                                        obs_list + [missing],
+                                        healpix_counts={},
+                                        agn_db=manifest['agn_db'],
+                                        sne_db=manifest['sne_db'],
+                                        star_db=manifest['star_db'])
+
+            self.assertEqual(sorted(plan.keys()), sorted(obs_list))
+            self.assertEqual(len(lines), len(obs_list) + 3)
+            self.assertEqual(lines[0].split()[0], 'obsHistID')
+            self.assertEqual(lines[-2], '%12d skipped: not in %s'
+                             % (missing, manifest['opsim_db']))
+            for line, obs_id in zip(lines[1:-2], sorted(obs_list)):
+                fields = line.split()
+                self.assertEqual(int(fields[0]), obs_id)
+                self.assertEqual(int(fields[1]), plan[obs_id]['n_star'])
+                self.assertEqual(int(fields[3]), plan[obs_id]['n_agn'])
+                self.assertEqual(int(fields[4]), plan[obs_id]['n_sne'])
+            self.assertGreater(sum(pp['n_star'] for pp in plan.values()), 0)
+            self.assertTrue(lines[-1].startswith('total: %d visits;' % len(obs_list)))
+
+            lines, plan = plan_catalogs(manifest['opsim_db'], [missing])
+            self.assertEqual(plan, {})
+            self.assertEqual(lines[-1], 'total: no visits planned')
+        finally:
+            if os.path.exists(out_dir):
+                shutil.rmtree(out_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
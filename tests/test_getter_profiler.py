@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from desc.sims.GCRCatSimInterface import getter_profile, profile_getters
+from desc.sims.GCRCatSimInterface import profile_section
+
+
+class DummyCatalog(object):
+    """
+    Stands in for an InstanceCatalog; get_b calls get_a the way
+    getters call column_by_name
+    """
+    def __init__(self, n_rows):
+        self._current_chunk = list(range(n_rows))
+
+    def get_a(self):
+        return [1]*len(self._current_chunk)
+
+    def get_b(self):
+        return self.get_a()
+
+
+class DummySubCatalog(DummyCatalog):
+    pass
+
+
+class GetterProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='getter_profiler')
+        self.was_enabled = getter_profile.enabled
+        getter_profile.reset()
+
+    def tearDown(self):
+        getter_profile.enabled = self.was_enabled
+        getter_profile.reset()
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_profile_getters(self):
+        profile_getters(DummyCatalog, DummySubCatalog)
+        # the sub-class inherits the wrapped getters rather than
+        # wrapping them again
+        self.assertIs(DummySubCatalog.get_a, DummyCatalog.get_a)
+
+        getter_profile.enabled = False
+        DummyCatalog(5).get_b()
+        self.assertEqual(getter_profile._stats, {})
+
+        getter_profile.enabled = True
+        DummyCatalog(5).get_b()
+        DummySubCatalog(7).get_a()
+        with profile_section('DummyIterator', 'load:a', n_rows=3):
+            pass
+
+        stats = getter_profile._stats
+        self.assertEqual(stats[('DummyCatalog', 'a')][:2], [1, 5])
+        self.assertEqual(stats[('DummyCatalog', 'b')][:2], [1, 5])
+        self.assertEqual(stats[('DummySubCatalog', 'a')][:2], [1, 7])
+        self.assertEqual(stats[('DummyIterator', 'load:a')][:2], [1, 3])
+        # self time of get_b excludes the time spent in get_a
+        b_stats = stats[('DummyCatalog', 'b')]
+        self.assertAlmostEqual(b_stats[3],
+                               b_stats[2] - stats[('DummyCatalog', 'a')][2])
+
+        file_name = os.path.join(self.out_dir, 'profile.txt')
+        getter_profile.write(file_name)
+        with open(file_name, 'r') as in_file:
+            lines = in_file.readlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith('# class'))
+
+
+if __name__ == "__main__":
+    unittest.main()
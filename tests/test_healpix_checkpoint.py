@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from desc.sims.GCRCatSimInterface import HealpixCheckpoint
+
+
+class HealpixCheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='healpix_checkpoint')
+        self.cat_name = os.path.join(self.out_dir, 'disk_gal_cat_5.txt')
+        self.checkpoint_name = os.path.join(self.out_dir, 'checkpoint.json')
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_resume(self):
+        """
+        Simulate a job that dies partway through a healpixel and
+        verify that the resumed job truncates back to the last
+        completed healpixel
+        """
+        checkpoint = HealpixCheckpoint(self.checkpoint_name, self.cat_name)
+        self.assertEqual(checkpoint.prepare_output(), 'w')
+        with open(self.cat_name, 'w') as out_file:
+            checkpoint.commit(out_file)  # nothing pending; no-op
+            out_file.write('object 1\nobject 2\n')
+            checkpoint.healpixel_finished(10)
+            checkpoint.commit(out_file)
+            out_file.write('object 3\n')
+            checkpoint.healpixel_finished(11)
+            checkpoint.commit(out_file)
+            out_file.write('object 4 (partial healpixel 12)\n')
+
+        resumed = HealpixCheckpoint(self.checkpoint_name, self.cat_name)
+        self.assertEqual(resumed.completed, [10, 11])
+        self.assertEqual(resumed.prepare_output(), 'a')
+        with open(self.cat_name, 'r') as in_file:
+            self.assertEqual(in_file.read(), 'object 1\nobject 2\nobject 3\n')
+
+        resumed.remove()
+        self.assertFalse(os.path.exists(self.checkpoint_name))
+
+    def test_other_output(self):
+        """
+        Test that a checkpoint for a different file is ignored
+        """
+        checkpoint = HealpixCheckpoint(self.checkpoint_name, self.cat_name)
+        with open(self.cat_name, 'w') as out_file:
+            out_file.write('object 1\n')
+            checkpoint.healpixel_finished(10)
+            checkpoint.commit(out_file)
+
+        other = HealpixCheckpoint(self.checkpoint_name,
+                                  os.path.join(self.out_dir, 'bulge.txt'))
+        self.assertEqual(other.completed, [])
+        self.assertEqual(other.prepare_output(), 'w')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sqlite3
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import HtmRangePlan
+from desc.sims.GCRCatSimInterface import merge_htm_ranges, coarsen_htm_ranges
+
+
+class DummyHalfSpace(object):
+    """
+    Stands in for an lsst.sims.utils.HalfSpace with known trixels
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+
+    def findAllTrixels(self, level):
+        return self.bounds
+
+
+class HtmQueryPlannerTestCase(unittest.TestCase):
+
+    def test_merge_and_coarsen(self):
+        bounds = [[20, 25], [3, 3], [4, 8], [30, 30], [22, 27], [40, 41]]
+        merged = merge_htm_ranges(bounds)
+        np.testing.assert_array_equal(merged, [[3, 8], [20, 27], [30, 30], [40, 41]])
+        self.assertEqual(len(merge_htm_ranges([])), 0)
+
+        coarse = coarsen_htm_ranges(merged, 2)
+        np.testing.assert_array_equal(coarse, [[3, 8], [20, 41]])
+        np.testing.assert_array_equal(coarsen_htm_ranges(merged, 1), [[3, 41]])
+        np.testing.assert_array_equal(coarsen_htm_ranges(merged, 10), merged)
+        with self.assertRaises(RuntimeError):
+            coarsen_htm_ranges(merged, 0)
+
+    def test_plan(self):
+        bounds = [[20, 25], [3, 3], [4, 8], [30, 30], [40, 41]]
+        plan = HtmRangePlan(DummyHalfSpace(bounds), 6, max_ranges=2)
+        self.assertTrue(plan.is_coarsened)
+        np.testing.assert_array_equal(plan.contains([2, 3, 8, 9, 25, 26, 30, 41, 42]),
+                                      [False, True, True, False, True, False,
+                                       True, True, False])
+
+        rng = np.random.RandomState(7713)
+        htmid = rng.randint(0, 50, size=1000)
+        expected = np.sort(np.arange(1000)[plan.contains(htmid)])
+
+        conn = sqlite3.connect(':memory:')
+        cursor = conn.cursor()
+        cursor.execute('CREATE TABLE objects (id int, htmid_6 int)')
+        cursor.executemany('INSERT INTO objects VALUES (?, ?)',
+                           ((ii, int(hh)) for ii, hh in enumerate(htmid)))
+        cursor.execute('CREATE INDEX htmid_idx ON objects (htmid_6)')
+
+        for max_ranges in (None, 2):
+            plan = HtmRangePlan(DummyHalfSpace(bounds), 6, max_ranges=max_ranges)
+            plan.load(cursor)
+            query = 'SELECT id, htmid_6 FROM %s' % plan.join('objects', 'htmid_6')
+            results = np.array(cursor.execute(query).fetchall())
+            # a coarsened plan returns extra rows; contains() removes them
+            self.assertEqual(len(results) > len(expected), plan.is_coarsened)
+            valid = plan.contains(results[:, 1])
+            np.testing.assert_array_equal(np.sort(results[valid, 0]), expected)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+
+from desc.sims.GCRCatSimInterface import JobJournal, read_journal
+from desc.sims.GCRCatSimInterface import validated_components
+from desc.sims.GCRCatSimInterface import summarize_journal
+from desc.sims.GCRCatSimInterface import InstanceCatalogWriter
+
+
+class JobJournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='job_journal')
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def _write(self, name, lines):
+        file_name = os.path.join(self.out_dir, name)
+        with open(file_name, 'w') as out_file:
+            for line in lines:
+                out_file.write(line + '\n')
+        return file_name
+
+    def test_resume_validation(self):
+        """
+        Test that components are only considered complete if their
+        files are unchanged since they were journaled
+        """
+        journal_name = os.path.join(self.out_dir, 'job_log_00000011.jsonl')
+        journal = JobJournal(journal_name, 11)
+        journal.log_event('start', config={'fov': 2.0})
+        star = self._write('star_cat_11.txt', ['a b c', 'd e f'])
+        bright = self._write('bright_stars_11.txt', ['g h i'])
+        journal.log_component('star', [star, bright], 1.5)
+        disk = self._write('disk_gal_cat_11.txt', ['j k l'])
+        journal.log_component('disk', [disk], 2.5)
+
+        # simulate a job killed while writing an entry
+        with open(journal_name, 'a') as out_file:
+            out_file.write('{"obsHistID": 11, "eve')
+
+        entries = read_journal(journal_name)
+        self.assertEqual(len(entries), 4)
+        self.assertEqual(entries[1]['rows'], 2)
+        self.assertEqual(entries[1]['bytes'], os.path.getsize(star))
+
+        valid = validated_components(journal_name)
+        self.assertEqual(set(valid.keys()), {'star', 'disk'})
+        self.assertEqual(len(valid['star']), 2)
+
+        # modify a file without changing its size
+        self._write('bright_stars_11.txt', ['g h j'])
+        valid = validated_components(journal_name)
+        self.assertEqual(set(valid.keys()), {'disk'})
+        valid = validated_components(journal_name, verify_checksum=False)
+        self.assertEqual(set(valid.keys()), {'star', 'disk'})
+
+        os.unlink(disk)
+        valid = validated_components(journal_name, verify_checksum=False)
+        self.assertEqual(set(valid.keys()), {'star'})
+
+    def test_summary(self):
+        journal_name = os.path.join(self.out_dir, 'job_log_00000012.jsonl')
+        journal = JobJournal(journal_name, 12)
+        journal.log_event('start')
+        star = self._write('star_cat_12.txt', ['a', 'b', 'c'])
+        journal.log_component('star', [star], 1.0)
+        summary = summarize_journal(journal_name)
+        self.assertFalse(summary['finished'])
+        self.assertEqual(summary['obsHistID'], 12)
+        self.assertEqual(summary['total_rows'], 3)
+        journal.log_event('done')
+        summary = summarize_journal(journal_name)
+        self.assertTrue(summary['finished'])
+        self.assertEqual(summary['components']['star']['bytes'],
+                         os.path.getsize(star))
+
+        with open(journal_name, 'r') as in_file:
+            for line in in_file:
+                self.assertIn('event', json.loads(line))
+
+    def test_resume_elsewhere(self):
+        """
+        Test that a component resumed into another directory keeps its
+        subdirectories and is journaled again by the new job
+        """
+        old_dir = os.path.join(self.out_dir, 'old', '00000013')
+        new_dir = os.path.join(self.out_dir, 'new', '00000013')
+        os.makedirs(os.path.join(old_dir, 'Dynamic'))
+        os.makedirs(new_dir)
+        old_journal = os.path.join(self.out_dir, 'old_log_00000013.jsonl')
+        journal = JobJournal(old_journal, 13, root_dir=old_dir)
+        journal.log_event('start')
+        sne_names = ['sne_cat_13.txt', os.path.join('Dynamic', 'specFileSN_1_60000.0000_r.dat')]
+        for name in sne_names:
+            with open(os.path.join(old_dir, name), 'w') as out_file:
+                out_file.write('%s\n' % name)
+        journal.log_component('sne', [os.path.join(old_dir, name)
+                                      for name in sne_names], 3.0)
+        self.assertEqual([entry['relpath'] for entry in read_journal(old_journal)[1:]],
+                         sne_names)
+
+        new_journal = os.path.join(self.out_dir, 'new_log_00000013.jsonl')
+        journal = JobJournal(new_journal, 13, root_dir=new_dir)
+        journal.log_event('start')
+        resumed = validated_components(old_journal)
+        self.assertIsNone(InstanceCatalogWriter._resume_component(resumed, 'star',
+                                                                  new_dir, journal))
+        self.assertEqual(InstanceCatalogWriter._resume_component(resumed, 'sne',
+                                                                 new_dir, journal),
+                         sne_names)
+        for name in sne_names:
+            with open(os.path.join(new_dir, name), 'r') as in_file:
+                self.assertEqual(in_file.read(), '%s\n' % name)
+
+        journal.log_event('done')
+        summary = summarize_journal(new_journal)
+        self.assertTrue(summary['finished'])
+        self.assertEqual(summary['components']['sne']['rows'], 2)
+        self.assertEqual(summary['total_bytes'],
+                         sum(os.path.getsize(os.path.join(old_dir, name))
+                             for name in sne_names))
+        self.assertEqual(set(validated_components(new_journal).keys()), {'sne'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from lsst.sims.catalogs.db import fileDBObject
+from lsst.sims.catalogs.definitions import InstanceCatalog
+from desc.sims.GCRCatSimInterface import format_columns, VectorizedFormatMixin
+
+
+class StockCatalog(InstanceCatalog):
+    column_outputs = ['id', 'raJ2000', 'decJ2000', 'mag', 'sed', 'tag']
+    transformations = {'raJ2000': np.degrees, 'decJ2000': np.degrees}
+    override_formats = {'mag': '%.3f', 'raJ2000': '%.9f'}
+    cannot_be_null = ['bright']
+
+    def get_bright(self):
+        mag = self.column_by_name('mag')
+        return np.where(mag < 22.0, mag, np.NaN)
+
+    def get_tag(self):
+        object_id = self.column_by_name('id')
+        self.tag_lengths.append(len(object_id))
+        return 2*object_id
+
+
+class VectorizedCatalog(VectorizedFormatMixin, StockCatalog):
+    pass
+
+
+class LineFormatterTestCase(unittest.TestCase):
+
+    def test_format_columns(self):
+        """
+        Verify that format_columns reproduces row-by-row formatting
+        with the joined line template
+        """
+        rng = np.random.RandomState(7124)
+        n_rows = 50
+        formats = ['%s', '%d', '%.9f', '%.9g', '%s', '%.4f']
+        cols = [np.array(['object']*n_rows),
+                rng.randint(0, 2**40, size=n_rows),
+                rng.random_sample(n_rows)*360.0,
+                rng.random_sample(n_rows)*1.0e-3,
+                np.array(['galaxySED/Exp.%d.gz' % ii for ii in range(n_rows)]),
+                rng.normal(0.0, 1.0, size=n_rows)]
+
+        for delimiter in (' ', ', '):
+            template = delimiter.join(formats) + '\n'
+            expected = ''.join(template % line for line in zip(*cols))
+            self.assertEqual(format_columns(formats, cols,
+                                            delimiter=delimiter), expected)
+
+        self.assertEqual(format_columns(formats, [cc[:0] for cc in cols]), '')
+
+    def test_write_catalog(self):
+        """
+        Verify that VectorizedFormatMixin writes the same file as
+        InstanceCatalog.write_catalog and does not evaluate the
+        columns of a chunk whose rows were all filtered out
+        """
+        scratch_dir = tempfile.mkdtemp(prefix='line_formatter_')
+        try:
+            rng = np.random.RandomState(2291)
+            n_rows = 100
+            # every object of the first chunk of 20 is too faint
+            mag = np.append(rng.uniform(22.5, 25.0, size=20),
+                            rng.uniform(18.0, 25.0, size=n_rows-20))
+            data_name = os.path.join(scratch_dir, 'objects.txt')
+            with open(data_name, 'w') as out_file:
+                out_file.write('# id raJ2000 decJ2000 mag sed\n')
+                for i_obj in range(n_rows):
+                    out_file.write('%d %.12f %.12f %.6f starSED/sed_%d.gz\n'
+                                   % (i_obj, rng.uniform(0.0, 2.0*np.pi),
+                                      rng.uniform(-1.0, 1.0), mag[i_obj],
+                                      i_obj))
+            dtype = np.dtype([('id', int), ('raJ2000', float),
+                              ('decJ2000', float), ('mag', float),
+                              ('sed', str, 30)])
+            db_obj = fileDBObject(data_name, runtable='test', dtype=dtype,
+                                  idColKey='id')
+
+            contents = []
+            tag_lengths = []
+            for cat_class in (StockCatalog, VectorizedCatalog):
+                cat = cat_class(db_obj)
+                cat.tag_lengths = []
+                cat_name = os.path.join(scratch_dir, '%s.txt' % cat_class.__name__)
+                cat.write_catalog(cat_name, chunk_size=20)
+                with open(cat_name, 'r') as in_file:
+                    contents.append(in_file.read())
+                tag_lengths.append(cat.tag_lengths)
+
+            self.assertEqual(contents[1], contents[0])
+            self.assertEqual(len(contents[0].splitlines()),
+                             1 + (mag < 22.0).sum())
+            self.assertEqual(tag_lengths[1], tag_lengths[0])
+            self.assertNotIn(0, tag_lengths[1])
+        finally:
+            if os.path.exists(scratch_dir):
+                shutil.rmtree(scratch_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
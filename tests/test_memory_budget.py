@@ -0,0 +1,147 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import MemoryBudget
+from desc.sims.GCRCatSimInterface import diskDESCQAObject_protoDC2
+from desc.sims.GCRCatSimInterface import VisitTable, get_obs_md
+from desc.sims.GCRCatSimInterface.synthetic import make_fixtures
+
+_GCR_IS_AVAILABLE = True
+try:
+    from GCR import GCRQuery
+except ImportError:
+    _GCR_IS_AVAILABLE = False
+
+
+class FakeMemoryBudget(MemoryBudget):
+    """
+    MemoryBudget whose resident set size is set by hand
+    """
+    rss = 0.0
+
+    def rss_gb(self):
+        return self.rss
+
+
+class MemoryBudgetTestCase(unittest.TestCase):
+
+    def test_loader_chunk_size(self):
+        """
+        Verify that the chunk size follows the free memory and row size
+        and is clipped to [min_rows, max_rows]
+        """
+        budget = FakeMemoryBudget(10.0, min_rows=100, max_rows=10**8,
+                                  headroom=0.8, overhead=2.0)
+        budget.rss = 4.0
+        self.assertEqual(budget.loader_chunk_size(64),
+                         int(4.0*1024**3/128.0))
+        budget.rss = 7.0
+        self.assertEqual(budget.loader_chunk_size(64),
+                         int(1.0*1024**3/128.0))
+        budget.rss = 9.0
+        self.assertEqual(budget.loader_chunk_size(64), 100)
+        budget.rss = 0.0
+        self.assertEqual(budget.loader_chunk_size(1), 10**8)
+
+    def test_shrink(self):
+        """
+        Verify that the allowed number of rows is halved when a load
+        brings the RSS above the headroom, but never below min_rows
+        """
+        budget = FakeMemoryBudget(10.0, min_rows=1000, max_rows=100000)
+        budget.rss = 1.0
+        self.assertFalse(budget.loaded(100000))
+        self.assertEqual(budget.row_cap, 100000)
+        budget.rss = 9.0
+        self.assertTrue(budget.loaded(100000))
+        self.assertEqual(budget.row_cap, 50000)
+        self.assertTrue(budget.loaded(3000))
+        self.assertEqual(budget.row_cap, 1500)
+        self.assertTrue(budget.loaded(1500))
+        self.assertEqual(budget.row_cap, 1000)
+        self.assertFalse(budget.loaded(1000))
+        self.assertEqual(budget.n_shrinks, 3)
+        budget.rss = 0.0
+        self.assertEqual(budget.loader_chunk_size(8), 1000)
+
+    def test_bad_budget(self):
+        with self.assertRaises(RuntimeError):
+            MemoryBudget(0.0)
+
+
+class BudgetedLoaderTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp(prefix='budgeted_loader')
+        cls.manifest = make_fixtures(cls.out_dir, n_galaxies=5000,
+                                     n_stars=100, n_sne=10, n_visits=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.out_dir):
+            shutil.rmtree(cls.out_dir)
+
+    @unittest.skipIf(not _GCR_IS_AVAILABLE, 'GCR is not installed')
+    def test_healpix_iterator(self):
+        """
+        Verify that DESCQAChunkIterator_healpix under a tight budget
+        returns the same rows as without one, in more loader passes,
+        while reading each quantity only once per healpixel
+        """
+        visit_table = VisitTable.from_opsim(self.manifest['opsim_db'])
+        obs_md = get_obs_md(visit_table, self.manifest['obsHistID'][0],
+                            fov=2, dither=True)
+        db_obj = diskDESCQAObject_protoDC2(self.manifest['descqa_catalog'])
+        db_obj.field_ra = 0.0
+        db_obj.field_dec = 0.0
+        colnames = ['galaxy_id', 'raJ2000', 'decJ2000', 'majorAxis']
+
+        # record which quantities are read while each healpixel is loaded
+        catalog = db_obj._catalog
+        reads = []
+
+        def get_quantities(quantities, *args, **kwargs):
+            if isinstance(quantities, str):
+                reads.append((quantities, db_obj._loaded_healpixel))
+            return type(catalog).get_quantities(catalog, quantities,
+                                                *args, **kwargs)
+
+        catalog.get_quantities = get_quantities
+        try:
+            control = np.concatenate(list(db_obj.query_columns(colnames=colnames,
+                                                               chunk_size=1000,
+                                                               obs_metadata=obs_md)))
+            n_control_reads = len(reads)
+            reads[:] = []
+
+            budget = FakeMemoryBudget(1.0, min_rows=50, max_rows=10**6)
+            budget.rss = 0.9
+            db_obj.memory_budget = budget
+            n_loads = []
+            budget.loaded = lambda n_rows: n_loads.append(n_rows)
+            test = np.concatenate(list(db_obj.query_columns(colnames=colnames,
+                                                            chunk_size=1000,
+                                                            obs_metadata=obs_md)))
+        finally:
+            del catalog.get_quantities
+
+        self.assertGreater(len(control), 0)
+        for name in control.dtype.names:
+            np.testing.assert_array_equal(test[name], control[name])
+
+        self.assertEqual(sum(n_loads), len(control))
+        self.assertTrue(all(nn <= 50 for nn in n_loads))
+        n_healpix = len(set(hp for name, hp in reads))
+        self.assertGreater(len(n_loads), n_healpix)
+
+        # every quantity is read once per healpixel, as without a budget
+        self.assertEqual(len(reads), len(set(reads)))
+        self.assertEqual(len(reads), n_control_reads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+
+from lsst.sims.utils import ObservationMetaData
+from lsst.sims.utils import _getRotSkyPos, _getRotTelPos
+from desc.sims.GCRCatSimInterface import _getRotSkyPosArray
+from desc.sims.GCRCatSimInterface import _getRotTelPosArray
+
+
+class RotationUtilsTestCase(unittest.TestCase):
+
+    def test_against_scalar_versions(self):
+        """
+        The array versions should agree with lsst.sims.utils
+        visit by visit
+        """
+        rng = np.random.RandomState(1123)
+        n_visits = 20
+        ra = rng.uniform(0.0, 2.0*np.pi, size=n_visits)
+        dec = rng.uniform(-0.5*np.pi, 0.1, size=n_visits)
+        mjd = rng.uniform(59580.0, 63230.0, size=n_visits)
+        rot = rng.uniform(0.0, 2.0*np.pi, size=n_visits)
+
+        rot_sky = _getRotSkyPosArray(ra, dec, mjd, rot)
+        rot_tel = _getRotTelPosArray(ra, dec, mjd, rot)
+        for ii in range(n_visits):
+            obs = ObservationMetaData(pointingRA=np.degrees(ra[ii]),
+                                      pointingDec=np.degrees(dec[ii]),
+                                      mjd=mjd[ii])
+            self.assertAlmostEqual(rot_sky[ii],
+                                   _getRotSkyPos(ra[ii], dec[ii], obs, rot[ii]), 10)
+            self.assertAlmostEqual(rot_tel[ii],
+                                   _getRotTelPos(ra[ii], dec[ii], obs, rot[ii]), 10)
+
+        # the two conversions are inverses
+        np.testing.assert_allclose(_getRotTelPosArray(ra, dec, mjd, rot_sky),
+                                   rot % (2.0*np.pi), rtol=0.0, atol=1.0e-10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+from lsst.sims.utils import ObservationMetaData, _appGeoFromICRS
+from lsst.sims.coordUtils import chipNameFromRaDecLSST
+from lsst.sims.coordUtils import pixelCoordsFromRaDecLSST
+from lsst.sims.catUtils.mixins import PhoSimAstrometryBase
+from desc.sims.GCRCatSimInterface import detector_layout, assign_sensors
+from desc.sims.GCRCatSimInterface import sensor_file_name, shard_instance_catalog
+
+
+class SensorShardsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(prefix='sensor_shards_')
+        rng = np.random.RandomState(4417)
+        self.n_obj = 3000
+        self.ra = 55.0 + rng.uniform(-2.0, 2.0, size=self.n_obj)/np.cos(np.radians(30.0))
+        self.dec = -30.0 + rng.uniform(-2.0, 2.0, size=self.n_obj)
+        self.obs_md = ObservationMetaData(pointingRA=55.0, pointingDec=-30.0,
+                                          rotSkyPos=23.0, mjd=60000.0,
+                                          bandpassName='r')
+        self.obs_md.OpsimMetaData = {'obsHistID': 230}
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def count_assignments(self, assignment):
+        n_sensors = np.zeros(self.n_obj, dtype=int)
+        for dexes in assignment.values():
+            n_sensors[dexes] += 1
+        return n_sensors
+
+    def test_assign_sensors(self):
+        """
+        Compare the sensor assignments with chipNameFromRaDecLSST
+        and check that a margin duplicates objects near sensor edges
+        """
+        names, bounds = detector_layout()
+        control = chipNameFromRaDecLSST(self.ra, self.dec,
+                                        obs_metadata=self.obs_md).astype(str)
+        on_science = np.in1d(control, names)
+        self.assertGreater(on_science.sum(), self.n_obj//2)
+
+        assignment = assign_sensors(self.ra, self.dec, self.obs_md)
+        for name, dexes in assignment.items():
+            self.assertIn(name, names)
+            np.testing.assert_array_equal(control[dexes], name)
+        np.testing.assert_array_equal(self.count_assignments(assignment),
+                                      on_science.astype(int))
+
+        margin = 100.0
+        wide = assign_sensors(self.ra, self.dec, self.obs_md, margin=margin)
+        for name, dexes in assignment.items():
+            self.assertTrue(set(dexes).issubset(set(wide[name])))
+        n_sensors = self.count_assignments(wide)
+        self.assertGreater((n_sensors > 1).sum(), 0)
+        self.assertTrue((n_sensors[on_science] >= 1).all())
+
+        # the extra objects are within the margin of the sensor
+        for name, dexes in wide.items():
+            x_min, x_max, y_min, y_max = bounds[np.where(names == name)[0][0]]
+            xpix, ypix = pixelCoordsFromRaDecLSST(self.ra[dexes], self.dec[dexes],
+                                                  chipName=[name]*len(dexes),
+                                                  obs_metadata=self.obs_md)
+            self.assertTrue((xpix >= x_min-margin-0.5).all())
+            self.assertTrue((xpix <= x_max+margin+0.5).all())
+            self.assertTrue((ypix >= y_min-margin-0.5).all())
+            self.assertTrue((ypix <= y_max+margin+0.5).all())
+
+    def test_shard_instance_catalog(self):
+        """
+        Shard a small InstanceCatalog and check the sensor catalogs
+        and the manifest
+        """
+        ra_app, dec_app = _appGeoFromICRS(np.radians(self.ra), np.radians(self.dec),
+                                          mjd=self.obs_md.mjd)
+        ra_pho, dec_pho = PhoSimAstrometryBase._dePrecess(ra_app, dec_app,
+                                                          self.obs_md)
+        ra_pho = np.degrees(ra_pho)
+        dec_pho = np.degrees(dec_pho)
+
+        header_name = os.path.join(self.scratch_dir, 'phosim_cat_230.txt')
+        with open(header_name, 'w') as out_file:
+            out_file.write('rightascension 55.0000000\n')
+            out_file.write('declination -30.0000000\n')
+            out_file.write('obshistid 230\n')
+            out_file.write('includeobj star_cat_230.txt.gz\n')
+
+        # the stars are the even ids, the galaxies the odd ones
+        sed_name = 'starSED/kurucz/km30_5000.fits_g10_5040.gz'
+        object_file_list = []
+        for component, parity in (('star_cat_230.txt', 0), ('gal_cat_230.txt', 1)):
+            file_name = os.path.join(self.scratch_dir, component)
+            with open(file_name, 'w') as out_file:
+                for i_obj in range(parity, self.n_obj, 2):
+                    out_file.write('object %d %.10f %.10f 22.0 %s 0 0 0 0 0 0 '
+                                   'point none CCM 0.0635 3.1\n'
+                                   % (i_obj, ra_pho[i_obj], dec_pho[i_obj], sed_name))
+            object_file_list.append(file_name)
+
+        for margin in (0.0, 100.0):
+            out_dir = os.path.join(self.scratch_dir, 'shards_%d' % margin)
+            manifest_name = shard_instance_catalog(header_name, object_file_list,
+                                                   self.obs_md, out_dir,
+                                                   margin=margin, chunk_size=700)
+            self.assertEqual(manifest_name,
+                             os.path.join(out_dir, 'sensor_manifest_00000230.json'))
+            with open(manifest_name, 'r') as in_file:
+                manifest = json.load(in_file)
+
+            control = assign_sensors(ra_pho, dec_pho, self.obs_md, margin=margin,
+                                     phosim_coords=True)
+            self.assertEqual(manifest['obsHistID'], 230)
+            self.assertEqual(manifest['margin_pixels'], margin)
+            self.assertEqual([ss['sensor'] for ss in manifest['sensors']],
+                             sorted(control.keys()))
+
+            for sensor in manifest['sensors']:
+                name = sensor['sensor']
+                self.assertEqual(sensor['file'], sensor_file_name(name, 230))
+                with open(os.path.join(out_dir, sensor['file']), 'r') as in_file:
+                    lines = in_file.readlines()
+                self.assertEqual(lines[:3], ['rightascension 55.0000000\n',
+                                             'declination -30.0000000\n',
+                                             'obshistid 230\n'])
+                object_id = sorted(int(line.split()[1]) for line in lines[3:])
+                self.assertEqual(object_id, sorted(control[name]))
+
+                n_star = sum(1 for ii in object_id if ii % 2 == 0)
+                self.assertEqual(sensor['rows'], len(object_id))
+                self.assertEqual(sensor['components'],
+                                 {cc: nn for cc, nn in (('star_cat_230.txt', n_star),
+                                                        ('gal_cat_230.txt',
+                                                         len(object_id)-n_star))
+                                  if nn > 0})
+
+            n_sensors = self.count_assignments(control)
+            if margin == 0.0:
+                self.assertTrue((n_sensors <= 1).all())
+            else:
+                self.assertGreater((n_sensors > 1).sum(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from lsst.sims.photUtils import Bandpass, Sed
+from lsst.sims.catUtils.supernovae import SNObject
+from desc.sims.GCRCatSimInterface import SNSedWriter
+from desc.sims.GCRCatSimInterface import read_sn_sed_archive, extract_sn_sed_archive
+
+
+class SNSedWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(prefix='sn_sed_writer_')
+        self.snid = np.array(['MS_1_0', 'MS_1_1', 'MS_2_0', 'MS_2_1', 'MS_3_0'])
+        self.t0 = np.array([60000.0, 60010.0, np.NaN, 59990.0, 59500.0])
+        self.x0 = np.array([1.0e-5, 2.0e-6, 1.0e-5, 4.0e-6, 1.0e-5])
+        self.x1 = np.array([0.5, -1.0, 0.0, 1.5, 0.0])
+        self.c = np.array([0.05, -0.1, 0.0, 0.2, 0.0])
+        self.z = np.array([0.3, 0.9, 0.5, 0.1, 0.4])
+        self.mjd = 60005.0
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_against_snobject(self):
+        """
+        Compare the spectra, magNorms and file names with those of
+        SNObject.SNObjectSourceSED, as PhoSimCatalogSN computes them
+        """
+        writer = SNSedWriter()
+        prefix = os.path.join(self.scratch_dir, 'specFileSN_')
+        names, mag_norm = writer.write(prefix, self.snid, self.mjd, 'r',
+                                       self.t0, self.x0, self.x1, self.c, self.z)
+
+        # no parameters, and a phase beyond the model
+        self.assertEqual(names[2], 'None')
+        self.assertTrue(np.isnan(mag_norm[2]))
+        self.assertEqual(names[4], 'None')
+        self.assertTrue(np.isnan(mag_norm[4]))
+
+        imsim_bp = Bandpass()
+        imsim_bp.imsimBandpass()
+        for i_sn in (0, 1, 3):
+            self.assertEqual(names[i_sn], '%s%s_%.4f_r.dat' % (prefix, self.snid[i_sn],
+                                                              self.mjd))
+            sn_obj = SNObject()
+            sn_obj.rectifySED = True
+            sn_obj.set(t0=self.t0[i_sn], x0=self.x0[i_sn], x1=self.x1[i_sn],
+                       c=self.c[i_sn], z=self.z[i_sn])
+            control = sn_obj.SNObjectSourceSED(time=self.mjd)
+            self.assertAlmostEqual(mag_norm[i_sn], control.calcMag(imsim_bp), 6)
+
+            sed = Sed()
+            sed.readSED_flambda(names[i_sn])
+            np.testing.assert_array_equal(sed.wavelen, control.wavelen)
+            np.testing.assert_allclose(sed.flambda, control.flambda,
+                                       rtol=1.0e-6, atol=1.0e-6*control.flambda.max())
+
+        self.assertEqual(SNSedWriter.file_names('x_', [541], 59580.13961, 'g')[0],
+                         'x_541_59580.1396_g.dat')
+
+    def test_archive(self):
+        file_dir = os.path.join(self.scratch_dir, 'files')
+        archive_dir = os.path.join(self.scratch_dir, 'archive')
+        os.makedirs(file_dir)
+        os.makedirs(archive_dir)
+        names = SNSedWriter().write(os.path.join(file_dir, 'specFileSN_'),
+                                    self.snid, self.mjd, 'r', self.t0,
+                                    self.x0, self.x1, self.c, self.z)[0]
+
+        writer = SNSedWriter(archive=True)
+        archive_names = writer.write(os.path.join(archive_dir, 'specFileSN_'),
+                                     self.snid, self.mjd, 'r', self.t0,
+                                     self.x0, self.x1, self.c, self.z)[0]
+        self.assertEqual(sorted(os.listdir(archive_dir)),
+                         sorted([writer.archive_name, writer.index_name]))
+        has_flux = archive_names != 'None'
+        self.assertEqual(list(read_sn_sed_archive(archive_dir).keys()),
+                         [os.path.basename(name) for name in archive_names[has_flux]])
+
+        with open(names[1], 'r') as in_file:
+            self.assertEqual(read_sn_sed_archive(archive_dir,
+                                                 os.path.basename(names[1])),
+                             in_file.read())
+
+        self.assertEqual(extract_sn_sed_archive(archive_dir), has_flux.sum())
+        for name, archive_name in zip(names[has_flux], archive_names[has_flux]):
+            with open(name, 'r') as in_file:
+                with open(archive_name, 'r') as archive_file:
+                    self.assertEqual(in_file.read(), archive_file.read())
+
+        writer.clear_archive(archive_dir)
+        self.assertEqual(writer.archive_files(archive_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
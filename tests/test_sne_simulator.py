@@ -0,0 +1,84 @@
+import unittest
+import json
+import numpy as np
+
+from lsst.sims.photUtils import BandpassDict
+from lsst.sims.catUtils.supernovae import SNObject
+from desc.sims.GCRCatSimInterface.TruthCatalogLC import SneSimulator
+from desc.sims.GCRCatSimInterface.TruthCatalogLC import _pointings_by_htmid
+
+
+class SneSimulatorTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bp_dict = BandpassDict.loadTotalBandpassesFromFiles()
+        sn_params = []
+        for t0, zz, x1, cc in ((60000.0, 0.2, 0.5, 0.0), (60030.0, 0.7, -1.0, 0.1),
+                               (60900.0, 0.4, 0.0, -0.05)):
+            sn_obj = SNObject()
+            sn_obj.set(t0=t0, z=zz, x0=1.0e-5, x1=x1, c=cc)
+            sn_params.append(json.dumps(sn_obj.SNstate))
+        cls.sn_params = np.array(sn_params)
+        rng = np.random.RandomState(88)
+        cls.mjd_arr = np.sort(rng.uniform(59980.0, 60100.0, size=40))
+        cls.filter_arr = rng.randint(0, 6, size=40)
+
+    def reference_mags(self):
+        mags = np.NaN*np.ones((len(self.sn_params), len(self.mjd_arr)))
+        for i_obj, sn_par in enumerate(self.sn_params):
+            sn_obj = SNObject.fromSNState(json.loads(sn_par))
+            for i_time, (mjd, i_filter) in enumerate(zip(self.mjd_arr,
+                                                         self.filter_arr)):
+                if mjd < sn_obj.mintime() or mjd > sn_obj.maxtime():
+                    continue
+                bp = self.bp_dict['ugrizy'[i_filter]]
+                sed = sn_obj.SNObjectSED(mjd, bandpass=bp, applyExtinction=False)
+                ff = sed.calcFlux(bp)
+                if ff > 1.0e-300:
+                    mags[i_obj][i_time] = sed.magFromFlux(ff)
+        return mags
+
+    def test_magnitudes(self):
+        control = self.reference_mags()
+        self.assertTrue(np.isfinite(control).any())
+        self.assertTrue(np.isnan(control[2]).all())
+
+        for n_processes in (1, 2):
+            simulator = SneSimulator(self.bp_dict, n_processes=n_processes,
+                                     batch_size=2)
+            # a second, larger call grows the shared array
+            for n_sne in (2, 3):
+                mags = simulator.calculate_sn_magnitudes(self.sn_params[:n_sne],
+                                                         self.mjd_arr,
+                                                         self.filter_arr)
+                np.testing.assert_array_equal(np.isnan(mags),
+                                              np.isnan(control[:n_sne]))
+                valid = np.isfinite(control[:n_sne])
+                np.testing.assert_allclose(mags[valid], control[:n_sne][valid],
+                                           rtol=0.0, atol=1.0e-10)
+            simulator.close()
+
+
+class PointingsByHtmidTestCase(unittest.TestCase):
+
+    def test_pointings_by_htmid(self):
+        rng = np.random.RandomState(17)
+        htmid_dict = {}
+        for obs in rng.permutation(50)+100:
+            lo = rng.randint(1000, 1200, size=3)
+            htmid_dict[obs] = [[ll, ll+rng.randint(0, 30)] for ll in lo]
+        htmid_list = np.array([990, 1005, 1100, 1150, 1210, 1240, 1100])
+
+        obs_list, ptr, visits = _pointings_by_htmid(htmid_dict, htmid_list)
+        self.assertEqual(len(ptr), len(htmid_list)+1)
+        for i_htmid, htmid in enumerate(htmid_list):
+            control = [obs for obs in htmid_dict
+                       if any(bb[0] <= htmid <= bb[1] for bb in htmid_dict[obs])]
+            self.assertEqual(list(obs_list[visits[ptr[i_htmid]:ptr[i_htmid+1]]]),
+                             control)
+        self.assertEqual(ptr[1], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+
+from lsst.sims.utils import ObservationMetaData, findHtmid
+from desc.sims.GCRCatSimInterface import SNeDBObject
+
+
+class SNeVisibilityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(prefix='sne_visibility_')
+        self.db_name = os.path.join(self.scratch_dir, 'sne.db')
+        rng = np.random.RandomState(4123)
+        n_sne = 200
+        self.mjd = 60000.0
+        self.t0 = rng.uniform(self.mjd-200.0, self.mjd+200.0, size=n_sne)
+        self.z = rng.uniform(0.01, 2.0, size=n_sne)
+        ra = rng.uniform(9.0, 11.0, size=n_sne)
+        dec = rng.uniform(-11.0, -9.0, size=n_sne)
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''CREATE TABLE sne_params (htmid_level_6 int,
+                              galaxy_id int, c_in real, mB real, t0_in real,
+                              x0_in real, x1_in real, z_in real, snid_in text,
+                              snra_in real, sndec_in real)''')
+            cursor.executemany('INSERT INTO sne_params VALUES(?,?,?,?,?,?,?,?,?,?,?)',
+                               [(int(findHtmid(ra[ii], dec[ii], max_level=6)), ii,
+                                 0.0, 20.0, float(self.t0[ii]), 1.0e-5, 0.0,
+                                 float(self.z[ii]), 'sn_%d' % ii,
+                                 float(ra[ii]), float(dec[ii]))
+                                for ii in range(n_sne)])
+            cursor.execute('CREATE INDEX htmid_index ON sne_params (htmid_level_6)')
+            cursor.execute('CREATE INDEX t0_index ON sne_params (t0_in)')
+            conn.commit()
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def _query_ids(self, db_obj, obs):
+        ids = []
+        for chunk in db_obj.query_columns(colnames=['id'], obs_metadata=obs,
+                                          chunk_size=1000):
+            ids += list(chunk['id'])
+        return set(ids)
+
+    def test_visibility_window(self):
+        obs = ObservationMetaData(pointingRA=10.0, pointingDec=-10.0,
+                                  boundType='circle', boundLength=5.0,
+                                  mjd=self.mjd)
+        db_obj = SNeDBObject(self.db_name, table='sne_params', driver='sqlite')
+        self.assertEqual(len(self._query_ids(db_obj, obs)), len(self.t0))
+
+        db_obj.maxTimeSNVisible = 100.0
+        db_obj.maxz = 1.4
+        mjd = obs.mjd.TAI
+        active = ((np.abs(self.t0-mjd) <= 100.0) &
+                  (self.t0 - 20.0*(1.0+self.z) <= mjd) &
+                  (self.t0 + 50.0*(1.0+self.z) >= mjd) &
+                  (self.z <= 1.4))
+        self.assertGreater(active.sum(), 0)
+        self.assertLess(active.sum(), len(self.t0))
+        self.assertEqual(self._query_ids(db_obj, obs),
+                         set('sn_%d' % ii for ii in np.where(active)[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import SqliteBulkWriter
+
+
+class SqliteBulkWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(prefix='sqlite_writer_')
+        self.db_name = os.path.join(self.scratch_dir, 'bulk.db')
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_insert(self):
+        rng = np.random.RandomState(71)
+        obj_id = rng.randint(0, 1000000, size=250)
+        mag = rng.uniform(15.0, 25.0, size=250)
+        name = np.array(['obj_%d' % ii for ii in obj_id])
+
+        with SqliteBulkWriter(self.db_name, transaction_rows=100) as writer:
+            writer.create_table('objects', [('id', 'int'), ('flag', 'int'),
+                                            ('mag', 'float'), ('name', 'text')])
+            writer.add_index('obj_id', 'objects', ['id'], analyze=True)
+            self.assertEqual(writer.insert('objects', [obj_id[:120], 1,
+                                                       mag[:120], name[:120]]),
+                             120)
+            self.assertEqual(writer.insert('objects', {'id': obj_id[120:],
+                                                       'flag': np.int64(2),
+                                                       'mag': mag[120:],
+                                                       'name': list(name[120:])}),
+                             130)
+            with self.assertRaises(RuntimeError):
+                writer.insert('objects', [obj_id, 1, mag])
+            with self.assertRaises(RuntimeError):
+                writer.insert('objects', [obj_id, 1, mag[:5], name])
+
+        self.assertFalse(os.path.exists(self.db_name+'-wal'))
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            rows = cursor.execute('SELECT id, flag, mag, name FROM objects '
+                                  'ORDER BY rowid').fetchall()
+            indexes = cursor.execute("SELECT name FROM sqlite_master "
+                                     "WHERE type='index'").fetchall()
+            journal = cursor.execute('PRAGMA journal_mode').fetchall()
+
+        self.assertEqual(indexes, [('obj_id',)])
+        self.assertEqual(journal, [('delete',)])
+        self.assertEqual(len(rows), len(obj_id))
+        for i_row, row in enumerate(rows):
+            self.assertEqual(row, (obj_id[i_row], 1 if i_row < 120 else 2,
+                                   mag[i_row], name[i_row]))
+            self.assertIsInstance(row[0], int)
+
+    def test_failed_load(self):
+        """
+        Test that a failed load deletes a file the writer created and
+        leaves a file that already existed usable
+        """
+        with self.assertRaises(ValueError):
+            with SqliteBulkWriter(self.db_name, transaction_rows=100) as writer:
+                writer.create_table('objects', [('id', 'int')])
+                writer.add_index('obj_id', 'objects', ['id'])
+                writer.insert('objects', [np.arange(150)])
+                writer.insert('objects', [np.arange(50)])
+                raise ValueError("load failed")
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+
+        with SqliteBulkWriter(self.db_name) as writer:
+            writer.create_table('objects', [('id', 'int')])
+            writer.insert('objects', [np.arange(10)])
+
+        with self.assertRaises(ValueError):
+            with SqliteBulkWriter(self.db_name, transaction_rows=100) as writer:
+                writer.add_index('obj_id', 'objects', ['id'])
+                writer.insert('objects', [np.arange(150)])
+                writer.insert('objects', [np.arange(50)])
+                raise ValueError("load failed")
+
+        self.assertEqual(os.listdir(self.scratch_dir), ['bulk.db'])
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            n_rows = cursor.execute('SELECT COUNT(*) FROM objects').fetchall()
+            indexes = cursor.execute("SELECT name FROM sqlite_master "
+                                     "WHERE type='index'").fetchall()
+            journal = cursor.execute('PRAGMA journal_mode').fetchall()
+
+        # the load is not atomic: the committed transaction is kept
+        self.assertEqual(n_rows, [(160,)])
+        self.assertEqual(indexes, [])
+        self.assertEqual(journal, [('delete',)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import shutil
+import numpy as np
+import h5py
+
+from desc.sims.GCRCatSimInterface.synthetic import make_fixtures
+from desc.sims.GCRCatSimInterface import load_gcr_catalog
+
+_GCR_IS_AVAILABLE = True
+try:
+    from GCR import GCRQuery
+except ImportError:
+    _GCR_IS_AVAILABLE = False
+
+
+class SyntheticFixturesTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.out_dir = tempfile.mkdtemp(prefix='synthetic_fixtures')
+        cls.manifest = make_fixtures(cls.out_dir, n_galaxies=2000,
+                                     n_stars=300, n_sne=50, n_visits=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(cls.out_dir):
+            shutil.rmtree(cls.out_dir)
+
+    def test_sed_lookup(self):
+        """
+        Verify that the SED lookup files cover every galaxy once
+        """
+        galaxy_id = []
+        for hp in self.manifest['healpix']:
+            file_name = os.path.join(self.manifest['sed_lookup_dir'],
+                                     'sed_fit_%d.h5' % hp)
+            with h5py.File(file_name, 'r') as data:
+                galaxy_id.append(data['galaxy_id'][()])
+                self.assertEqual(data['disk_magnorm'].shape,
+                                 (6, len(data['galaxy_id'])))
+        np.testing.assert_array_equal(np.sort(np.concatenate(galaxy_id)),
+                                      np.arange(1, 2001))
+
+    def test_databases(self):
+        """
+        Verify the row counts of the sqlite fixtures
+        """
+        for db_name, table, n_rows in (('agn_db', 'agn_params', 40),
+                                       ('sne_db', 'sne_params', 50),
+                                       ('star_db', 'stars', 300),
+                                       ('opsim_db', 'Summary', 4)):
+            with sqlite3.connect(self.manifest[db_name]) as conn:
+                ct = conn.execute('SELECT COUNT(*) FROM %s' % table).fetchall()
+            self.assertEqual(ct[0][0], n_rows)
+
+    @unittest.skipIf(not _GCR_IS_AVAILABLE, 'GCR is not installed')
+    def test_mock_catalog(self):
+        """
+        Verify that the mock catalog loads from its yaml file and
+        honors the healpix_pixel native filter
+        """
+        cat = load_gcr_catalog(self.manifest['descqa_catalog'])
+        self.assertIn('healpix_pixel', cat._native_filter_quantities)
+        n_total = 0
+        for hp in self.manifest['healpix']:
+            qties = cat.get_quantities(['galaxy_id', 'mag_r_lsst'],
+                                       native_filters=[GCRQuery('healpix_pixel==%d' % hp)])
+            n_total += len(qties['galaxy_id'])
+        self.assertEqual(n_total, 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import os
+import tempfile
+import shutil
+import numpy as np
+import healpy
+
+from lsst.sims.utils import halfSpaceFromRaDec
+from desc.sims.GCRCatSimInterface import VisitTable, VisitIndex
+from desc.sims.GCRCatSimInterface import build_visit_index
+
+
+class VisitIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='visit_index')
+        rng = np.random.RandomState(4411)
+        n_visits = 30
+        self.visit_table = VisitTable({'obsHistID': rng.choice(np.arange(1, 1000),
+                                                               size=n_visits,
+                                                               replace=False),
+                                       'descDitheredRA': np.radians(rng.uniform(50.0, 70.0, size=n_visits)),
+                                       'descDitheredDec': np.radians(rng.uniform(-40.0, -30.0, size=n_visits)),
+                                       'descDitheredRotTelPos': rng.uniform(-1.0, 1.0, size=n_visits),
+                                       'expMJD': rng.uniform(59580.0, 59590.0, size=n_visits),
+                                       'filter': rng.choice(list('ugrizy'), size=n_visits)})
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_visit_index(self):
+        fov = 2.1
+        visit_index = build_visit_index(self.visit_table, fov=fov)
+        self.assertEqual(len(visit_index), len(self.visit_table))
+        np.testing.assert_array_equal(visit_index.obsHistID,
+                                      self.visit_table.obsHistID)
+
+        for obs_id in visit_index.obsHistID:
+            ra = self.visit_table.get('descDitheredRA', obs_id)
+            dec = self.visit_table.get('descDitheredDec', obs_id)
+
+            # the index must contain every cell the exact queries find
+            vv = np.array([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra),
+                           np.sin(dec)])
+            exact_hp = healpy.query_disc(32, vv, np.radians(fov),
+                                         inclusive=True, nest=False)
+            hp_list = visit_index.healpixels(obs_id)
+            self.assertTrue(np.all(np.diff(hp_list) > 0))
+            self.assertTrue(np.all(np.isin(exact_hp, hp_list)))
+
+            hs = halfSpaceFromRaDec(np.degrees(ra), np.degrees(dec), fov)
+            htmid_list = visit_index.htmids(obs_id)
+            for lo, hi in hs.findAllTrixels(6):
+                exact_htmid = np.arange(lo, hi+1)
+                self.assertTrue(np.all(np.isin(exact_htmid, htmid_list)))
+
+            # the reverse maps must agree with the forward maps
+            for hp in hp_list:
+                self.assertIn(obs_id, visit_index.visits_in_healpix(hp))
+            for htmid in htmid_list:
+                self.assertIn(obs_id, visit_index.visits_in_htmid(htmid))
+
+        n_pairs = sum(len(visit_index.visits_in_healpix(hp))
+                      for hp in visit_index.healpix_list())
+        self.assertEqual(n_pairs, sum(len(visit_index.healpixels(obs_id))
+                                      for obs_id in visit_index.obsHistID))
+        self.assertEqual(len(visit_index.visits_in_healpix(0)), 0)
+
+        filters = visit_index.column('filter')
+        np.testing.assert_array_equal(np.array(list('ugrizy'))[filters],
+                                      self.visit_table['filter'])
+
+        file_name = os.path.join(self.out_dir, 'visit_index.h5')
+        visit_index.write(file_name)
+        read_index = VisitIndex.read(file_name)
+        self.assertEqual(read_index.htmid_level, 6)
+        self.assertTrue(read_index.dither)
+        for obs_id in visit_index.obsHistID:
+            np.testing.assert_array_equal(read_index.htmids(obs_id),
+                                          visit_index.htmids(obs_id))
+            np.testing.assert_array_equal(read_index.column('mjd', [obs_id]),
+                                          visit_index.column('mjd', [obs_id]))
+
+        for hp in list(visit_index.healpix_list()[::5]) + [0]:
+            obs_list, values = VisitIndex.read_cell(file_name, hp,
+                                                    columns=['mjd', 'filter'])
+            np.testing.assert_array_equal(obs_list, visit_index.visits_in_healpix(hp))
+            self.assertEqual(sorted(values.keys()), ['filter', 'mjd'])
+            for name in values:
+                np.testing.assert_array_equal(values[name],
+                                              visit_index.column(name, obs_list))
+
+
+if __name__ == "__main__":
+    unittest.main()
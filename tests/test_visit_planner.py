@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import group_visits, order_healpixels
+
+
+class VisitPlannerTestCase(unittest.TestCase):
+
+    def test_group_visits(self):
+        """
+        Visits sharing a pointing pixel should stay together and the
+        groups should follow the order of the pointing pixels
+        """
+        center_dict = {11: 5, 12: 5, 13: 5, 14: 6, 15: 1}
+        groups = group_visits(center_dict, 2)
+        self.assertEqual(groups, [[15, 11, 12, 13], [14]])
+
+        groups = group_visits(center_dict, 10)
+        self.assertEqual(len(groups), 5)
+        self.assertEqual(sorted(sum(groups, [])), sorted(center_dict.keys()))
+
+        # must split the run of visits at pixel 5 to make 4 groups
+        groups = group_visits(center_dict, 4)
+        self.assertEqual(len(groups), 4)
+        self.assertEqual(sorted(sum(groups, [])), sorted(center_dict.keys()))
+
+    def test_order_healpixels(self):
+        """
+        Healpixels loaded by the previous visit come first, most
+        recently loaded first
+        """
+        hp_dict = {1: np.array([10, 11, 12]),
+                   2: np.array([11, 12, 13]),
+                   3: np.array([20, 13])}
+        order = order_healpixels([1, 2, 3], hp_dict)
+        self.assertEqual(order[1], [10, 11, 12])
+        self.assertEqual(order[2], [12, 11, 13])
+        self.assertEqual(order[3], [13, 20])
+
+
+if __name__ == "__main__":
+    unittest.main()
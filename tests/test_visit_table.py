@@ -0,0 +1,72 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import shutil
+import numpy as np
+
+from desc.sims.GCRCatSimInterface import VisitTable
+
+
+class VisitTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix='visit_table')
+        self.opsim_db = os.path.join(self.out_dir, 'opsim.db')
+        rng = np.random.RandomState(88)
+        self.obsHistID = np.array([7, 3, 21, 12, 5])
+        self.ra = rng.uniform(0.0, 2.0*np.pi, size=len(self.obsHistID))
+        self.mjd = 59580.0 + rng.uniform(0.0, 10.0, size=len(self.obsHistID))
+        with sqlite3.connect(self.opsim_db) as conn:
+            conn.execute('CREATE TABLE Summary (obsHistID int, propID int, '
+                         'descDitheredRA real, expMJD real, filter text)')
+            for ii, obs_id in enumerate(self.obsHistID):
+                # the v3 Summary table repeats visits once per proposal
+                for prop_id in (54, 56):
+                    conn.execute('INSERT INTO Summary VALUES (?, ?, ?, ?, ?)',
+                                 (int(obs_id), prop_id, self.ra[ii],
+                                  self.mjd[ii], 'ugrizy'[ii]))
+            conn.commit()
+
+    def tearDown(self):
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+
+    def test_visit_table(self):
+        table = VisitTable.from_opsim(self.opsim_db)
+        self.assertEqual(len(table), len(self.obsHistID))
+        np.testing.assert_array_equal(table.obsHistID, np.sort(self.obsHistID))
+        self.assertEqual(sorted(table.columns),
+                         ['descDitheredRA', 'expMJD', 'filter', 'obsHistID'])
+
+        self.assertIn(21, table)
+        self.assertNotIn(4, table)
+        self.assertNotIn(100, table)
+
+        np.testing.assert_array_equal(table.get('expMJD', self.obsHistID),
+                                      self.mjd)
+        record = table.record(12)
+        self.assertEqual(record['filter'], 'i')
+        self.assertAlmostEqual(record['descDitheredRA'], self.ra[3], 10)
+        with self.assertRaises(RuntimeError):
+            table.rows([3, 4])
+
+        subset = VisitTable.from_opsim(self.opsim_db, columns=['expMJD'],
+                                       obsHistID_list=[21, 3, 99])
+        np.testing.assert_array_equal(subset.obsHistID, [3, 21])
+        self.assertEqual(sorted(subset.columns), ['expMJD', 'obsHistID'])
+
+        with self.assertRaises(RuntimeError):
+            VisitTable.from_opsim(self.opsim_db, columns=['rotTelPos'])
+
+        cache_file = os.path.join(self.out_dir, 'visits.npz')
+        VisitTable.load(self.opsim_db, cache_file=cache_file)
+        self.assertTrue(os.path.isfile(cache_file))
+        os.unlink(self.opsim_db)
+        cached = VisitTable.load(self.opsim_db, cache_file=cache_file)
+        for name in table.columns:
+            np.testing.assert_array_equal(cached[name], table[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import numpy as np
 import os
 import sqlite3
-import lsst.sims.utils as sims_utils
+from desc.sims.GCRCatSimInterface import _getRotTelPosArray
 
 import argparse
 
@@ -30,15 +30,8 @@ if __name__ == "__main__":
     data = np.genfromtxt(data_file, dtype=dtype, delimiter=',',
                          skip_header=1)
 
-    rotTelPos = []
-    for ii in range(len(data)):
-        obs = sims_utils.ObservationMetaData(pointingRA=np.degrees(data['ra'][ii]),
-                                             pointingDec=np.degrees(data['dec'][ii]),
-                                             mjd=data['mjd'][ii])
-        rottel = sims_utils._getRotTelPos(data['ra'][ii], data['dec'][ii],
-                                          obs, data['rotSkyPos'][ii])
-
-        rotTelPos.append(rottel)
+    rotTelPos = _getRotTelPosArray(data['ra'], data['dec'], data['mjd'],
+                                   data['rotSkyPos'])
 
     with sqlite3.connect(cadence_file_name) as conn:
         cur = conn.cursor()
@@ -36,6 +36,11 @@ if __name__ == "__main__":
     parser.add_argument('--config_file_name', type=str, default=None,
                         help='Name of config file to use for InstanceCatalog '
                              'generation')
+    parser.add_argument('--packing_file', type=str, default=None,
+                        help='Output of bin.src/pack_visits.py; if given, '
+                        'each of its bins is run on one node (replacing '
+                        'candidate_file and d_obs) and the wall time of each '
+                        'script follows the predicted runtimes')
     args = parser.parse_args()
 
     if args.config_file_name is None:
@@ -52,27 +57,51 @@ if __name__ == "__main__":
                 obs_already_done.add(obsid)
 
     print('N already done %d' % (len(obs_already_done)))
-    obs_hist_id = []
-    with open(args.candidate_file, 'r') as in_file:
-        for line in in_file:
-            try:
-                ii=int(line.strip().split(',')[0])
-                if ((ii <= args.max_obs) and
-                    (ii not in obs_already_done) and
-                    (ii > args.min_obs)):
 
-                    obs_hist_id.append(ii)
-            except ValueError:
-                pass
+    def keep(ii):
+        return ((ii <= args.max_obs) and
+                (ii not in obs_already_done) and
+                (ii > args.min_obs))
+
+    # each script gets a list of nodes; each node gets a list of
+    # obsHistIDs and (optionally) a predicted runtime in hours
+    script_list = []
+    if args.packing_file is not None:
+        node_list = []
+        runtime_hrs = None
+        with open(args.packing_file, 'r') as in_file:
+            for line in in_file:
+                if line.startswith('#'):
+                    runtime_hrs = float(line.split()[2])
+                    continue
+                these_obs = [int(ii) for ii in line.split() if keep(int(ii))]
+                if len(these_obs) > 0:
+                    node_list.append((np.array(these_obs), runtime_hrs))
+
+        nodes_per_script = int(np.ceil(args.n_obs/args.d_obs))
+        for i_start in range(0, len(node_list), nodes_per_script):
+            script_list.append(node_list[i_start:i_start+nodes_per_script])
+    else:
+        obs_hist_id = []
+        with open(args.candidate_file, 'r') as in_file:
+            for line in in_file:
+                try:
+                    ii=int(line.strip().split(',')[0])
+                    if keep(ii):
+                        obs_hist_id.append(ii)
+                except ValueError:
+                    pass
 
-    assert len(obs_hist_id) > 0
+        obs_hist_id = np.array(obs_hist_id)
+        for i_start in range(0, len(obs_hist_id), args.n_obs):
+            batch = obs_hist_id[i_start:i_start+args.n_obs]
+            script_list.append([(batch[i_0:i_0+args.d_obs], None)
+                                for i_0 in range(0, len(batch), args.d_obs)])
 
-    obs_hist_id = np.array(obs_hist_id)
+    assert len(script_list) > 0
 
     i_file_offset = 0
-    for i_file, i_start in enumerate(range(0,len(obs_hist_id), args.n_obs)):
-        batch_slice = slice(i_start, i_start+args.n_obs)
-        batch = obs_hist_id[batch_slice]
+    for i_file, batch in enumerate(script_list):
         out_name = None
         while out_name is None or os.path.isfile(out_name):
             out_name = out_name_root+'%d.sl' % (i_file+i_file_offset)
@@ -82,8 +111,12 @@ if __name__ == "__main__":
         print('writing ',out_name)
         with open(out_name, 'w') as out_file:
             file_id = i_file+i_file_offset
-            n_srun = int(np.ceil(len(batch)/args.d_obs))
-            n_hrs = 2+int(np.ceil(args.d_obs/args.n_jobs))
+            n_srun = len(batch)
+            predicted_hrs = [node[1] for node in batch if node[1] is not None]
+            if len(predicted_hrs) > 0:
+                n_hrs = 2+int(np.ceil(max(predicted_hrs)))
+            else:
+                n_hrs = 2+int(np.ceil(args.d_obs/args.n_jobs))
             out_file.write('#!/bin/bash -l\n')
             out_file.write('#SBATCH ')
             out_file.write('--image=docker:lsstdesc/stack-sims-cat:w_2019_37-sims_w_2019_37-v1\n')
@@ -107,9 +140,7 @@ if __name__ == "__main__":
             out_file.write("fi\n")
             out_file.write('\n')
 
-            for i_0 in range(0, len(batch), args.d_obs):
-                s = slice(i_0, i_0+args.d_obs)
-                these_obs = batch[s]
+            for these_obs, runtime_hrs in batch:
                 out_file.write('\n')
                 out_file.write('srun -N 1 -n 1 -c 64 --exclusive \\\n')
                 out_file.write('shifter ${work_dir}/runshift_instcat.sh \\\n')
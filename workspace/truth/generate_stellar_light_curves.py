@@ -4,14 +4,14 @@ import h5py
 import numpy as np
 
 from lsst.sims.utils import angularSeparation
-from lsst.sims.utils import getRotSkyPos
 from lsst.sims.utils import defaultSpecMap
 import lsst.sims.photUtils as sims_photUtils
 from lsst.sims.utils import ObservationMetaData
 import lsst.sims.catUtils.mixins.VariabilityMixin as variability
-from lsst.sims.coordUtils import chipNameFromRaDecLSST
 
 from dc2_spatial_definition import DC2_bounds
+from desc.sims.GCRCatSimInterface import VisitIndex
+from desc.sims.GCRCatSimInterface import ChipAssigner, _getRotSkyPosArray
 from lsst.sims.utils import xyz_from_ra_dec
 
 import multiprocessing
@@ -93,6 +93,16 @@ class VariabilityGenerator(variability.StellarVariabilityModels,
         raise RuntimeError("\n\nCannot get column %s\n\n" % name)
 
 
+def _chip_assigner():
+    """
+    Return the ChipAssigner used by do_photometry.  It is built once,
+    in the parent process, and inherited by the forked processes.
+    """
+    if not hasattr(_chip_assigner, '_assigner'):
+        _chip_assigner._assigner = ChipAssigner(cache=False)
+    return _chip_assigner._assigner
+
+
 def do_photometry(chunk,
                   obs_lock, obs_metadata_dict,
                   star_lock, star_data_dict,
@@ -136,6 +146,7 @@ def do_photometry(chunk,
     None
     """
     dummy_sed = sims_photUtils.Sed()
+    chip_assigner = _chip_assigner()
 
     # find the lookup file associating healpixel with obsHistID;
     # this should probably actually be passed into the method
@@ -144,21 +155,12 @@ def do_photometry(chunk,
     hpid_lookup_name = os.path.join(data_dir, 'hpid_to_obsHistID_lookup.h5')
     assert os.path.isfile(hpid_lookup_name)
 
-    metadata_dict = {}
-    metadata_keys = ['obsHistID', 'ra', 'dec', 'rotTelPos', 'mjd', 'filter']
+    metadata_keys = ['ra', 'dec', 'rotTelPos', 'mjd', 'filter']
     hpid = int(chunk[0][1])
-    with h5py.File(hpid_lookup_name, 'r') as in_file:
-        valid_obsid = in_file['%d' % hpid][()]
-        for k in metadata_keys:
-            metadata_dict[k] = in_file[k][()]
-
-    valid_obsid = np.sort(valid_obsid)
-    valid_dex = np.searchsorted(metadata_dict['obsHistID'], valid_obsid)
-    np.testing.assert_array_equal(metadata_dict['obsHistID'][valid_dex],
-                                  valid_obsid)
-
-    for k in metadata_dict.keys():
-        metadata_dict[k] = metadata_dict[k][valid_dex]
+    # only read the visits of this healpixel
+    valid_obsid, metadata_dict = VisitIndex.read_cell(hpid_lookup_name, hpid,
+                                                      columns=metadata_keys)
+    metadata_dict['obsHistID'] = valid_obsid
 
     # generate delta_magnitude light curves
     has_dmag = False
@@ -206,27 +208,23 @@ def do_photometry(chunk,
     obs_mask = np.zeros((len(chunk), len(metadata_dict['mjd'])),
                         dtype=bool)
 
-    fov_radius = 2.1 # in degrees
     t_start = time.time()
+    rot_sky_pos = np.degrees(_getRotSkyPosArray(metadata_dict['ra'],
+                                                metadata_dict['dec'],
+                                                metadata_dict['mjd'],
+                                                metadata_dict['rotTelPos']))
+    obs_md_list = []
     for i_obs in range(len(metadata_dict['mjd'])):
-        ra = np.degrees(metadata_dict['ra'][i_obs])
-        dec = np.degrees(metadata_dict['dec'][i_obs])
+        obs_md = ObservationMetaData(pointingRA=np.degrees(metadata_dict['ra'][i_obs]),
+                                     pointingDec=np.degrees(metadata_dict['dec'][i_obs]),
+                                     mjd=metadata_dict['mjd'][i_obs],
+                                     rotSkyPos=rot_sky_pos[i_obs])
+        obs_md_list.append(obs_md)
 
-        ## back-of-the-envelope implementation
-        ## (does not use focal plane model with chip gaps, etc.)
-        #ang_dist = angularSeparation(ra, dec, star_ra, star_dec)
-        #valid = ang_dist<fov_radius
-
-        rotTel = np.degrees(metadata_dict['rotTelPos'][i_obs])
-        obs_md = ObservationMetaData(pointingRA=ra, pointingDec=dec,
-                                     mjd=metadata_dict['mjd'][i_obs])
-        rotSky = getRotSkyPos(ra, dec, obs_md, rotTel)
-        obs_md.rotSkyPos = rotSky
-        chip_name = chipNameFromRaDecLSST(star_ra, star_dec,
-                                          obs_metadata=obs_md).astype(str)
-        valid = np.char.find(chip_name, 'None')<0
-
-        obs_mask[:,i_obs] = valid
+    # only the stars near a chip edge go through the full camera model
+    obs_mask[:, :] = chip_assigner.on_chip_visits(var_gen.column_by_name('simobjid'),
+                                                  star_ra, star_dec, obs_md_list,
+                                                  metadata_dict['obsHistID'])
 
     # verify that any stars with empty light curves are, in fact
     # outside of DC2
@@ -428,17 +426,15 @@ if __name__ == "__main__":
     kplr_dummy = variability.ParametrizedLightCurveMixin()
     kplr_dummy.load_parametrized_light_curves()
 
+    # set up the camera geometry before the do_photometry processes fork
+    _chip_assigner()
+
     # load the mapping between healpix pixel and obsHistID
+    visit_index = VisitIndex.read(lookup_name)
     hpid_to_ct = {}
-    with h5py.File(lookup_name, 'r') as in_file:
-        for k in in_file.keys():
-            try:
-                hpid = int(k)
-            except ValueError:
-                continue
-
-            n_obs = len(in_file['%d' % hpid][()])
-            hpid_to_ct[hpid] = n_obs
+    for hpid in visit_index.healpix_list():
+        hpid_to_ct[int(hpid)] = len(visit_index.visits_in_healpix(hpid))
+    del visit_index
 
     mgr = multiprocessing.Manager()
 
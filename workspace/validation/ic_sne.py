@@ -3,7 +3,7 @@ import sqlite3
 import gzip
 import numpy as np
 
-import lsst.sims.utils.htmModule as htm
+from desc.sims.GCRCatSimInterface import HtmRangePlan
 from lsst.sims.utils import angularSeparation
 import lsst.sims.photUtils as photUtils
 from lsst.sims.catUtils.supernovae import SNObject
@@ -76,29 +76,13 @@ def validate_sne(cat_dir, obsid, fov_deg=2.1,
 
     with sqlite3.connect(sne_db_name) as conn:
         c = conn.cursor()
+        htm_plan = HtmRangePlan.from_circle(pointing_ra, pointing_dec,
+                                            fov_deg, 6)
         query = "SELECT snid_in, snra_in, sndec_in, "
         query += "c_in, mB, t0_in, x0_in, x1_in, z_in "
-        query += "FROM sne_params WHERE ("
-
-        where_clause = None
-        half_space = htm.halfSpaceFromRaDec(pointing_ra, pointing_dec, fov_deg)
-        bounds = half_space.findAllTrixels(6)
-
-        for bound in bounds:
-            if where_clause is not None:
-                where_clause += " OR ("
-            else:
-                where_clause = "("
-
-            if bound[0] == bound[1]:
-                where_clause += "htmid_level_6==%d" % bound[0]
-            else:
-                where_clause += "htmid_level_6>=%d AND htmid_level_6<=%d" % (bound[0],bound[1])
-
-            where_clause += ")"
-
-        query += where_clause+")"
+        query += "FROM %s" % htm_plan.join('sne_params', 'htmid_level_6')
 
+        htm_plan.load(c)
         sn_params = c.execute(query).fetchall()
     sn_ra = np.array([sn[1] for sn in sn_params])
     sn_dec = np.array([sn[2] for sn in sn_params])